@@ -1,33 +1,17 @@
-
+from collections.abc import Mapping
+from importlib import import_module
 from logging import getLogger, NullHandler
-from sys import version_info
+from sys import version_info, argv
 
 getLogger('bokeh').addHandler(NullHandler())
 getLogger('tornado').addHandler(NullHandler())
 
-from .commands.activities import activities
 from .commands.args import COMMAND, parser, NamespaceWithVariables, PROGNAME, HELP, DEV, DIARY, FIT, \
     PACKAGE_FIT_PROFILE, ACTIVITIES, NO_OP, CONFIG, CONSTANTS, STATISTICS, TEST_SCHEDULE, MONITOR, GARMIN, \
-    UNLOCK, DUMP, FIX_FIT, CH2_VERSION, JUPYTER
-from .commands.constants import constants
-from .commands.dump import dump
-from .commands.config import config
-from .commands.diary import diary
-from .commands.fit import fit
-from .commands.fix_fit import fix_fit
-from .commands.garmin import garmin
-from .commands.jupyter import jupyter
-from .commands.help import help, LengthFmt
-from .commands.monitor import monitor
-from .commands.package_fit_profile import package_fit_profile
-from .commands.statistics import statistics
-from .commands.test_schedule import test_schedule
-from .commands.unlock import unlock
+    UNLOCK, DUMP, FIX_FIT, CH2_VERSION, JUPYTER, FIT_CACHE, PROFILE_STARTUP, mm
 from .lib.io import tui
 from .lib.log import make_log, log_current_exception
 from .squeal.database import Database
-from .squeal import SystemConstant
-from .uranus.server import start_controller
 
 log = getLogger(__name__)
 
@@ -43,27 +27,69 @@ at the command line.
     pass
 
 
-COMMANDS = {ACTIVITIES: activities,
-            CONSTANTS: constants,
-            CONFIG: config,
-            DIARY: diary,
-            DUMP: dump,
-            FIT: fit,
-            FIX_FIT: fix_fit,
-            GARMIN: garmin,
-            JUPYTER: jupyter,
-            HELP: help,
-            MONITOR: monitor,
-            STATISTICS: statistics,
-            NO_OP: no_op,
-            PACKAGE_FIT_PROFILE: package_fit_profile,
-            TEST_SCHEDULE: test_schedule,
-            UNLOCK: unlock,
-            }
+class Commands(Mapping):
+    '''
+    Command functions by name.  Each command (and so all its dependencies - bokeh, urwid, jupyter, etc)
+    is imported only when it is looked up, so that startup (and each worker process) pays only for what
+    is used.
+    '''
+
+    def __init__(self, commands):
+        self.__commands = dict(commands)
+
+    def __getitem__(self, name):
+        command = self.__commands[name]
+        if isinstance(command, str):
+            command = getattr(import_module('.commands.' + command, __name__), command)
+            self.__commands[name] = command
+        return command
+
+    def __iter__(self):
+        return iter(self.__commands)
+
+    def __len__(self):
+        return len(self.__commands)
+
+
+# the values are modules in ch2.commands that contain a function of the same name
+COMMANDS = Commands({ACTIVITIES: 'activities',
+                     CONSTANTS: 'constants',
+                     CONFIG: 'config',
+                     DIARY: 'diary',
+                     DUMP: 'dump',
+                     FIT: 'fit',
+                     FIT_CACHE: 'fit_cache',
+                     FIX_FIT: 'fix_fit',
+                     GARMIN: 'garmin',
+                     JUPYTER: 'jupyter',
+                     HELP: 'help',
+                     MONITOR: 'monitor',
+                     STATISTICS: 'statistics',
+                     NO_OP: no_op,
+                     PACKAGE_FIT_PROFILE: 'package_fit_profile',
+                     TEST_SCHEDULE: 'test_schedule',
+                     UNLOCK: 'unlock',
+                     })
+
+
+def __getattr__(name):
+    # commands used to be imported here, so continue to support `from ch2 import constants` etc
+    module = f'{__name__}.commands.{name}'
+    try:
+        return getattr(import_module(module), name)
+    except ModuleNotFoundError as e:
+        if e.name != module:
+            raise
+    except AttributeError:
+        pass
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def main():
     args = NamespaceWithVariables(parser().parse_args())
+    if args[PROFILE_STARTUP]:
+        from .lib.importtime import profile_startup
+        exit(profile_startup([arg for arg in argv[1:] if arg != mm(PROFILE_STARTUP)]))
     command_name = args[COMMAND] if COMMAND in args else None
     command = COMMANDS[command_name] if command_name in COMMANDS else None
     tui = command and hasattr(command, 'tui') and command.tui
@@ -76,6 +102,7 @@ def main():
         if db.is_empty() and (not command or command_name != CONFIG):
             refuse_until_configured()
         elif command:
+            from .uranus.server import start_controller
             start_controller(db, args)
             command(args, db)
         else:
@@ -96,6 +123,7 @@ def main():
 
 
 def refuse_until_configured():
+    from .commands.help import LengthFmt
     LengthFmt().print_all('''
 Welcome to Choochoo.
 
@@ -0,0 +1,217 @@
+
+from math import ceil, sqrt
+
+import numpy as np
+
+from .spherical import SphericalMixin
+from .tree import MatchType, CartesianMixin, LatLonMixin
+
+
+class FlatTree:
+    '''
+    A read-only r-tree, bulk loaded (sort-tile-recursive) into contiguous numpy arrays:
+
+      * the MBR of every entry (leaves first, then each level of nodes up to the root),
+      * the child of every entry (a node for internal entries, an item for leaves),
+      * the range of entries for every node,
+      * the points of every item (with offsets) and a list of values.
+
+    Queries descend one level at a time, testing every entry of every candidate node (for every
+    request) with a few vectorised comparisons.  So nodes can be much larger than in the mutable
+    trees (where `max_entries` of 3 is best) and many requests can be handled at once with
+    `get_batch()`.
+
+    Matching follows BaseTree (the same `match`, `value` and `border` parameters).  MBRs are compared
+    as Cartesian coordinates (after normalization), so this is combined with a coordinate mixin
+    (eg SFRTree).
+    '''
+
+    def __init__(self, items=None, *, max_entries=64, default_match=MatchType.EQUALS, default_border=0):
+        '''
+        Create a tree containing `items`, an iterable of `(points, value)` pairs (as for BaseTree).
+        '''
+        if max_entries < 2:
+            raise Exception('Max number of entries in a node is too low')
+        self.__max_entries = max_entries
+        self.__default_match = default_match
+        self.__default_border = default_border
+        self.__values, mbrs, xys, lengths = [], [], [], []
+        for points, value in items or []:
+            self._check_points(points)
+            points = self._normalize_points(points)
+            mbrs.append(self._mbr_of_points(points, border=default_border))
+            xys.extend(points)
+            lengths.append(len(points))
+            self.__values.append(value)
+        self.__points = np.array(xys, dtype=np.float64).reshape(-1, 2)
+        self.__offsets = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype(np.int64)
+        self.__build(np.array(mbrs, dtype=np.float64).reshape(-1, 4))
+
+    def __build(self, mbrs):
+        '''
+        Pack each level into nodes, from the leaves up, appending entries and nodes to the arrays.
+        '''
+        entry_mbrs, entry_children, node_starts, node_stops = [], [], [], []
+        children, n_entries, n_nodes, height = np.arange(len(mbrs)), 0, 0, 0
+        while True:
+            if len(mbrs) > self.__max_entries:
+                order, starts = self.__pack(mbrs)
+                mbrs, children = mbrs[order], children[order]
+            else:
+                starts = np.zeros(1, dtype=np.int64)
+            stops = np.append(starts[1:], len(mbrs))
+            entry_mbrs.append(mbrs)
+            entry_children.append(children)
+            node_starts.append(starts + n_entries)
+            node_stops.append(stops + n_entries)
+            n_entries += len(mbrs)
+            n_nodes += len(starts)
+            if len(starts) == 1:
+                break
+            children = np.arange(n_nodes - len(starts), n_nodes)
+            mbrs = np.column_stack([np.minimum.reduceat(mbrs[:, 0], starts),
+                                    np.minimum.reduceat(mbrs[:, 1], starts),
+                                    np.maximum.reduceat(mbrs[:, 2], starts),
+                                    np.maximum.reduceat(mbrs[:, 3], starts)])
+            height += 1
+        self.__mbrs = np.concatenate(entry_mbrs)
+        self.__children = np.concatenate(entry_children)
+        self.__starts = np.concatenate(node_starts)
+        self.__stops = np.concatenate(node_stops)
+        self.__root, self.__height = n_nodes - 1, height
+
+    def __pack(self, mbrs):
+        '''
+        Order the entries (slices in x, sorted by y within each slice) and divide into nodes.
+        Returns the order and the index (in the new order) of the start of each node.
+        '''
+        n_nodes = ceil(len(mbrs) / self.__max_entries)
+        x, y = mbrs[:, 0] + mbrs[:, 2], mbrs[:, 1] + mbrs[:, 3]
+        slices = self.__chunks(len(mbrs), ceil(sqrt(n_nodes)))
+        by_x = np.argsort(x, kind='stable')
+        order = by_x[np.lexsort((y[by_x], np.repeat(np.arange(len(slices) - 1), np.diff(slices))))]
+        starts = [start + self.__chunks(finish - start, ceil((finish - start) / self.__max_entries))[:-1]
+                  for start, finish in zip(slices[:-1], slices[1:])]
+        return order, np.concatenate(starts)
+
+    @staticmethod
+    def __chunks(n, k):
+        '''
+        Boundaries that divide n entries into k (contiguous) groups of near-equal size.
+        '''
+        size, extra = divmod(n, k)
+        return np.concatenate([[0], np.cumsum(size + (np.arange(k) < extra))]).astype(np.int64)
+
+    @property
+    def height(self):
+        return self.__height
+
+    @property
+    def max_entries(self):
+        return self.__max_entries
+
+    def __len__(self):
+        return len(self.__values)
+
+    def get(self, points, value=None, match=None, border=None):
+        '''
+        An iterator over values of nodes that match the MBR for the given points (see BaseTree.get()).
+        '''
+        for points_entry, value_entry in self.__get_batch([points], value, match, border)[0]:
+            yield value_entry
+
+    def get_items(self, points, value=None, match=None, border=None):
+        '''
+        An iterator over (points, value) of nodes that match the MBR for the given points
+        (see BaseTree.get_items()).
+        '''
+        for points_entry, value_entry in self.__get_batch([points], value, match, border, True)[0]:
+            yield self._denormalize_points(points_entry), value_entry
+
+    def get_batch(self, queries, value=None, match=None, border=None):
+        '''
+        A list (one entry for each query, which is a sequence of points) of lists of matching values.
+        '''
+        return [[value_entry for _, value_entry in results]
+                for results in self.__get_batch(queries, value, match, border)]
+
+    def __get_batch(self, queries, value, match, border, with_points=False):
+        '''
+        A list (one entry for each query) of lists of (normalized points or None, value).
+        '''
+        match = self.__default_match if match is None else match
+        border = self.__default_border if border is None else border
+        for points in queries:
+            self._check_points(points)
+        queries = [self._normalize_points(points) for points in queries]
+        requests = np.array([self._mbr_of_points(points, border=border) for points in queries],
+                            dtype=np.float64).reshape(-1, 4)
+        results = [[] for _ in queries]
+        for request, item in zip(*(array.tolist() for array in self.__query(requests, match))):
+            value_entry = self.__values[item]
+            if value is None or value == value_entry:
+                points_entry = self.__item_points(item) if with_points or match == MatchType.EQUALS else None
+                if match != MatchType.EQUALS or points_entry == queries[request]:
+                    results[request].append((points_entry, value_entry))
+        return results
+
+    def __item_points(self, item):
+        return tuple(tuple(point) for point in
+                     self.__points[self.__offsets[item]:self.__offsets[item+1]].tolist())
+
+    def __query(self, requests, match):
+        '''
+        Arrays of request and item indices for leaves that match the request MBRs.
+        '''
+        request = np.arange(len(requests))
+        node = np.full(len(requests), self.__root)
+        for height in range(self.__height, -1, -1):
+            start, stop = self.__starts[node], self.__stops[node]
+            lengths = stop - start
+            entry = np.repeat(start - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            request = np.repeat(request, lengths)
+            keep = self.__test(self.__mbrs[entry], requests[request], match, height)
+            request, node = request[keep], self.__children[entry[keep]]
+        return request, node
+
+    @staticmethod
+    def __test(entries, requests, match, height):
+        '''
+        Descend (if height) or match (at leaves), as BaseTree.
+        '''
+        if match == MatchType.EQUALS and not height:
+            return np.ones(len(entries), dtype=bool)  # compare points later
+        elif match in (MatchType.EQUALS, MatchType.CONTAINED):
+            outer, inner = entries, requests
+        elif match == MatchType.CONTAINS and not height:
+            outer, inner = requests, entries
+        else:
+            return (entries[:, 0] <= requests[:, 2]) & (entries[:, 2] >= requests[:, 0]) & \
+                   (entries[:, 1] <= requests[:, 3]) & (entries[:, 3] >= requests[:, 1])
+        return (outer[:, 0] <= inner[:, 0]) & (outer[:, 2] >= inner[:, 2]) & \
+               (outer[:, 1] <= inner[:, 1]) & (outer[:, 3] >= inner[:, 3])
+
+    def _check_points(self, points):
+        try:
+            _ = points[0][0]
+        except Exception:
+            raise Exception('The `points` argument is a sequence of (x, y) points. ' +
+                            'You may have entered a single (x, y) point.')
+
+    def _normalize_points(self, points):
+        return tuple(self._normalize_point(p) for p in points)
+
+    def _denormalize_points(self, points):
+        return tuple(self._denormalize_point(p) for p in points)
+
+    def _denormalize_point(self, point):
+        return point
+
+
+class CFRTree(CartesianMixin, FlatTree): pass
+
+
+class LFRTree(LatLonMixin, FlatTree): pass
+
+
+class SFRTree(SphericalMixin, FlatTree): pass
@@ -1,16 +1,10 @@
 
-from math import pi, cos
+from heapq import heappush, heappop
+from itertools import count
+from math import cos, asin, sin, floor, inf
 
-from .tree import LinearMixin, BaseTree, QuadraticMixin, ExponentialMixin, CartesianMixin
-
-RADIUS = 6371000
-RADIAN = pi / 180
-
-
-def norm180(x):
-    while x > 180: x -= 360
-    while x <= -180: x += 360
-    return x
+from .tree import LinearMixin, BaseTree, QuadraticMixin, ExponentialMixin, CartesianMixin, PackType, RADIUS, RADIAN, \
+    haversine_to_mbr, norm180
 
 
 class LocalTangent:
@@ -37,9 +31,12 @@ class LocalTangent:
 
 
 class SphericalMixin(CartesianMixin):
+    '''
+    `zero` fixes the origin of the local tangent plane (by default, the first point normalized).
+    '''
 
-    def __init__(self, *args, **kargs):
-        self.__plane = LocalTangent()
+    def __init__(self, *args, zero=None, **kargs):
+        self.__plane = LocalTangent(zero)
         super().__init__(*args, **kargs)
 
     def _normalize_point(self, point):
@@ -48,6 +45,16 @@ class SphericalMixin(CartesianMixin):
     def _denormalize_point(self, point):
         return self.__plane.denormalize(point)
 
+    def _distance_to_mbr(self, point, mbr):
+        '''
+        Great circle distance (m) to the closest point in the MBR (the local plane is only used to
+        index, since distances within it are approximate).
+        '''
+        x1, y1, x2, y2 = mbr
+        (lon1, lat1), (lon2, lat2) = self._denormalize_point((x1, y1)), self._denormalize_point((x2, y2))
+        return haversine_to_mbr(self._denormalize_point(point),
+                                (min(lon1, lon2), min(lat1, lat2), max(lon1, lon2), max(lat1, lat2)))
+
 
 class SLRTree(LinearMixin, SphericalMixin, BaseTree): pass
 
@@ -87,9 +94,12 @@ class Global:
             self.__trees[i][j] = tree
         return self.__trees[i][j]
 
+    def __index(self, point):
+        lon, lat = point
+        return floor(self.__n * lon / 360), floor(self.__n * lat / 180)
+
     def __delegates(self, points, read=True):
-        lon, lat = points[0]
-        i, j = int(self.__n * lon / 360), int(self.__n * lat / 180)
+        i, j = self.__index(points[0])
         for di in (-1, 0, 1):
             for dj in (-1, 0, 1):
                 yield self.__delegate(i + di, j + dj)
@@ -102,6 +112,77 @@ class Global:
         for delegate in self.__delegates(points):
             yield from delegate.get_items(points, value=value, match=match, border=border)
 
+    def nearest(self, point, k=1, value=None):
+        '''
+        The k nearest entries (see BaseTree.nearest()), searching outwards from the point's tile.
+
+        An entry is added to the tiles around the tile containing its first point (its home), so
+        tiles three apart hold disjoint entries.  These are searched in rings (each extending the
+        area whose entries have been seen) and results are merged, each returned only when no entry
+        outside that area can be closer.  Since the area is defined by first points this is exact
+        when entries are single points (or their first point is the closest).
+        '''
+        if self.__n % 3:
+            raise Exception(f'Nearest needs the number of tiles ({self.__n}) to be a multiple of 3')
+        i, j = self.__index(point)
+        tie, queue, ring, half = count(), [], 0, self.__n // 2
+        while k is None or k > 0:
+            for di in range(-ring, ring + 1):
+                for dj in range(-ring, ring + 1):
+                    # skip tiles seen before (longitudes wrap) or whose entries are all beyond a pole
+                    if max(abs(di), abs(dj)) == ring and -half <= 3 * di < self.__n - half and \
+                            -half - 1 <= j + 3 * dj <= half + 1:
+                        self.__push_nearest(queue, tie, point, value, i + 3 * di, j + 3 * dj)
+            bound = self.__bound(point, i, j, ring)
+            while queue and queue[0][0] <= bound and (k is None or k > 0):
+                distance, _, points, value_entry, results, tile_j = heappop(queue)
+                yield distance, points, value_entry
+                if k is not None:
+                    k -= 1
+                self.__push_next(queue, tie, results, tile_j)
+            if bound == inf:
+                return
+            ring += 1
+
+    def __push_nearest(self, queue, tie, point, value, i, j):
+        '''
+        Start a (lazy) search of the tile.
+        '''
+        tree = self.__trees[self.__norm_n(i)][self.__norm_n(j)]
+        if tree is not None:
+            self.__push_next(queue, tie, tree.nearest(point, k=None, value=value), j)
+
+    def __push_next(self, queue, tie, results, j):
+        '''
+        Queue the next result from a tile (centred on latitude index j), skipping entries stored
+        there only because latitudes wrap at the poles.
+        '''
+        for distance, points, value in results:
+            if abs(self.__n * points[0][1] / 180 - j - 0.5) < 2:
+                heappush(queue, (distance, next(tie), points, value, results, j))
+                return
+
+    def __bound(self, point, i, j, ring):
+        '''
+        A lower bound on the distance to any entry whose home is outside the rings searched
+        (inf if there are none).
+        '''
+        lon, lat = point
+        width, height, extent = 360 / self.__n, 180 / self.__n, 3 * ring + 1
+        bounds = [inf]
+        lat_lo, lat_hi = (j - extent) * height, (j + extent + 1) * height
+        if lat_lo > -90: bounds.append(RADIUS * RADIAN * (lat - lat_lo))
+        if lat_hi < 90: bounds.append(RADIUS * RADIAN * (lat_hi - lat))
+        if 2 * extent + 1 < self.__n:
+            for edge in ((i - extent) * width, (i + extent + 1) * width):
+                delta = abs(norm180(lon - edge))
+                if delta >= 90:
+                    bounds.append(RADIUS * RADIAN * (90 - abs(lat)))
+                else:
+                    # distance to the meridian (a great circle)
+                    bounds.append(RADIUS * asin(sin(delta * RADIAN) * cos(lat * RADIAN)))
+        return min(bounds)
+
     def add(self, points, value, border=None):
         for delegate in self.__delegates(points, read=False):
             delegate.add(points, value, border=border)
@@ -111,6 +192,18 @@ class Global:
             for delegate in self.__delegates(points, read=False):
                 delegate.add(points, value, border=border)
 
+    def load(self, items, border=None, pack=PackType.STR):
+        '''
+        Bulk load (see BaseTree.load()) - items are grouped by delegate so that each is rebuilt once.
+        '''
+        delegates, groups = {}, {}
+        for points, value in items:
+            for delegate in self.__delegates(points, read=False):
+                delegates[id(delegate)] = delegate
+                groups.setdefault(id(delegate), []).append((points, value))
+        for key, group in groups.items():
+            delegates[key].load(group, border=border, pack=pack)
+
     def delete(self, points, value=None, match=None, border=None):
         '''
         This purposefully does not return number deleted.  If you are relying on that value,
@@ -1,6 +1,9 @@
 
 from abc import ABC, abstractmethod
 from enum import IntEnum
+from heapq import heappush, heappop
+from itertools import count
+from math import ceil, sqrt, pi, sin, cos, asin, atan2
 
 
 class MatchType(IntEnum):
@@ -14,6 +17,78 @@ class MatchType(IntEnum):
     OVERLAP = 3  # request and node overlap
 
 
+class PackType(IntEnum):
+    '''
+    Control how entries are grouped into nodes when bulk loading.
+    '''
+
+    STR = 0  # sort-tile-recursive (slices in x, sorted by y within each slice)
+    HILBERT = 1  # ordered along a hilbert curve through the centres
+
+
+HILBERT_ORDER = 16
+HILBERT_SIZE = 1 << HILBERT_ORDER
+
+RADIUS = 6371000
+RADIAN = pi / 180
+
+
+def hilbert_index(x, y, order=HILBERT_ORDER):
+    '''
+    Distance along a hilbert curve that fills a 2^order square for integer (x, y) within that square.
+    '''
+    n = 1 << order
+    d, s = 0, n >> 1
+    while s:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        if not ry:
+            if rx:
+                x, y = n - 1 - x, n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return d
+
+
+def norm180(x):
+    while x > 180: x -= 360
+    while x <= -180: x += 360
+    return x
+
+
+def haversine(point1, point2):
+    '''
+    Great circle distance (m) between two (lon, lat) points (degrees).
+    '''
+    (lon1, lat1), (lon2, lat2) = point1, point2
+    a = sin((lat2 - lat1) * RADIAN / 2) ** 2 + \
+        cos(lat1 * RADIAN) * cos(lat2 * RADIAN) * sin((lon2 - lon1) * RADIAN / 2) ** 2
+    return 2 * RADIUS * asin(min(1, sqrt(a)))
+
+
+def haversine_to_mbr(point, mbr):
+    '''
+    Great circle distance (m) from a (lon, lat) point to the closest point in a (lon, lat) MBR (degrees,
+    with the MBR longitudes in order, so not crossing the point's antimeridian).
+
+    If the point's longitude is within the MBR then the closest point is on the same meridian.
+    Otherwise it is on the nearer meridian edge (along a parallel, distance falls with the difference
+    in longitude), either where the great circle through the point meets the edge at right angles or,
+    if that is outside the edge, at an end.
+    '''
+    lon, lat = point
+    lon1, lat1, lon2, lat2 = mbr
+    if lon1 <= lon <= lon2:
+        return RADIUS * RADIAN * max(lat1 - lat, 0, lat - lat2)
+    lon_edge = lon1 if abs(norm180(lon1 - lon)) < abs(norm180(lon2 - lon)) else lon2
+    lat_closest = atan2(sin(lat * RADIAN), cos(lat * RADIAN) * cos((lon_edge - lon) * RADIAN)) / RADIAN
+    if lat1 <= lat_closest <= lat2:
+        return haversine(point, (lon_edge, lat_closest))
+    else:
+        return min(haversine(point, (lon_edge, lat1)), haversine(point, (lon_edge, lat2)))
+
+
 class BaseTree(ABC):
 
     # nodes in the tree are
@@ -167,6 +242,38 @@ class BaseTree(ABC):
                 (match == MatchType.CONTAINS and self._contains(mbr_request, mbr_entry)) or
                 (match == MatchType.OVERLAP and self._overlaps(mbr_request, mbr_entry)))
 
+    def nearest(self, point, k=1, value=None):
+        '''
+        An iterator over (distance, points, value) for the `k` entries nearest the given (x, y) point,
+        closest first.  If `k` is None then all entries are returned (lazily), in order of distance.
+
+        This is a best-first (branch and bound) search: nodes are expanded in order of the minimum
+        distance to anything they contain, so only nodes that could contain a result are visited.
+
+        The distance is from the point to the MBR of the entry's points (any border is ignored),
+        measured using the coordinate system (eg in m for (lon, lat) points).
+
+        If `value` is given then only nodes with that value are found.
+        '''
+        point = self._normalize_point(point)
+        tie = count()  # avoid comparing contents when distances are equal
+        queue = [(0, next(tie), False, self.__root)]
+        while queue and (k is None or k > 0):
+            distance, _, leaf, content = heappop(queue)
+            if leaf:
+                points_entry, value_entry = content
+                yield distance, self._denormalize_points(points_entry), value_entry
+                if k is not None:
+                    k -= 1
+            else:
+                height, entries = content
+                for mbr_entry, content_entry in entries:
+                    if height:
+                        heappush(queue, (self._distance_to_mbr(point, mbr_entry), next(tie), False, content_entry))
+                    elif value is None or value == content_entry[1]:
+                        mbr_points = self._mbr_of_points(content_entry[0])
+                        heappush(queue, (self._distance_to_mbr(point, mbr_points), next(tie), True, content_entry))
+
     def add(self, points, value, border=None):
         '''
         Add a value at the MBR of the given points.
@@ -191,6 +298,64 @@ class BaseTree(ABC):
             for points, value in items:
                 self.add(points, value, border=border)
 
+    def load(self, items, border=None, pack=PackType.STR):
+        '''
+        Add a sequence of (point, value) pairs, then rebuild the tree from the bottom up so that
+        nodes are well packed.
+
+        This is O(n log n) and much faster than add_all() for many entries.
+        The new tree contains any existing entries too, but the existing structure is discarded.
+
+        `border` is added to the MBR (eg to account for errors).
+        '''
+        border = self.__default_border if border is None else border
+        entries = list(self.__leaves(self.__root, False))
+        for points, value in items:
+            self._check_points(points)
+            points = self._normalize_points(points)
+            content = (points, value)
+            entries.append((self._mbr_of_points(points, border=border), content))
+            self.__update_state(1, content)
+        height = 0
+        while len(entries) > self.__max_entries:
+            entries = [(self._mbr_of_entries(*node), (height, node)) for node in self.__pack(entries, pack)]
+            height += 1
+        self.__root = (height, entries)
+
+    def __pack(self, entries, pack):
+        '''
+        Group entries into nodes (lists of entries) that are as full as possible.
+        '''
+        n_nodes = ceil(len(entries) / self.__max_entries)
+        if pack == PackType.STR:
+            n_slices = ceil(sqrt(n_nodes))
+            entries = sorted(entries, key=lambda entry: self._centre_of_mbr(entry[0])[0])
+            for slice in self.__chunks(entries, n_slices):
+                slice = sorted(slice, key=lambda entry: self._centre_of_mbr(entry[0])[1])
+                yield from self.__chunks(slice, ceil(len(slice) / self.__max_entries))
+        elif pack == PackType.HILBERT:
+            centres = [self._centre_of_mbr(mbr) for mbr, _ in entries]
+            xs, ys = zip(*centres)
+            x0, y0, dx, dy = min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)
+            scale = (HILBERT_SIZE - 1) / (max(dx, dy) or 1)
+            keys = [hilbert_index(int((x - x0) * scale), int((y - y0) * scale)) for x, y in centres]
+            entries = [entry for _, entry in sorted(zip(keys, entries), key=lambda key_entry: key_entry[0])]
+            yield from self.__chunks(entries, n_nodes)
+        else:
+            raise Exception('Unknown pack type %s' % pack)
+
+    @staticmethod
+    def __chunks(entries, n):
+        '''
+        Divide the entries into n (contiguous) groups of near-equal size.
+        '''
+        size, extra = divmod(len(entries), n)
+        start = 0
+        for i in range(n):
+            finish = start + size + (1 if i < extra else 0)
+            yield entries[start:finish]
+            start = finish
+
     def __update_state(self, delta, content):
         '''
         Update size and hash.
@@ -564,6 +729,14 @@ class BaseTree(ABC):
     def _area_of_mbr(self, mbr):
         raise NotImplementedError()
 
+    @abstractmethod
+    def _centre_of_mbr(self, mbr):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def _distance_to_mbr(self, point, mbr):
+        raise NotImplementedError()
+
     # allow different split algorithms
 
     @abstractmethod
@@ -627,6 +800,22 @@ class CartesianMixin:
         x1, y1, x2, y2 = mbr
         return (x2 - x1) * (y2 - y1)
 
+    def _centre_of_mbr(self, mbr):
+        '''
+        Centre of the MBR (used to order entries when bulk loading).
+        '''
+        x1, y1, x2, y2 = mbr
+        return (x1 + x2) / 2, (y1 + y2) / 2
+
+    def _distance_to_mbr(self, point, mbr):
+        '''
+        Euclidean distance from the point to the closest point in the MBR (zero if inside).
+        '''
+        x, y = point
+        x1, y1, x2, y2 = mbr
+        dx, dy = max(x1 - x, 0, x - x2), max(y1 - y, 0, y - y2)
+        return sqrt(dx * dx + dy * dy)
+
     def __extremes(self, entries):
         '''
         Internal routine for linear seeds.
@@ -729,6 +918,13 @@ class LatLonMixin(CartesianMixin):
         lon = self._normalize_angle(lon + self.__zero_lon)
         return lon, lat
 
+    def _distance_to_mbr(self, point, mbr):
+        '''
+        Great circle distance (m) to the closest point in the MBR (the normalized longitudes are
+        continuous, so can be used directly).
+        '''
+        return haversine_to_mbr(point, mbr)
+
 
 class LinearMixin:
     '''
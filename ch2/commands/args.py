@@ -23,6 +23,7 @@ CONSTANTS = 'constants'
 DIARY = 'diary'
 DUMP = 'dump'
 FIT = 'fit'
+FIT_CACHE = 'fit-cache'
 FIX_FIT = 'fix-fit'
 GARMIN = 'garmin'
 H, HELP = 'h', 'help'
@@ -45,6 +46,7 @@ ALL_FIELDS = 'all-fields'
 ARG = 'arg'
 BORDER = 'border'
 CHECK = 'check'
+CLEAR = 'clear'
 COMPACT = 'compact'
 CONSTRAINT = 'constraint'
 CONSTANT = 'constant'
@@ -97,8 +99,10 @@ MAX_COLWIDTH = 'max-colwidth'
 MAX_DROP_CNT = 'max-drop-cnt'
 MAX_DELTA_T = 'max-delta-t'
 MAX_FWD_LEN = 'max-fwd-len'
+MAX_MB = 'max-mb'
 MAX_ROWS = 'max-rows'
 MAX_RECORD_LEN = 'max-record-len'
+MAX_TIME = 'max-time'
 MIN_SYNC_CNT = 'min-sync-cnt'
 MONITOR = 'monitor'
 MONITOR_JOURNALS = 'monitor-journals'
@@ -117,11 +121,14 @@ PATH = 'path'
 P, PATTERN = 'p', 'pattern'
 PLAN = 'plan'
 PRINT = 'print'
+PROFILE_STARTUP = 'profile-startup'
 PROFILE_VERSION = 'profile-version'
+PRUNE = 'prune'
 PROTOCOL_VERSION = 'protocol-version'
 PWD = 'pwd'
 RAW = 'raw'
 RECORDS = 'records'
+RESYNC = 'resync'
 ROOT = 'root'
 RUN = 'run'
 SEGMENT_JOURNALS = 'segment-journals'
@@ -235,6 +242,8 @@ def parser():
                         help='output level for stderr (0: silent; 5:noisy)')
     parser.add_argument(m(V.upper()), mm(VERSION), action='version', version=CH2_VERSION,
                         help='display version and exit')
+    parser.add_argument(mm(PROFILE_STARTUP), action='store_true',
+                        help='run the command and then report the time spent importing modules')
 
     subparsers = parser.add_subparsers(title='commands', dest=COMMAND)
 
@@ -390,6 +399,14 @@ def parser():
         cmd.add_argument(mm(WIDTH), action='store', type=int,
                          help='display width')
 
+    fit_cache = subparsers.add_parser(FIT_CACHE, help='inspect or prune the cache of decoded fit files')
+    fit_cache_cmds = fit_cache.add_subparsers(title='sub-commands', dest=SUB_COMMAND, required=True)
+    fit_cache_cmds.add_parser(SHOW, help='show cache size and entries')
+    fit_cache_prune = fit_cache_cmds.add_parser(PRUNE, help='discard least recently used entries')
+    fit_cache_prune.add_argument(mm(MAX_MB), action='store', type=float, metavar='MB', default=None,
+                                 help='maximum size of cache (default is the limit used when reading)')
+    fit_cache_cmds.add_parser(CLEAR, help='discard all entries')
+
     fix_fit = subparsers.add_parser(FIX_FIT, help='fix a corrupted fit file')
     fix_fit.add_argument(PATH, action='store', metavar='PATH', nargs='+',
                          help='path to fit file')
@@ -412,6 +429,8 @@ def parser():
     fix_fit_stage = fix_fit_process.add_mutually_exclusive_group()
     fix_fit_stage.add_argument(mm(DROP), action='store_true',
                                help='search for data that can be dropped to give a successful parse')
+    fix_fit_stage.add_argument(mm(RESYNC), action='store_true',
+                               help='like --drop, but a faster search (no backtracking) for large files')
     fix_fit_stage.add_argument(mm(SLICES), action='store', metavar='A:B,C:D,...',
                                help='data slices to pick')
     fix_fit_stage.add_argument(mm(START), action='store', type=to_time, metavar='TIME',
@@ -443,6 +462,8 @@ def parser():
                                 help='maximum number of bytes to drop in a single gap')
     fix_fit_params.add_argument(mm(MAX_DELTA_T), action='store', type=float, metavar='S',
                                 help='max number of seconds between timestamps')
+    fix_fit_params.add_argument(mm(MAX_TIME), action='store', type=float, metavar='S',
+                                help='max number of seconds for --resync (later data are discarded)')
 
     garmin = subparsers.add_parser(GARMIN, help='download monitor data from garmin connect')
     garmin.add_argument(DIR, action='store', metavar='DIR',
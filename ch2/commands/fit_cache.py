@@ -0,0 +1,42 @@
+
+from logging import getLogger
+from time import localtime, strftime
+
+from .args import SUB_COMMAND, SHOW, PRUNE, CLEAR, MAX_MB, MEMORY
+from ..fit.cache import FitCache, default_cache_dir
+
+log = getLogger(__name__)
+
+
+def fit_cache(args, db):
+    '''
+## fit-cache
+
+    > ch2 fit-cache show
+
+Display the size of the cache of decoded FIT files and the entries (most recently used first).
+
+    > ch2 fit-cache prune [--max-mb MB]
+
+Discard the least recently used entries until the cache is smaller than the given size.
+
+    > ch2 fit-cache clear
+
+Discard all entries.
+
+The cache is keyed by the hash of the file contents and lives next to the database.
+It is used when activities and monitor data are re-read (eg with --force) to avoid decoding the files again.
+    '''
+    if db.path == MEMORY:
+        raise Exception('No cache for in-memory database')
+    cache = FitCache(default_cache_dir(db.path))
+    cmd = args[SUB_COMMAND]
+    if cmd == SHOW:
+        entries = cache.entries()
+        for hash, size, used in entries:
+            print('%s %8.1fkB  %s' % (hash, size / 1024, strftime('%Y-%m-%d %H:%M:%S', localtime(used))))
+        print('%d entries, %.1fMB in %s' % (len(entries), sum(size for _, size, _ in entries) / 1024**2, cache.dir))
+    elif cmd == PRUNE:
+        log.info('Pruned %d entries' % cache.prune(max_mb=args[MAX_MB]))
+    elif cmd == CLEAR:
+        log.info('Deleted %d entries' % cache.clear())
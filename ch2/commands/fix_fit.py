@@ -4,7 +4,7 @@ from sys import stdout, stderr
 
 from .args import PATH, DROP, OUTPUT, SLICES, RAW, WARN, MIN_SYNC_CNT, MAX_RECORD_LEN, MAX_DROP_CNT, MAX_BACK_CNT, \
     MAX_FWD_LEN, DISCARD, FORCE, VALIDATE, ADD_HEADER, HEADER_SIZE, PROTOCOL_VERSION, PROFILE_VERSION, MAX_DELTA_T, \
-    NAME, FIX_HEADER, FIX_CHECKSUM, NAME_BAD, NAME_GOOD, mm, no, START
+    NAME, FIX_HEADER, FIX_CHECKSUM, NAME_BAD, NAME_GOOD, mm, no, START, RESYNC, MAX_TIME
 from ..fit.fix import fix
 from ..fit.profile.profile import read_fit
 
@@ -26,6 +26,10 @@ If `--slices` is specified then the given slices are taken from the data and use
 If `--drop` is specified then the program tries to find appropriate slices by discarding data until all the
 remaining data can be parsed.
 
+If `--resync` is specified then data are also discarded, but using a faster search that does not backtrack
+(suitable for large files with many errors).  The time taken can be limited with `--max-time` (data that
+have not been processed when the time expires are discarded).
+
 If `--fix-header` is specified then the header is corercted.
 
 If `--fix-checksum` is specified then the checksum is corrected.
@@ -40,6 +44,10 @@ Will attempt to drop the first 1000 bytes from the given file.
 
 Will attempt to fix the given file (in the test data from git).
 
+    > ch2 fix-fit FILE.FIT --resync --max-drop-cnt 100 --max-time 60 --fix-header --fix-checksum
+
+Will drop up to 100 gaps from the given file, taking no more than a minute.
+
     > ch2 fix-fit FILE.FIT --add-header --header-size 14 --slices :14,28: --fix-header --fix-checksum
 
 Will prepend a new 14 byte header, drop the old 14 byte header, and fix the header and checksum values.
@@ -48,7 +56,8 @@ Will prepend a new 14 byte header, drop the old 14 byte header, and fix the head
     check = args[NAME] is not None
     if check:
         name = NAME_GOOD if args[NAME] else NAME_BAD
-        if args[ADD_HEADER] or args[DROP] or args[SLICES] or args[START] or args[FIX_HEADER] or args[FIX_CHECKSUM]:
+        if args[ADD_HEADER] or args[DROP] or args[RESYNC] or args[SLICES] or args[START] or \
+                args[FIX_HEADER] or args[FIX_CHECKSUM]:
             raise Exception('Cannot check (%s) and modify at the same time' % mm(name))
         if not args[VALIDATE]:
             raise Exception('%s and %s makes no sense, numpty' % (mm(name), no(VALIDATE)))
@@ -70,7 +79,8 @@ Will prepend a new 14 byte header, drop the old 14 byte header, and fix the head
                        header_size=args[HEADER_SIZE], protocol_version=args[PROTOCOL_VERSION],
                        profile_version=args[PROFILE_VERSION], min_sync_cnt=args[MIN_SYNC_CNT],
                        max_record_len=args[MAX_RECORD_LEN], max_drop_cnt=args[MAX_DROP_CNT],
-                       max_back_cnt=args[MAX_BACK_CNT], max_fwd_len=args[MAX_FWD_LEN], max_delta_t=args[MAX_DELTA_T])
+                       max_back_cnt=args[MAX_BACK_CNT], max_fwd_len=args[MAX_FWD_LEN], max_delta_t=args[MAX_DELTA_T],
+                       resync=args[RESYNC], max_time=args[MAX_TIME])
         except:
             if check:
                 if not args[NAME]:
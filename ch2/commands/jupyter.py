@@ -6,7 +6,7 @@ from pkgutil import iter_modules
 from .args import SUB_COMMAND, SERVICE, START, STOP, SHOW, JUPYTER, LIST, PROGNAME, NAME, ARG, STATUS
 from ..squeal import SystemProcess
 from ..uranus import template
-from ..uranus.server import JupyterServer, get_controller
+from ..uranus.server import JUPYTER_SERVER, get_controller
 
 log = getLogger(__name__)
 
@@ -64,7 +64,7 @@ def stop():
 
 def status(db):
     with db.session_context() as s:
-        if SystemProcess.exists_any(s, JupyterServer):
+        if SystemProcess.exists_any(s, JUPYTER_SERVER):
             print('\n  Service running\n')
         else:
             print('\n  No service running\n')
@@ -14,7 +14,8 @@ def package_fit_profile(args, db):
     > ch2 package-fit-profile data/sdk/Profile.xlsx
 
 Parse the global profile and save the structures containing types and messages
-to a pickle file that is distributed with this package.
+to an indexed file that is distributed with this package (each type and message
+is read from the file only when needed).
 
 This command is intended for internal use only.
     '''
@@ -1,16 +1,29 @@
+from importlib import import_module
 
 from .frame import df, session, statistics, statistic_quartiles, activity_statistics, std_activity_statistics, \
     std_health_statistics, nearby_activities, bookmarks, statistic_names, statistics, present, linear_resample_time, \
     groups_by_time
 from .power import fit_power
 from .heart_rate import *
-from .plot import col_to_boxstats, box_plot, line_plotter, dot_plotter, bar_plotter, add_climbs, multi_plot, \
-    multi_dot_plot, multi_bar_plot, multi_line_plot, map_thumbnail, map_intensity, map_plot, histogram_plot, \
-    cumulative_plot, tile, comparison_line_plot, Calendar
 from .lib import chisq, fit, inplace_decay
-from .text import *
-from ..stoats.display.nearby import nearby_earlier, nearby_any_time
 from ..stoats.names import *
 
-# avoid cleaning of imports
-nearby_earlier, nearby_any_time, CLIMB_DISTANCE
+# these pull in large libraries (bokeh, textblob, urwid) that the statistics pipelines (which also use this
+# package) do not need, so are imported only when first used (or on `from ch2.data import *`)
+LAZY = dict([(name, '.plot') for name in
+             ('col_to_boxstats', 'box_plot', 'line_plotter', 'dot_plotter', 'bar_plotter', 'add_climbs',
+              'multi_plot', 'multi_dot_plot', 'multi_bar_plot', 'multi_line_plot', 'map_thumbnail',
+              'map_intensity', 'map_plot', 'histogram_plot', 'cumulative_plot', 'tile', 'comparison_line_plot',
+              'Calendar')] +
+            [(name, '.text') for name in ('wordlist', 'WeightedScorer')] +
+            [(name, '..stoats.display.nearby') for name in ('nearby_earlier', 'nearby_any_time')])
+
+
+def __getattr__(name):
+    if name in LAZY:
+        return getattr(import_module(LAZY[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+__all__ = [name for name in globals() if not name.startswith('_') and name not in ('import_module', 'LAZY')] + \
+          list(LAZY)
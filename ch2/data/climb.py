@@ -1,5 +1,6 @@
 
 from collections import namedtuple
+from heapq import heappush, heappop
 from itertools import groupby
 from logging import getLogger
 
@@ -89,6 +90,29 @@ def first_or_none(generator):
 
 
 def biggest_reversal(df):
+    # returns (drop, dlo, dhi) where the drop is from dhi down to (the later) dlo.
+    # a drop at j comes from the highest point before j (a running maximum), so this is linear.
+    # ties are broken as in biggest_reversal_by_offset (smallest separation, then earliest).
+    elevation, n = df[ELEVATION].values.astype(float), len(df)
+    if n < 3:
+        return 0, None, None
+    previous = np.fmax.accumulate(elevation[:-1])
+    previous[-1] = np.fmax.reduce(elevation[1:-1])  # the pair of end points is excluded
+    drops = previous - elevation[1:]
+    if np.all(np.isnan(drops)) or not np.nanmax(drops) > 0:
+        return 0, None, None
+    max_elevation, max_indices = np.nanmax(drops), (None, None)
+    for j in np.flatnonzero(drops == max_elevation) + 1:
+        lo = 1 if j == n - 1 else 0
+        i = np.flatnonzero(elevation[lo:j] - elevation[j] == max_elevation)[-1] + lo
+        if max_indices[0] is None or (j - i, i) < (max_indices[1] - max_indices[0], max_indices[0]):
+            max_indices = (i, j)
+    i, j = max_indices
+    return max_elevation, df.index[j], df.index[i]
+
+
+def biggest_reversal_by_offset(df):
+    # the original (quadratic) implementation - retained as a reference for tests
     max_elevation, max_indices, d = 0, (None, None), df.index[1] - df.index[0]
     for offset in range(1, len(df)-1):
         df[_d(ELEVATION)] = df[ELEVATION].diff(-offset)
@@ -117,7 +141,85 @@ def biggest_climb(df, params=Climb(), grid=10):
         return search(df, params=params)
 
 
-def search(df, params=Climb()):
+class RangeMin:
+    '''
+    Minimum over a range of an array in constant time (a sparse table).  NaN is ignored.
+    '''
+
+    def __init__(self, values):
+        n, width = len(values), 1
+        self.__levels = [values]
+        while 2 * width <= n:
+            prev = self.__levels[-1]
+            self.__levels.append(np.concatenate([np.fmin(prev[:-width], prev[width:]), np.full(width, np.nan)]))
+            width *= 2
+        self.__levels = np.stack(self.__levels)
+
+    def windows(self, lo, hi):
+        '''
+        The minimum of values[lo:hi+1] for each pair from the (array) lo, hi.
+        '''
+        level = np.floor(np.log2(hi - lo + 1)).astype(int)
+        return np.fmin(self.__levels[level, lo], self.__levels[level, hi + 1 - (1 << level)])
+
+
+def search(df, params=Climb(), leaf=16):
+    # returns (score, dlo, dhi)
+    # this is a branch and bound search over ranges of offsets.  the best rise for any offset in a
+    # range is bounded by the rise from the lowest point in a window (a running minimum) and the
+    # score is bounded using the smallest offset.  ranges that cannot beat the current best are
+    # dropped; the rest are split until small enough to evaluate exactly.
+    # the result (including ties) is the same as search_by_offset.
+    elevation, n = df[ELEVATION].values.astype(float), len(df)
+    d = df.index[1] - df.index[0]
+    lows = RangeMin(elevation)
+    best = (0, 0, None)  # score, offset, j (larger offset wins ties, then smaller j)
+
+    def min_rise(offset):
+        return max(params.min_elevation, params.min_gradient * d * offset / 100)
+
+    def bound(k1, k2):
+        j = np.arange(k1, n)
+        rise = elevation[j] - lows.windows(np.maximum(j - k2, 0), j - k1)
+        if np.all(np.isnan(rise)):
+            return 0
+        rise = np.nanmax(rise)
+        if not rise > min_rise(k1):
+            return 0
+        return rise / (d * k1) ** params.phi
+
+    def evaluate(k1, k2):
+        nonlocal best
+        for offset in range(k2, k1 - 1, -1):
+            rise = elevation[offset:] - elevation[:-offset]
+            valid = rise > min_rise(offset)
+            if valid.any():
+                score = rise / (d * offset) ** params.phi
+                max_score = score[valid].max()
+                if (max_score, offset) > best[:2]:
+                    best = (max_score, offset, np.flatnonzero(score == max_score)[0] + offset)
+
+    queue = [(-bound(1, n - 1), 1, n - 1)]
+    while queue:
+        b, k1, k2 = heappop(queue)
+        if -b * (1 + 1e-9) < best[0] or b == 0:
+            continue
+        if k2 - k1 < leaf:
+            evaluate(k1, k2)
+        else:
+            mid = (k1 + k2) // 2
+            for lo, hi in (k1, mid), (mid + 1, k2):
+                heappush(queue, (-bound(lo, hi), lo, hi))
+
+    score, offset, j = best
+    if score:
+        return score, df.index[j - offset], df.index[j]
+    else:
+        return 0, None, None
+
+
+def search_by_offset(df, params=Climb()):
+    # the original (quadratic) implementation - retained as a reference for tests
     # returns (score, dlo, dhi)
     # use times (indices) rather than ilocs because we're subdividing the data
     max_score, max_indices, d = 0, (None, None), df.index[1] - df.index[0]
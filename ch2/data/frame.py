@@ -6,18 +6,17 @@ from logging import getLogger
 
 import numpy as np
 import pandas as pd
-from sqlalchemy import inspect, select, and_, or_, distinct
+from sqlalchemy import inspect, select, and_, or_, distinct, type_coerce, Float
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.sql.functions import coalesce
 
 from .coasting import CoastingBookmark
 from ..lib.data import kargs_to_attr
-from ..lib.date import local_time_to_time, time_to_local_time, YMD, HMS
+from ..lib.date import local_time_to_time, time_to_local_time, YMD, HMS, to_time
 from ..squeal import StatisticName, StatisticJournal, StatisticJournalInteger, ActivityJournal, \
     StatisticJournalFloat, StatisticJournalText, Interval, StatisticMeasure, Source
 from ..squeal.database import connect, ActivityTimespan, ActivityGroup, ActivityBookmark, StatisticJournalType, \
-    Composite, CompositeComponent, ActivityNearby
-from ..stoats.display.nearby import nearby_any_time
+    Composite, CompositeComponent, ActivityNearby, ActivityBlob
 from ..stoats.names import DELTA_TIME, HEART_RATE, _src, FITNESS_D_ANY, FATIGUE_D_ANY, like, _log, HEART_RATE_BPM, \
     MED_HEART_RATE_BPM
 from ..stoats.names import DISTANCE_KM, SPEED_KMH, MED_SPEED_KMH, MED_HR_IMPULSE_10, MED_CADENCE, \
@@ -191,11 +190,28 @@ def _activity_statistics(s, *statistics, owner=None, constraint=None, start=None
     if constraint is None:
         constraint = activity_journal.activity_group
     names = _statistic_names(s, *statistics, owner=owner, constraint=constraint, check=check)
-    counts = Counter(name.name for name in names)
+    labels = _labels(names)
+    wide = _read_wide(s, names, start=start, finish=finish, source_ids=[activity_journal.id],
+                      activity_journal=activity_journal)
+    if wide is not None:
+        times, values, source_ids = wide
+        timespan_ids = _timespan_ids(s, activity_journal, times) if with_timespan else None
+        if not with_timespan or timespan_ids is not None:
+            df = _wide_frame(times, names, labels, values)
+            if with_timespan:
+                df[TIMESPAN_ID] = timespan_ids
+            return df
+    return _activity_statistics_by_join(s, names, labels, activity_journal, start=start, finish=finish,
+                                        with_timespan=with_timespan)
+
+
+def _activity_statistics_by_join(s, names, labels, activity_journal, start=None, finish=None, with_timespan=False):
+
+    # the original implementation (one outer-joined sub-select per statistic).  used when _read_wide
+    # cannot give the same result.
 
     t = _tables()
     ttj = _type_to_journal(t)
-    labels = [name.name if counts[name.name] == 1 else f'{name.name} ({name.constraint})' for name in names]
     tables = [ttj[name.statistic_journal_type] for name in names]
     time_select = select([distinct(t.sj.c.time).label("time")]).select_from(t.sj). \
         where(and_(t.sj.c.statistic_name_id.in_([n.id for n in names]),
@@ -335,6 +351,7 @@ def std_health_statistics(s, *extra, start=None, finish=None):
 def nearby_activities(s, local_time=None, time=None, activity_journal_id=None, activity_group_name=None):
     activity_journal_id = activity_journal(s, local_time, time, activity_journal_id,
                                            activity_group_name=activity_group_name)
+    from ..stoats.display.nearby import nearby_any_time  # display imports urwid
     return nearby_any_time(s, ActivityJournal.from_id(s, activity_journal_id))
 
 
@@ -372,11 +389,34 @@ def _type_to_journal(t):
 
 def statistics(s, *statistics, start=None, finish=None, owner=None, constraint=None, sources=None,
                with_sources=False, check=True):
+    names = statistic_names(s, *statistics, owner=owner, constraint=constraint, check=check)
+    labels = _labels(names)
+    # note that sources restrict the values, but not the times (as in the original join)
+    wide = _read_wide(s, names, start=start, finish=finish, with_sources=with_sources or bool(sources))
+    if wide is None:
+        return _statistics_by_join(s, names, labels, start=start, finish=finish, sources=sources,
+                                   with_sources=with_sources)
+    times, values, source_ids = wide
+    if sources:
+        ids = [source.id for source in sources]
+        for name in names:
+            keep = np.isin(source_ids[name.id][1], ids)
+            values[name.id] = tuple(x[keep] for x in values[name.id])
+            source_ids[name.id] = tuple(x[keep] for x in source_ids[name.id])
+    df = _wide_frame(times, names, labels, values)
+    if with_sources:
+        for name, label in zip(names, labels):
+            df[_src(label)] = _column(len(times), *source_ids[name.id], StatisticJournalType.INTEGER)
+    return df
+
+
+def _statistics_by_join(s, names, labels, start=None, finish=None, sources=None, with_sources=False):
+
+    # the original implementation (one outer-joined sub-select per statistic).  used when _read_wide
+    # cannot give the same result.
+
     t = _tables()
     ttj = _type_to_journal(t)
-    names = statistic_names(s, *statistics, owner=owner, constraint=constraint, check=check)
-    counts = Counter(name.name for name in names)
-    labels = [name.name if counts[name.name] == 1 else f'{name.name} ({name.constraint})' for name in names]
     tables = [ttj[name.statistic_journal_type] for name in names]
     time_select = select([distinct(t.sj.c.time).label("time")]).select_from(t.sj). \
         where(t.sj.c.statistic_name_id.in_([n.id for n in names]))
@@ -412,6 +452,110 @@ def statistics(s, *statistics, start=None, finish=None, owner=None, constraint=N
     return pd.read_sql_query(sql=sql, con=s.connection(), index_col=INDEX)
 
 
+def _labels(names):
+    counts = Counter(name.name for name in names)
+    return [name.name if counts[name.name] == 1 else f'{name.name} ({name.constraint})' for name in names]
+
+
+def _read_wide(s, names, start=None, finish=None, source_ids=None, with_sources=False, activity_journal=None):
+    '''
+    Read all values for the given names in a single query, ordered by (time, name), and pivot them in numpy.
+    If an activity journal is given then any packed data (ActivityBlob) are used instead of rows.
+
+    Returns (times, values, source_ids) where times are the distinct epoch times (float, sorted) and the
+    last two are dicts from statistic name id to (indices into times, array of values).  Returns None if
+    there is no data, or if a name has more than one value at a time (where the join gives repeated rows).
+    '''
+    t = _tables()
+    ids = [name.id for name in names]
+    columns = {}  # id -> (times, values, sources)
+    packed = ActivityBlob.read(s, activity_journal, ids) if activity_journal else {}
+    for id, (times, values) in packed.items():
+        keep = np.full(len(times), True)
+        if start:
+            keep &= times >= to_time(start).timestamp()
+        if finish:
+            keep &= times <= to_time(finish).timestamp()
+        columns[id] = (times[keep], values[keep].astype(object), np.full(np.sum(keep), activity_journal.id))
+    unpacked = [id for id in ids if id not in packed]
+    if unpacked:
+        q = select([t.sj.c.statistic_name_id, type_coerce(t.sj.c.time, Float), t.sj.c.source_id,
+                    coalesce(t.sjf.c.value, t.sji.c.value, t.sjt.c.value)]). \
+            select_from(t.sj.outerjoin(t.sjf).outerjoin(t.sji).outerjoin(t.sjt)). \
+            where(t.sj.c.statistic_name_id.in_(unpacked))
+        if start:
+            q = q.where(t.sj.c.time >= start)
+        if finish:
+            q = q.where(t.sj.c.time <= finish)
+        if source_ids is not None:
+            q = q.where(t.sj.c.source_id.in_(int(id) for id in source_ids))
+        q = q.order_by(t.sj.c.time, t.sj.c.statistic_name_id)
+        result = s.connection().execute(q)
+        rows = result.cursor.fetchall()  # no type conversions needed so avoid the overhead of RowProxy
+        result.close()
+        if rows:
+            name_ids, times, row_sources, row_values = zip(*rows)
+            name_ids, times = np.array(name_ids), np.array(times, dtype=float)
+            if np.any((np.diff(times) == 0) & (np.diff(name_ids) == 0)):
+                log.debug('Multiple values at a single time; using joins')
+                return None
+            row_values, row_sources = np.array(row_values, dtype=object), np.array(row_sources)
+            for id in unpacked:
+                selected = name_ids == id
+                columns[id] = (times[selected], row_values[selected], row_sources[selected])
+    if not any(len(columns[id][0]) for id in columns):
+        return None
+    unique = np.unique(np.concatenate([columns[id][0] for id in columns]))
+    values, sources = {}, {}
+    for id in ids:
+        times, column_values, column_sources = columns.get(id, ([], np.array([], dtype=object), []))
+        indices = np.searchsorted(unique, times)
+        values[id] = (indices, column_values)
+        if with_sources:
+            sources[id] = (indices, np.asarray(column_sources))
+    return unique, values, sources
+
+
+def _column(n, indices, values, type):
+    # match the types that pandas infers from the outer join (where null values are also missing)
+    known = np.not_equal(values, None)
+    if type != StatisticJournalType.TEXT and len(indices) == n and np.all(known):
+        return np.array(values.tolist())
+    elif type != StatisticJournalType.TEXT and np.any(known):
+        column = np.full(n, np.nan)
+        column[indices[known]] = values[known].astype(float)
+        return column
+    else:
+        column = np.full(n, None, dtype=object)
+        column[indices] = values
+        return column
+
+
+def _wide_frame(times, names, labels, values):
+    # convert epoch times in bulk (rounded to microseconds, like the Time type)
+    index = pd.to_datetime(np.round(times * 1e6).astype(np.int64), unit='us', utc=True)
+    index.name = INDEX
+    return pd.DataFrame(dict((label, _column(len(times), *values[name.id], name.statistic_journal_type))
+                             for name, label in zip(names, labels)), index=index)
+
+
+def _timespan_ids(s, activity_journal, times):
+    t = _tables()
+    q = select([t.at.c.id, type_coerce(t.at.c.start, Float), type_coerce(t.at.c.finish, Float)]). \
+        where(t.at.c.activity_journal_id == activity_journal.id)
+    indices, ids = [], []
+    for id, start, finish in s.connection().execute(q).fetchall():
+        within = np.flatnonzero((start <= times) & (times < finish))
+        indices.append(within)
+        ids.append(np.full(len(within), id))
+    indices = np.concatenate(indices) if indices else np.array([], dtype=int)
+    ids = np.concatenate(ids) if ids else np.array([], dtype=int)
+    if len(np.unique(indices)) != len(indices):
+        log.debug('Overlapping timespans; using joins')
+        return None
+    return _column(len(times), indices, ids, StatisticJournalType.INTEGER)
+
+
 def present(df, *names):
     if hasattr(df, 'columns'):
         return df is not None and all(name in df.columns and len(df[name].dropna()) for name in names)
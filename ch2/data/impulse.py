@@ -1,6 +1,7 @@
 
 import datetime as dt
 from collections import namedtuple
+from math import exp
 
 import pandas as pd
 
@@ -45,6 +46,15 @@ def calc(data, model):
     return data
 
 
+def restart(model, value):
+    '''
+    Modify the model so that the initial row added by pre_calc has the given (previously calculated) value.
+    This allows a calculation to continue from existing results.
+    '''
+    alpha = 1 - exp(-1 / model.period)  # see inplace_decay
+    return model._replace(start=(value * alpha - model.zero) / model.scale)
+
+
 def impulse_stats(df):
     stats = {}
     for pattern in FITNESS_D_ANY, FATIGUE_D_ANY:
@@ -0,0 +1,118 @@
+
+from glob import glob
+from logging import getLogger
+from os import makedirs, stat, utime, unlink, replace
+from os.path import join, exists, dirname, basename, splitext
+from pickle import dumps, loads, HIGHEST_PROTOCOL
+from zlib import compress, decompress
+
+from .format.records import Record
+
+log = getLogger(__name__)
+
+'''
+An on-disk cache of decoded FIT files.
+
+Entries are keyed by the md5 hash of the file (as stored in FileScan), so a file that is re-read
+(eg after --force) can skip decoding completely.  Each entry is a compressed pickle of the
+sorted records in a primitive form (no dynamically generated classes) that is expanded back into
+Record instances on read.
+
+The cache is bounded in size - the least recently used entries are discarded first.
+'''
+
+FIT_CACHE = 'fit-cache'
+EXTN = '.fcz'
+VERSION = 1  # increment if the record format changes (or decoding changes the results)
+DEFAULT_MAX_MB = 500
+
+
+def default_cache_dir(db_path):
+    return join(dirname(db_path), FIT_CACHE)
+
+
+class FitCache:
+
+    def __init__(self, dir, max_mb=DEFAULT_MAX_MB):
+        self.dir = dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+
+    def __path(self, hash):
+        return join(self.dir, hash + EXTN)
+
+    def get(self, hash):
+        '''
+        Return the cached (sorted) records for the file with the given hash, or None.
+        '''
+        path = self.__path(hash)
+        if exists(path):
+            try:
+                with open(path, 'rb') as input:
+                    version, records = loads(decompress(input.read()))
+                if version == VERSION:
+                    utime(path)  # mark as recently used
+                    log.debug(f'Read {len(records)} records from {path}')
+                    return [Record(*record) for record in records]
+                log.debug(f'Discarding old cache entry {path}')
+            except Exception as e:
+                log.warning(f'Could not read cache entry {path}: {e}')
+            self.__unlink(path)
+        return None
+
+    def put(self, hash, records):
+        '''
+        Cache the given records.  These should be forced (ie not lazy) so that the data can be saved.
+        '''
+        if not exists(self.dir):
+            makedirs(self.dir)
+        records = [(record.name, record.number, record.identity, record.timestamp, list(record.data_with()))
+                   for record in records]
+        path = self.__path(hash)
+        tmp = path + '.tmp'  # avoid partial entries if interrupted or another process is writing
+        with open(tmp, 'wb') as output:
+            output.write(compress(dumps((VERSION, records), protocol=HIGHEST_PROTOCOL)))
+        replace(tmp, path)
+        log.debug(f'Wrote {len(records)} records to {path}')
+        self.prune()
+
+    def entries(self):
+        '''
+        (hash, size, last used) for all entries, most recently used first.
+        '''
+        entries = []
+        for path in glob(join(self.dir, '*' + EXTN)):
+            try:
+                info = stat(path)
+                entries.append((splitext(basename(path))[0], info.st_size, info.st_mtime))
+            except FileNotFoundError:
+                pass  # deleted by another process
+        return sorted(entries, key=lambda entry: entry[2], reverse=True)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def prune(self, max_mb=None):
+        '''
+        Delete the least recently used entries until the cache is within the size limit.
+        Returns the number of entries deleted.
+        '''
+        max_bytes = self.max_bytes if max_mb is None else int(max_mb * 1024 * 1024)
+        total, deleted = 0, 0
+        for hash, size, _ in self.entries():
+            total += size
+            if total > max_bytes:
+                self.__unlink(self.__path(hash))
+                deleted += 1
+        if deleted:
+            log.debug(f'Pruned {deleted} entries from {self.dir}')
+        return deleted
+
+    def clear(self):
+        return self.prune(max_mb=0)
+
+    @staticmethod
+    def __unlink(path):
+        try:
+            unlink(path)
+        except FileNotFoundError:
+            pass
@@ -1,11 +1,15 @@
 
 import datetime as dt
+from collections import deque
 from logging import getLogger
+from struct import unpack
+from time import time
 
 from .format.tokens import FileHeader, token_factory, Checksum, State
+from .profile.messages import Missing
 from .profile.profile import read_profile
 from ..commands.args import ADD_HEADER, mm, HEADER_SIZE, PROFILE_VERSION, PROTOCOL_VERSION, MIN_SYNC_CNT, \
-    MAX_RECORD_LEN, MAX_DROP_CNT, MAX_BACK_CNT, MAX_FWD_LEN, MAX_DELTA_T
+    MAX_RECORD_LEN, MAX_DROP_CNT, MAX_BACK_CNT, MAX_FWD_LEN, MAX_DELTA_T, MAX_TIME
 from ..lib.date import format_time, format_seconds
 
 log = getLogger(__name__)
@@ -14,7 +18,8 @@ log = getLogger(__name__)
 def fix(data, warn=False,
         add_header=False, drop=False, slices=None, start=None, fix_header=False, fix_checksum=False, force=True,
         validate=True, header_size=None, protocol_version=None, profile_version=None, min_sync_cnt=3,
-        max_record_len=None, max_drop_cnt=1, max_back_cnt=3, max_fwd_len=200, max_delta_t=None, profile_path=None):
+        max_record_len=None, max_drop_cnt=1, max_back_cnt=3, max_fwd_len=200, max_delta_t=None, profile_path=None,
+        resync=False, max_time=None):
 
     slices = parse_slices(slices)
     types, messages = read_profile(log, warn=warn, profile_path=profile_path)
@@ -30,6 +35,11 @@ def fix(data, warn=False,
                            min_sync_cnt=min_sync_cnt, max_record_len=max_record_len, max_drop_cnt=max_drop_cnt,
                            max_back_cnt=max_back_cnt, max_fwd_len=max_fwd_len)
 
+    if resync:
+        slices = resync_data(State(types, messages, max_delta_t=max_delta_t), data, warn=warn, force=force,
+                             min_sync_cnt=min_sync_cnt, max_record_len=max_record_len, max_drop_cnt=max_drop_cnt,
+                             max_back_cnt=max_back_cnt, max_fwd_len=max_fwd_len, max_time=max_time)
+
     if slices:
         data = apply_slices(data, slices)
 
@@ -173,14 +183,14 @@ def process_checksum(data, state):
         # don't use memoryview here as it gets spread into state and token
         offset = len(FileHeader(data))
         while len(data) - offset > 2:
-            token = token_factory(data[offset:], state)
+            token = token_factory(data, state, offset=offset)
             offset += len(token)
         if len(data) - offset < 2:
             n = offset + 2 - len(data)
             log.warning('Adding %d byte(s) for checksum' % n)
             data += bytearray([0] * n)
         with memoryview(data) as view:
-            checksum = Checksum(view[offset:])
+            checksum = Checksum(view, offset=offset)
             checksum.repair(view, log)
         return data
     except Exception as e:
@@ -232,7 +242,7 @@ def set_start(data, types, messages, start):
     with memoryview(data) as view:
         offset = len(FileHeader(view))
         while len(view) - offset > 2:
-            token = token_factory(view[offset:], state)
+            token = token_factory(view, state, offset=offset)
             token.repair_timestamp(state)
             offset += len(token)
 
@@ -252,7 +262,7 @@ def validate_data(data, state, warn=False, force=True):
         file_header.validate(data, log)
         offset = len(file_header)
         while len(data) - offset > 2:
-            token = token_factory(data[offset:], state)
+            token = token_factory(data, state, offset=offset)
             if first_t and state.timestamp:
                 log.info('First timestamp: %s' % state.timestamp)
                 first_t = False
@@ -263,7 +273,7 @@ def validate_data(data, state, warn=False, force=True):
         log.info('Last timestamp:  %s' % state.timestamp)
         if state.timestamp > dt.datetime.now(tz=dt.timezone.utc):
             log.warning('Timestamp in future')
-        checksum = Checksum(data[offset:])
+        checksum = Checksum(data, offset=offset)
         checksum.validate(data, log)
         log.info('OK')
     except Exception as e:
@@ -297,11 +307,11 @@ def offset_tokens(state, data, offset=0, warn=False, force=True):
     '''
     try:
         if not offset:
-            file_header = FileHeader(data[offset:])
+            file_header = FileHeader(data, offset=offset)
             offset = len(file_header)
             yield offset, file_header
         while len(data) - offset > 2:
-            token = token_factory(data[offset:], state)
+            token = token_factory(data, state, offset=offset)
             record = token.parse_token(warn=warn)
             if force:
                 record.force()
@@ -389,3 +399,196 @@ def advance(initial_state, data, drop_count=0, initial_offset=0, warn=False, for
                     log.debug('%d: Backtrack at (drop %d, skip %d): "%s"' % (drop_count, back_cnt, delta, e))
     raise Backtrack('Search exhausted at %d' % initial_offset)
 
+
+def resync_data(initial_state, data, warn=False, force=True, min_sync_cnt=3, max_record_len=None, max_drop_cnt=1,
+                max_back_cnt=3, max_fwd_len=200, max_time=None):
+
+    log.info('Resync Data ----------')
+    for (name, value) in [(MIN_SYNC_CNT, min_sync_cnt), (MAX_RECORD_LEN, max_record_len),
+                          (MAX_DROP_CNT, max_drop_cnt), (MAX_BACK_CNT, max_back_cnt),
+                          (MAX_FWD_LEN, max_fwd_len), (MAX_DELTA_T, initial_state.max_delta_t),
+                          (MAX_TIME, max_time)]:
+        log_param(name, value)
+
+    resync = Resync(warn=warn, force=force, min_sync_cnt=min_sync_cnt, max_record_len=max_record_len,
+                    max_drop_cnt=max_drop_cnt, max_back_cnt=max_back_cnt, max_fwd_len=max_fwd_len,
+                    max_time=max_time)
+    with memoryview(data) as view:
+        slices = list(resync.slices(initial_state, view))
+    resync.report(len(data))
+    log.info('Found slices %s' % format_slices(slices))
+    return slices
+
+
+class Resync:
+    '''
+    An alternative to advance() for large files with many errors.
+
+    Data are read forwards, keeping the states (cheap, copy-on-write forks) at the last few token
+    boundaries.  On error, a single forward scan looks for resync points (header bytes consistent with
+    the definitions already seen), and each is checked by reading a bounded number of tokens from a fork
+    of the state (so timestamps are checked if max_delta_t is set).  The point that reads furthest is used.
+
+    There is no backtracking, so the time taken is (roughly) linear in the size of the data.  If
+    max_time is exceeded, or no resync point is found, the remaining data are discarded (with a warning).
+    '''
+
+    PROGRESS = 10  # seconds between progress reports
+    LOOKAHEAD = 20  # maximum number of tokens read when checking a resync point
+
+    def __init__(self, warn=False, force=True, min_sync_cnt=3, max_record_len=None, max_drop_cnt=1,
+                 max_back_cnt=3, max_fwd_len=200, max_time=None):
+        self.warn = warn
+        self.force = force
+        self.min_sync_cnt = min_sync_cnt
+        self.max_record_len = max_record_len
+        self.max_drop_cnt = max_drop_cnt
+        self.max_back_cnt = max_back_cnt
+        self.max_fwd_len = max_fwd_len
+        self.max_time = max_time
+        self.n_tokens = 0  # tokens read (not including checks)
+        self.n_scanned = 0  # offsets considered as resync points
+        self.n_checked = 0  # offsets checked by reading ahead
+        self.n_dropped = 0  # bytes dropped
+        self.n_drops = 0
+        self.__start = self.__reported = time()
+
+    def slices(self, state, data):
+        '''
+        Yield the slices of data to keep.
+        '''
+        self.__start = self.__reported = time()
+        recent = deque(maxlen=self.max_back_cnt)  # (offset, state before token) for the last few tokens
+        block = 0
+        try:
+            offset = len(FileHeader(data))
+        except Exception as e:
+            log.info('Could not read header (%s)' % e)
+            offset = None
+            recent.append((0, state))
+        while True:
+            if offset is not None:
+                offset, status = self.__read(state, data, offset, recent)
+                if status:
+                    log.info('Read %s from %d' % (status, block))
+                    yield from self.__keep(block, offset)
+                    return
+            if self.n_drops >= self.max_drop_cnt:
+                log.warning('Too many drops (%s %d); discarding data from offset %d' %
+                            (mm(MAX_DROP_CNT), self.max_drop_cnt, recent[-1][0]))
+                yield from self.__keep(block, recent[-1][0])
+                return
+            found = self.__search(data, recent)
+            if not found:
+                yield from self.__keep(block, recent[-1][0])
+                return
+            end, offset, state = found
+            log.info('Dropping %d bytes from offset %d' % (offset - end, end))
+            yield from self.__keep(block, end)
+            self.n_drops += 1
+            self.n_dropped += offset - end
+            block, state = offset, state.fork()
+            recent.clear()
+
+    @staticmethod
+    def __keep(start, finish):
+        if finish > start:
+            yield slice(start, finish)
+
+    def __read(self, state, data, offset, recent):
+        # read as far as possible, returning the final offset and a status if there's nothing more to do
+        while len(data) - offset > 2:
+            if self.__timed_out(offset, len(data)):
+                log.warning('Time limit reached (%s %s); discarding data from offset %d' %
+                            (mm(MAX_TIME), self.max_time, offset))
+                return offset, 'until time limit'
+            recent.append((offset, state))
+            state = state.fork()
+            try:
+                offset += self.__read_token(state, data, offset)
+            except Exception as e:
+                log.debug('Error (%s) at offset %d' % (e, offset))
+                return offset, None
+            self.n_tokens += 1
+        if len(data) - offset == 2:
+            return offset, 'complete'
+        else:
+            return offset, 'until end of data'
+
+    def __read_token(self, state, data, offset):
+        token = token_factory(data, state, offset=offset)
+        if self.max_record_len and len(token) > self.max_record_len:
+            raise Exception('Record too large (%d > %d)' % (len(token), self.max_record_len))
+        record = token.parse_token(warn=self.warn)
+        if self.force:
+            record.force()
+        return len(token)
+
+    def __search(self, data, recent):
+        # scan forwards (from each recent state) for an offset where we can start reading again.
+        # candidates are scored by how far we can then read (up to LOOKAHEAD tokens) and, for equal scores,
+        # the fewest bytes dropped are preferred.
+        best, best_score = None, self.min_sync_cnt - 1
+        for gap in range(1, self.max_fwd_len):
+            for end, state in reversed(recent):
+                offset = end + gap
+                if offset >= len(data):
+                    log.info('Exhausted data')
+                    return best
+                if self.__timed_out(end, len(data)):
+                    log.warning('Time limit reached (%s %s) searching from offset %d' %
+                                (mm(MAX_TIME), self.max_time, recent[-1][0]))
+                    return best
+                self.n_scanned += 1
+                if len(data) - offset == 2 or self.__plausible(state, data, offset):  # checksum or header
+                    score = self.__check(state, data, offset)
+                    if score > best_score:
+                        best, best_score = (end, offset, state), score
+                        if score > self.LOOKAHEAD:
+                            return best
+        if not best:
+            log.warning('No resync point within %s %d of offset %d' %
+                        (mm(MAX_FWD_LEN), self.max_fwd_len, recent[-1][0]))
+        return best
+
+    @staticmethod
+    def __plausible(state, data, offset):
+        # a cheap test of the header byte (and, for definitions, the fixed fields) given the state
+        header = data[offset]
+        if header & 0x80:
+            return state.timestamp is not None and (header & 0x60) >> 5 in state.definitions
+        elif header & 0x40:
+            if len(data) - offset < 6 or data[offset+1] or data[offset+2] > 1 or not data[offset+5]:
+                return False  # reserved byte, architecture and field count
+            number = unpack('<>'[data[offset+2]] + 'H', data[offset+3:offset+5])[0]
+            return not isinstance(state.messages.number_to_message(number), Missing) or \
+                any(definition.global_message_no == number for definition in state.definitions.values())
+        else:
+            return not header & 0x20 and header & 0x0f in state.definitions
+
+    def __check(self, state, data, offset):
+        # the number of tokens read from a fork of the state (more than LOOKAHEAD if we reach the checksum)
+        self.n_checked += 1
+        state = state.fork()
+        for count in range(self.LOOKAHEAD):
+            if len(data) - offset <= 2:
+                return self.LOOKAHEAD + 1 if len(data) - offset == 2 else count
+            try:
+                offset += self.__read_token(state, data, offset)
+            except Exception:
+                return count
+        return self.LOOKAHEAD + 1
+
+    def __timed_out(self, offset, length):
+        now = time()
+        if now - self.__reported > self.PROGRESS:
+            self.__reported = now
+            log.info('Resync at offset %d/%d (%d%%): %d tokens, %d drops' %
+                     (offset, length, 100 * offset / length, self.n_tokens, self.n_drops))
+        return self.max_time and now - self.__start > self.max_time
+
+    def report(self, length):
+        log.info('Resync read %d tokens in %s; dropped %d/%d bytes in %d gaps '
+                 '(scanned %d offsets, checked %d)' %
+                 (self.n_tokens, format_seconds(time() - self.__start), self.n_dropped, length, self.n_drops,
+                  self.n_scanned, self.n_checked))
@@ -0,0 +1,240 @@
+
+import datetime as dt
+from collections import OrderedDict, defaultdict
+from logging import getLogger
+
+import numpy as np
+
+from .records import merge_duplicates
+from .tokens import Defined, CompressedTimestamp
+from ..profile.fields import CompositeField
+from ..profile.types import time_to_timestamp, FIT_EPOCH, Date
+
+log = getLogger(__name__)
+
+TIMESTAMP = 'timestamp'
+
+
+class Columns:
+    '''
+    All the data messages of a single type, decoded into arrays (one per field).
+
+    Each column is a numpy masked array, masked where the value is bad (ie where the record
+    would contain None) or where the field is missing from the definition used for that message.
+    Fields with a single value are 1D; fields with several values per message are 2D (masked
+    value by value, so the record contains None only where the whole row is masked).  Fields that
+    appear more than once in a message (eg dynamic fields that resolve to the same name) have all
+    values (see merge_duplicates).
+
+    The timestamp column is the timestamp for the message (as for Record.timestamp) so includes
+    compressed timestamps.
+
+    The identity (see Identity) and file offset of each message are also kept, and names() and
+    values() give the data for a single message as they appear in the record.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.units = {}
+        self.identities = []
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self._columns = OrderedDict()
+        self._present = {}
+        self._tzinfo = {}
+
+    def __len__(self):
+        return len(self._columns[TIMESTAMP]) if TIMESTAMP in self._columns else 0
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def keys(self):
+        return self._columns.keys()
+
+    def items(self):
+        return self._columns.items()
+
+    def names(self, i):
+        '''
+        The names of the fields in the record for message i (including bad values).
+        '''
+        return [name for name in self._columns if self._present[name][i]]
+
+    def values(self, name, i):
+        '''
+        The values of the field in the record for message i - a tuple, or None if bad.
+        '''
+        column = self._columns[name]
+        mask = np.ma.getmaskarray(column)[i]
+        if mask.all():
+            return None
+        elif column.ndim == 2:
+            # bad values (only) are unscaled integers
+            return tuple(int(value) if bad and isinstance(value, float) and value.is_integer() else value
+                         for value, bad in zip(column.data[i].tolist(), mask.tolist()))
+        value = column.data[i]
+        if column.dtype.kind == 'M':
+            value = value.tolist().replace(tzinfo=self._tzinfo[name])
+        elif column.dtype != object:
+            value = value.tolist()
+        return tuple(value) if isinstance(value, (tuple, list)) else (value,)
+
+    def _put(self, name, n, indices, values, mask, units=None, tzinfo=None):
+        if name not in self._columns:
+            column = np.ma.masked_all((n,) + values.shape[1:], dtype=values.dtype)
+            self._columns[name] = column
+            self._present[name] = np.zeros(n, dtype=bool)
+            self._tzinfo[name] = tzinfo
+            self.units[name] = units
+        column = self._columns[name]
+        if column.shape[1:] != values.shape[1:]:
+            log.warning('Inconsistent size for %s.%s (%s/%s)' % (self.name, name, column.shape, values.shape))
+            return
+        if column.dtype != values.dtype:
+            dtype = object if object in (column.dtype, values.dtype) else np.result_type(column.dtype, values.dtype)
+            column = column.astype(dtype)
+            self._columns[name] = column
+        column[indices] = np.ma.array(values, mask=mask)
+        self._present[name][indices] = True
+
+
+class ColumnBuilder:
+
+    def __init__(self, name, state, field_names=None, **options):
+        self.__name = name
+        self.__state = state
+        self.__field_names = field_names
+        self.__options = options
+        self.__tokens = []
+        self.__offsets = []
+        self.__extra = []
+        self.__plans = {}
+
+    def add(self, offset, token):
+        plan = self.__plan(token.definition)
+        self.__tokens.append(token)
+        self.__offsets.append(offset)
+        self.__extra.append(self.__parse(token) if plan[1] else None)
+
+    def __plan(self, definition):
+        # (fast, slow) where fast are the fields we can vectorise and slow the offsets of the rest.
+        # fields that a composite also produces are slow, so that the values are merged.
+        key = id(definition)
+        if key not in self.__plans:
+            fast, slow = [], set()
+            components = set(name for field in definition.fields if isinstance(field.field, CompositeField)
+                             for name in field.field.references)
+            for field in definition.fields:
+                name = field.name if field.field else '@%d:%d' % (field.start, field.finish)
+                if name == TIMESTAMP or (self.__field_names and name not in self.__field_names):
+                    continue
+                if field.field:
+                    vectorised = field.field.vectorise_field(field.count, definition.endian)
+                else:
+                    vectorised = field.base_type.vectorise_type(field.count, definition.endian)
+                    if vectorised: vectorised += (None,)
+                if vectorised and field.count and vectorised[0].itemsize * field.count <= field.size and \
+                        name not in self.__state.accumulators and name not in components:
+                    fast.append((name, field) + vectorised)
+                else:
+                    slow.add(field.start)
+            self.__plans[key] = (fast, slow)
+        return self.__plans[key]
+
+    def __parse(self, token):
+        # the fields we cannot vectorise are parsed as normal (must be done in order for accumulators)
+        fast, slow = self.__plan(token.definition)
+        fast_names = set(name for name, *_ in fast)
+        record = token.parse_token(only=slow, **self.__options).force(merge_duplicates)
+        return dict((name, values_and_units) for name, values_and_units in record.data.items()
+                    if name != TIMESTAMP and name not in fast_names and
+                    (not self.__field_names or name in self.__field_names))
+
+    def build(self):
+        columns, n = Columns(self.__name), len(self.__tokens)
+        columns.identities = [token.definition.identity for token in self.__tokens]
+        columns.offsets = np.array(self.__offsets, dtype=np.int64)
+        self.__build_timestamps(columns, n)
+        groups = defaultdict(list)
+        for i, token in enumerate(self.__tokens):
+            groups[id(token.definition)].append(i)
+        for indices in groups.values():
+            self.__build_fast(columns, n, np.array(indices))
+        self.__build_slow(columns, n)
+        return columns
+
+    def __build_timestamps(self, columns, n):
+        # the record only has a timestamp field if it is in the definition or the header
+        fields = [token.definition.timestamp_field for token in self.__tokens]
+        fields = [field if field is not None and field.name == TIMESTAMP else None for field in fields]
+        present = np.array([field is not None or isinstance(token, CompressedTimestamp)
+                            for field, token in zip(fields, self.__tokens)], dtype=bool)
+        units = next((field.field.units for field in fields if field is not None), 's')
+        times = [token.timestamp for token in self.__tokens]
+        mask = np.array([time is None for time in times], dtype=bool)
+        values = np.array([0 if time is None else time_to_timestamp(time) for time in times], dtype=np.int64)
+        if not self.__options.get('raw_time', False):
+            values = (values + FIT_EPOCH).astype('datetime64[s]')
+        columns._put(TIMESTAMP, n, np.arange(n), values, mask, units=units, tzinfo=dt.timezone.utc)
+        columns._present[TIMESTAMP] = present
+
+    def __build_fast(self, columns, n, indices):
+        definition = self.__tokens[indices[0]].definition
+        fast, _ = self.__plan(definition)
+        if fast:
+            data = b''.join(bytes(self.__tokens[i].data) for i in indices)
+            raw = np.frombuffer(data, dtype=np.uint8).reshape(len(indices), definition.size)
+            for name, field, dtype, convert, units in fast:
+                finish = field.start + dtype.itemsize * field.count
+                values = np.ascontiguousarray(raw[:, field.start:finish]).view(dtype)
+                values, mask = convert(values, **self.__options)
+                if field.count == 1:
+                    values, mask = values[:, 0], mask[:, 0]
+                tzinfo = field.field.type.tzinfo if field.field and isinstance(field.field.type, Date) else None
+                columns._put(name, n, indices, values, mask, units=units, tzinfo=tzinfo)
+
+    def __build_slow(self, columns, n):
+        names = OrderedDict()
+        for extra in self.__extra:
+            if extra:
+                names.update((name, None) for name in extra)
+        for name in names:
+            indices = np.array([i for i, extra in enumerate(self.__extra) if extra and name in extra])
+            values = np.empty(len(indices), dtype=object)
+            values[:] = [self.__unpack(self.__extra[i][name][0]) for i in indices]
+            mask = np.array([self.__extra[i][name][0] is None for i in indices], dtype=bool)
+            columns._put(name, n, indices, values, mask, units=self.__extra[indices[0]][name][1])
+
+    @staticmethod
+    def __unpack(values):
+        if values is not None and len(values) == 1:
+            return values[0]
+        else:
+            return values
+
+
+def read_columns(state, tokens, record_names=None, field_names=None, select=None, **options):
+    '''
+    Read the tokens, returning an ordered dict from message name to Columns.
+
+    If given, select(i, offset) is called for every token (in order) and only data from those
+    selected is included.
+
+    Options are passed to parse_token (map_values, raw_time, check_bad) and the equivalent
+    vectorised conversions.
+    '''
+    builders = OrderedDict()
+    for i, (offset, token) in enumerate(tokens):
+        selected = select is None or select(i, offset)
+        if isinstance(token, Defined):
+            name = token.definition.message.name
+            if token.is_user and (not record_names or name in record_names) and selected:
+                if name not in builders:
+                    builders[name] = ColumnBuilder(name, state, field_names=field_names, **options)
+                builders[name].add(offset, token)
+            elif state.accumulators and any(field.name in state.accumulators for field in token.definition.fields):
+                token.parse_token(**options).force()  # keep accumulators consistent
+    return OrderedDict((name, builder.build()) for name, builder in builders.items())
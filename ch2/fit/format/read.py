@@ -1,5 +1,6 @@
 from logging import getLogger
 
+from .columns import read_columns
 from .records import restrict_names
 from .tokens import State, FileHeader, token_factory, Checksum
 from ..profile.profile import read_profile
@@ -8,24 +9,32 @@ from ...lib.data import tohex
 log = getLogger(__name__)
 
 
-def parse_data(data, types, messages, no_validate=False, max_delta_t=None):
+def parse_data(data, types, messages, no_validate=False, max_delta_t=None, trust_crc=False):
+    '''
+    The final checksum is calculated incrementally, as tokens are read.  If trust_crc is set then
+    it is not checked at all (used for files that are known to be unchanged since they were validated).
+    '''
 
     state = State(types, messages, max_delta_t=max_delta_t)
 
     def generator():
         offset = 0
         try:
-            file_header = FileHeader(data[offset:])
+            file_header = FileHeader(data, offset=offset)
             yield offset, file_header
             offset = len(file_header)
             file_header.validate(data, log, quiet=no_validate)
+            crc = None if trust_crc else Checksum.crc(file_header.data)
             while len(data) - offset > 2:
-                token = token_factory(data[offset:], state)
+                token = token_factory(data, state, offset=offset)
+                if crc is not None:
+                    crc = Checksum.crc(token.data, crc)
                 yield offset, token
                 offset += len(token)
-            checksum = Checksum(data[offset:])
+            checksum = Checksum(data, offset=offset)
             yield offset, checksum
-            checksum.validate(data, log, quiet=no_validate)
+            if not trust_crc:
+                checksum.validate(data, log, quiet=no_validate, checksum=crc)
         except Exception as e:
             log.warning('"%s" at offset %d' % (e, offset))
             dump(data, offset)
@@ -45,23 +54,40 @@ def dump(data, offset, rows=3, blocks=6, block=4):
         if offset >= len(data): return
 
 
+def window(after_bytes=None, limit_bytes=-1, after_records=None, limit_records=-1):
+    '''
+    A predicate select(i, offset) that is true for tokens in the given range.  It must be called
+    for every token, in order.
+    '''
+
+    first_record = 0 if (after_records is None) else None
+    first_bytes = 0 if (after_bytes is None) else None
+
+    def select(i, offset):
+        nonlocal first_record, first_bytes
+        if (first_record is None and (after_records is not None and i >= after_records)) or \
+                (first_bytes is None and (after_bytes is not None and offset >= after_bytes)):
+            first_record = i
+            first_bytes = offset
+        return (first_record is not None and (limit_records < 0 or i - first_record < limit_records)) and \
+               (first_bytes is not None and (limit_bytes < 0 or offset - first_bytes < limit_bytes))
+
+    return select
+
+
 def filtered_tokens(data,
                     after_bytes=None, limit_bytes=-1, after_records=None, limit_records=-1,
-                    warn=False, no_validate=False, max_delta_t=None, profile_path=None):
+                    warn=False, no_validate=False, max_delta_t=None, profile_path=None, trust_crc=False):
 
     types, messages = read_profile(log, warn=warn, profile_path=profile_path)
-    state, tokens = parse_data(data, types, messages, no_validate=no_validate, max_delta_t=max_delta_t)
+    state, tokens = parse_data(data, types, messages, no_validate=no_validate, max_delta_t=max_delta_t,
+                               trust_crc=trust_crc)
 
     def generator():
-        first_record = 0 if (after_records is None) else None
-        first_bytes = 0 if (after_bytes is None) else None
+        select = window(after_bytes=after_bytes, limit_bytes=limit_bytes,
+                        after_records=after_records, limit_records=limit_records)
         for i, (offset, token) in enumerate(tokens):
-            if (first_record is None and (after_records is not None and i >= after_records)) or \
-                    (first_bytes is None and (after_bytes is not None and offset >= after_bytes)):
-                first_record = i
-                first_bytes = offset
-            if (first_record is not None and (limit_records < 0 or i - first_record < limit_records)) and \
-                    (first_bytes is not None and (limit_bytes < 0 or offset - first_bytes < limit_bytes)):
+            if select(i, offset):
                 yield i, offset, token
 
     return types, messages, generator()
@@ -71,27 +97,45 @@ def filtered_records(data,
                      after_bytes=None, limit_bytes=-1, after_records=None, limit_records=-1,
                      record_names=None, field_names=None,
                      warn=False, no_validate=False, internal=False, max_delta_t=None,
-                     profile_path=None, pipeline=None):
+                     profile_path=None, pipeline=None, trust_crc=False):
 
     if pipeline is None: pipeline = []
     if field_names: pipeline.append(restrict_names(field_names))
     types, messages = read_profile(log, warn=warn, profile_path=profile_path)
-    state, tokens = parse_data(data, types, messages, no_validate=no_validate, max_delta_t=max_delta_t)
+    state, tokens = parse_data(data, types, messages, no_validate=no_validate, max_delta_t=max_delta_t,
+                               trust_crc=trust_crc)
 
     def generator():
-        first_record = 0 if (after_records is None) else None
-        first_bytes = 0 if (after_bytes is None) else None
+        select = window(after_bytes=after_bytes, limit_bytes=limit_bytes,
+                        after_records=after_records, limit_records=limit_records)
         for i, (offset, token) in enumerate(tokens):
-            if (first_record is None and (after_records is not None and i >= after_records)) or \
-                    (first_bytes is None and (after_bytes is not None and offset >= after_bytes)):
-                first_record = i
-                first_bytes = offset
+            selected = select(i, offset)
             record = token.parse_token(warn=warn)
             if state.accumulators: record = record.force(*pipeline)
-            if (internal or token.is_user) and (not record_names or record.name in record_names) and \
-                    (first_record is not None and (limit_records < 0 or i - first_record < limit_records)) and \
-                    (first_bytes is not None and (limit_bytes < 0 or offset - first_bytes < limit_bytes)):
+            if (internal or token.is_user) and (not record_names or record.name in record_names) and selected:
                 if not state.accumulators: record = record.force(*pipeline)
                 yield i, offset, record
 
     return types, messages, generator()
+
+
+def filtered_columns(data,
+                     after_bytes=None, limit_bytes=-1, after_records=None, limit_records=-1,
+                     record_names=None, field_names=None,
+                     warn=False, no_validate=False, max_delta_t=None, profile_path=None, trust_crc=False,
+                     **options):
+    '''
+    An alternative to filtered_records that returns the data messages as arrays (see Columns),
+    keyed by message name.  Much faster for large files since most fields are converted
+    with numpy rather than per message.
+
+    Used for tables (summarize_tables) - the activity readers still use records.
+    '''
+
+    types, messages = read_profile(log, warn=warn, profile_path=profile_path)
+    state, tokens = parse_data(data, types, messages, no_validate=no_validate, max_delta_t=max_delta_t,
+                               trust_crc=trust_crc)
+    select = window(after_bytes=after_bytes, limit_bytes=limit_bytes,
+                    after_records=after_records, limit_records=limit_records)
+    return types, messages, read_columns(state, tokens, record_names=record_names, field_names=field_names,
+                                         select=select, warn=warn, **options)
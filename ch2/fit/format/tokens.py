@@ -1,14 +1,15 @@
 
 from abc import abstractmethod
 from collections import defaultdict, Counter
+from copy import copy
 from logging import getLogger
 from re import sub
-from struct import unpack, pack
+from struct import unpack, pack, Struct, calcsize
 
 from .records import LazyRecord, merge_duplicates
 from ..profile.fields import TypedField, TIMESTAMP_GLOBAL_TYPE, DynamicField, CompositeField
 from ..profile.types import timestamp_to_time, time_to_timestamp
-from ...lib.data import WarnDict, tohex
+from ...lib.data import WarnDict, tohex, LayeredDict
 from ...stoats.names import S
 
 log = getLogger(__name__)
@@ -126,8 +127,9 @@ class FileHeader(ValidateToken):
     Contains extra functionality to allow modification when fixing FIT files.
     '''
 
-    def __init__(self, data):
-        super().__init__('HDR', False, data[:data[0]])
+    def __init__(self, data, offset=0):
+        super().__init__('HDR', False, data[offset:offset+data[offset]])
+        data = data[offset:offset+14]  # fields are read even if header_size is short
         self.header_size = data[0]
         self.protocol_version = data[1]
         self.profile_version = unpack('<H', data[2:4])[0]
@@ -213,25 +215,27 @@ class Defined(Token):
     '''
     A chunk of data from a FIT file that is associated with a single local message.  Bundled with
     the Definition for that type, which itself contains a reference to the Message and Fields the data contain.
+
+    The token starts at offset within data, so only the bytes for this token are copied.
     '''
 
     __slots__ = ('definition', 'timestamp', '_accumulators')
 
-    def __init__(self, tag, data, state, local_message_type):
+    def __init__(self, tag, data, state, local_message_type, offset=0):
         self.definition = state.definitions[local_message_type]
         if self.definition.timestamp_field:
-            self.__parse_timestamp(data, state)
+            self.__parse_timestamp(data, state, offset)
         self.timestamp = state.timestamp
         self._accumulators = state.accumulators
-        if len(data) < self.definition.size:
+        if len(data) - offset < self.definition.size:
             raise Exception('Insufficient data for %s (%d/%d)' %
-                            (self.definition.identity, len(data), self.definition.size))
-        super().__init__(tag, True, data[0:self.definition.size])
+                            (self.definition.identity, len(data) - offset, self.definition.size))
+        super().__init__(tag, True, data[offset:offset+self.definition.size])
 
-    def __parse_timestamp(self, data, state):
+    def __parse_timestamp(self, data, state, offset):
         field = self.definition.timestamp_field
-        times = field.field.type.parse_type(data[field.start:field.finish], 1, self.definition.endian, state.timestamp,
-                                            check_bad=False)
+        times = field.field.type.parse_type(data[offset+field.start:offset+field.finish], 1, self.definition.endian,
+                                            state.timestamp, check_bad=False)
         if times:
             state.timestamp = times[0]
         else:
@@ -265,8 +269,8 @@ class Defined(Token):
 
 class DeveloperField(Defined):
 
-    def __init__(self, data, state):
-        super().__init__('FLD', data, state, data[0] & 0x0f)
+    def __init__(self, data, state, offset=0):
+        super().__init__('FLD', data, state, data[offset] & 0x0f, offset=offset)
         self.__parse_field_definition(state)
         self.is_user = False
 
@@ -288,22 +292,23 @@ class Data(Defined):
 
     __slots__ = ()
 
-    def __init__(self, data, state):
-        super().__init__('DTA', data, state, data[0] & 0x0f)
+    def __init__(self, data, state, offset=0):
+        super().__init__('DTA', data, state, data[offset] & 0x0f, offset=offset)
 
 
 class CompressedTimestamp(Defined):
 
     __slots__ = ()
 
-    def __init__(self, data, state):
-        offset = data[0] & 0x1f
+    def __init__(self, data, state, offset=0):
+        header = data[offset]
+        delta = header & 0x1f
         if not state.timestamp:
             raise Exception('Compressed timestamp with no preceding absolute timestamp')
         timestamp = time_to_timestamp(state.timestamp)
-        rollover = offset < timestamp & 0x1f
-        state.timestamp = timestamp_to_time((timestamp & 0xffffffe0) + offset + (0x20 if rollover else 0))
-        super().__init__('DTT', data, state, (data[0] & 0x60) >> 5)
+        rollover = delta < timestamp & 0x1f
+        state.timestamp = timestamp_to_time((timestamp & 0xffffffe0) + delta + (0x20 if rollover else 0))
+        super().__init__('DTT', data, state, (header & 0x60) >> 5, offset=offset)
 
     def parse_token(self, raw_time=False, **options):
         timestamp = time_to_timestamp(self.timestamp) if raw_time else self.timestamp
@@ -346,6 +351,40 @@ class Field:
         self.finish = 0
 
 
+class Decoder:
+    '''
+    A precompiled decoder for the Data tokens of a Definition.
+
+    All the fields that can be compiled are read with a single struct unpack; the remaining
+    (dynamic, composite, unknown) fields are skipped here and parsed separately by the Message.
+    '''
+
+    def __init__(self, fields, sorted_fields, endian):
+        '''
+        fields are in the order they appear in the data; sorted_fields are the fields as they will be
+        parsed (and may not be a simple re-ordering when names are duplicated).
+        '''
+        formats, parsers, index = ['<>'[endian], 'x'], {}, 0  # skip header
+        for field in fields:
+            compiled = field.field.compile_field(field.count, endian) if field.field else None
+            # the profile type may not match the base type in the file
+            n_bytes = calcsize('<' + compiled[0]) if compiled else 0
+            if compiled and n_bytes <= field.size:
+                format, parse = compiled
+                formats.append(format)
+                if field.size > n_bytes:
+                    formats.append('%dx' % (field.size - n_bytes))
+                parsers[id(field)] = (index, index + field.count, field.start, field.start + n_bytes, parse)
+                index += field.count
+            else:
+                formats.append('%dx' % field.size)
+        self.struct = Struct(''.join(formats)) if parsers else None
+        self.parsers = tuple(parsers.get(id(field), None) for field in sorted_fields)
+
+    def unpack(self, data):
+        return self.struct.unpack_from(data) if self.struct else None
+
+
 class Definition(Token):
 
     '''
@@ -356,26 +395,27 @@ class Definition(Token):
     parse the data.
     '''
 
-    def __init__(self, data, state, overhead=6, tag='DFN'):
-        self.local_message_type = data[0] & 0x0f
+    def __init__(self, data, state, overhead=6, tag='DFN', offset=0):
+        self.local_message_type = data[offset] & 0x0f
         self.is_user = False
         self.references = set()
         self.timestamp_field = None
-        self.endian = data[2] & 0x01
-        self.global_message_no = unpack('<>'[self.endian]+'H', data[3:5])[0]
+        self.endian = data[offset+2] & 0x01
+        self.global_message_no = unpack('<>'[self.endian]+'H', data[offset+3:offset+5])[0]
         self.message = state.messages.number_to_message(self.global_message_no)
         self.identity = Identity(self.message.name, state.definition_counter)
-        self.fields = self.__process_fields(self._make_fields(data, state), state)
+        self.fields = self.__process_fields(self._make_fields(data, state, offset), state)
         self.accumulators = state.accumulators
-        super().__init__(tag, False, data[0:overhead+3*len(self.fields)])
+        super().__init__(tag, False, data[offset:offset+overhead+3*len(self.fields)])
         state.definitions[self.local_message_type] = self
 
-    def _make_fields(self, data, state):
-        yield from self.__fields(data, state.types)
+    def _make_fields(self, data, state, offset):
+        yield from self.__fields(data, state.types, offset)
 
-    def __fields(self, data, types):
-        for i in range(data[5]):
-            yield self.__field(data[6 + i * 3:6 + (i + 1) * 3], self.message, types)
+    def __fields(self, data, types, offset):
+        for i in range(data[offset+5]):
+            start = offset + 6 + i * 3
+            yield self.__field(data[start:start+3], self.message, types)
 
     def __field(self, data, message, types):
         number, size, base = data
@@ -400,7 +440,9 @@ class Definition(Token):
                 if isinstance(field.field, DynamicField):
                     self.references.update(field.field.references)
         self.size = offset
-        return tuple(self.__sorted(fields))
+        sorted_fields = tuple(self.__sorted(fields))
+        self.decoder = Decoder(fields, sorted_fields, self.endian)
+        return sorted_fields
 
     def __provided_by(self, field):
         yield field.name
@@ -474,16 +516,16 @@ class Definition(Token):
 
 class DeveloperDefinition(Definition):
 
-    def __init__(self, data, state):
-        super().__init__(data, state, overhead=7, tag='DFX')
+    def __init__(self, data, state, offset=0):
+        super().__init__(data, state, overhead=7, tag='DFX', offset=offset)
 
-    def _make_fields(self, data, state):
-        yield from super()._make_fields(data, state)
-        for field_data in self.__field_data(data):
+    def _make_fields(self, data, state, offset):
+        yield from super()._make_fields(data, state, offset)
+        for field_data in self.__field_data(data, offset):
             yield self.__field(field_data, state.dev_fields)
 
-    def __field_data(self, data):
-        offset = data[5] * 3 + 7
+    def __field_data(self, data, offset=0):
+        offset += data[offset+5] * 3 + 7
         n_dev_fields = data[offset-1]
         for i in range(n_dev_fields):
             yield data[offset + i * 3:offset + (i + 1) * 3]
@@ -502,30 +544,44 @@ class DeveloperDefinition(Definition):
             yield '  %s - dev fld %d/%d' % (tohex(field_data), fdn, ddi)
 
 
-class Checksum(ValidateToken):
+def _crc_table():
+    # expand the nibble table from the FIT SDK to a byte-wide table
+    nibbles = [0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401,
+               0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400]
+    table = []
+    for byte in range(256):
+        checksum = nibbles[byte & 0xf]
+        checksum = ((checksum >> 4) & 0xfff) ^ nibbles[checksum & 0xf] ^ nibbles[(byte >> 4) & 0xf]
+        table.append(checksum)
+    return tuple(table)
 
-    @staticmethod
-    def crc(data):
 
-        CRC = [0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401,
-               0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400]
+CRC_TABLE = _crc_table()
+
+
+class Checksum(ValidateToken):
 
-        checksum = 0
+    @staticmethod
+    def crc(data, checksum=0):
+        '''
+        The FIT CRC of data.  Pass the previous result as checksum to continue an earlier calculation
+        (so the CRC can be calculated incrementally, as tokens are read).
+        '''
+        table = CRC_TABLE
         for byte in data:
-            tmp = CRC[checksum & 0xf]
-            checksum = (checksum >> 4) & 0xfff
-            checksum = checksum ^ tmp ^ CRC[byte & 0xf]
-            tmp = CRC[checksum & 0xf]
-            checksum = (checksum >> 4) & 0xfff
-            checksum = checksum ^ tmp ^ CRC[(byte >> 4) & 0xf]
+            checksum = (checksum >> 8) ^ table[(checksum ^ byte) & 0xff]
         return checksum
 
-    def __init__(self, data):
-        super().__init__('CRC', False, data)
+    def __init__(self, data, offset=0):
+        super().__init__('CRC', False, data[offset:])
         self.checksum = unpack('<H', self.data)[0]
 
-    def validate(self, all_data, log, quiet=False):
-        checksum = self.crc(all_data[:-2])
+    def validate(self, all_data, log, quiet=False, checksum=None):
+        '''
+        If checksum is given it should be the CRC of all_data[:-2] (calculated incrementally).
+        '''
+        if checksum is None:
+            checksum = self.crc(all_data[:-2])
         if checksum != self.checksum:
             self._error('Bad checksum (%04x/%04x)' % (checksum, self.checksum), log, quiet)
 
@@ -540,22 +596,28 @@ class Checksum(ValidateToken):
         return self._fake_record('checksum', checksum=self.data[0:2] if raw_data else self.checksum)
 
 
-def token_factory(data, state):
-    header = data[0]
+def token_factory(data, state, offset=0):
+    '''
+    Create the token that starts at offset within data.
+
+    Callers that walk a whole file should pass the same data with an increasing offset, rather than
+    slicing, so that each token copies only its own bytes (and parsing is linear in file size).
+    '''
+    header = data[offset]
     if header & 0x80:
-        return CompressedTimestamp(data, state)
+        return CompressedTimestamp(data, state, offset=offset)
     else:
         if header & 0x40:
             if header & 0x20:
-                return DeveloperDefinition(data, state)
+                return DeveloperDefinition(data, state, offset=offset)
             else:
-                return Definition(data, state)
+                return Definition(data, state, offset=offset)
         else:
             if header & 0x10:
                 log.debug('Reserved bit set')
-            token = Data(data, state)
+            token = Data(data, state, offset=offset)
             if token.definition.global_message_no == FIELD_DESCRIPTION:
-                return DeveloperField(data, state)
+                return DeveloperField(data, state, offset=offset)
             else:
                 return token
 
@@ -597,3 +659,24 @@ class State:
         copy.accumulators.update(self.accumulators)
         copy._timestamp = self._timestamp
         return copy
+
+    def fork(self):
+        '''
+        A cheap copy for speculative parsing, sharing data with this state (copy on write).
+        This state must not be modified afterwards (continue with the fork instead).
+        '''
+        fork = object.__new__(type(self))
+        fork.__dict__.update(self.__dict__)
+        fork.dev_fields = defaultdict(self.dev_fields.default_factory,
+                                      ((key, copy(value)) for key, value in self.dev_fields.items()))
+        fork.definitions = LayeredDict.fork_from(self.definitions, missing=_no_definition)
+        fork.definition_counter = LayeredDict.fork_from(self.definition_counter, missing=lambda key: 0)
+        fork.accumulators = LayeredDict.fork_from(self.accumulators)
+        return fork
+
+
+def _no_definition(local_message_type):
+    # same behaviour as the WarnDict in State
+    msg = 'No definition for local message type %s' % (local_message_type,)
+    log.debug(msg)
+    raise KeyError(msg)
@@ -0,0 +1,165 @@
+
+from io import BytesIO
+from mmap import mmap, ACCESS_READ
+from pickle import Pickler, Unpickler, HIGHEST_PROTOCOL, dumps, loads
+from struct import Struct
+
+from .messages import Missing
+from .support import NullableLog
+from .types import AbstractType
+from ...lib.data import WarnDict, WarnList
+
+'''
+A compact, indexed form of the profile, written by `ch2 package-fit-profile`.
+
+Each type (indexed by name) and message (indexed by name and global message number) is pickled
+separately, with references to types (and the log) replaced by keys.  The file is memory-mapped
+and an entry is unpickled only when first used, so a process reading a FIT file materialises only
+the messages (and types) that the file contains (and the pages are shared between processes).
+'''
+
+MAGIC = b'ch2-fit-profile\n'
+VERSION = 1
+HEADER = Struct('<16sIQQ')  # magic, version, index offset, index length
+
+LOG, TYPE, MESSAGE, NUMBER, BASE, OVERRIDES = 'log', 'type', 'message', 'number', 'base', 'overrides'
+
+
+class _Pickler(Pickler):
+
+    def __init__(self, file, nlog, type_names, root):
+        super().__init__(file, protocol=HIGHEST_PROTOCOL)
+        self.__nlog = nlog
+        self.__type_names = type_names
+        self.__root = root
+
+    def persistent_id(self, obj):
+        if obj is self.__nlog:
+            return LOG,
+        elif obj is not self.__root and isinstance(obj, AbstractType) and id(obj) in self.__type_names:
+            return TYPE, self.__type_names[id(obj)]
+        else:
+            return None
+
+
+class _Unpickler(Unpickler):
+
+    def __init__(self, file, profile):
+        super().__init__(file)
+        self.__profile = profile
+
+    def persistent_load(self, pid):
+        if pid[0] == LOG:
+            return self.__profile.log
+        else:
+            return self.__profile.types.profile_to_type(pid[1])
+
+
+def write_profile(path, nlog, types, messages):
+    type_names = dict((id(type), type.name) for type in types.all_types())
+    index = {TYPE: {}, MESSAGE: {}, NUMBER: {},
+             BASE: [type.name for type in types.base_types], OVERRIDES: set(types.overrides)}
+    with open(path, 'wb') as output:
+        output.write(bytes(HEADER.size))
+
+        def write(value):
+            offset = output.tell()
+            _Pickler(output, nlog, type_names, value).dump(value)
+            return offset, output.tell() - offset
+
+        for type in types.all_types():
+            index[TYPE][type.name] = write(type)
+        for message in messages.all_messages():
+            index[MESSAGE][message.name] = write(message)
+            if message.number is not None:
+                index[NUMBER][message.number] = message.name
+        offset = output.tell()
+        output.write(dumps(index, protocol=HIGHEST_PROTOCOL))
+        length = output.tell() - offset
+        output.seek(0)
+        output.write(HEADER.pack(MAGIC, VERSION, offset, length))
+
+
+class CompactProfile:
+
+    def __init__(self, log, path):
+        self.log = NullableLog(log)
+        with open(path, 'rb') as input:
+            self.__data = mmap(input.fileno(), 0, access=ACCESS_READ)
+        magic, version, offset, length = HEADER.unpack_from(self.__data)
+        if magic != MAGIC or version != VERSION:
+            raise Exception(f'{path} is not a compact profile (version {VERSION})')
+        index = loads(self.__data[offset:offset+length])
+        self.types = LazyTypes(self, index[TYPE], index[BASE], index[OVERRIDES])
+        self.messages = LazyMessages(self, index[MESSAGE], index[NUMBER])
+
+    def load(self, offset, length):
+        return _Unpickler(BytesIO(self.__data[offset:offset+length]), self).load()
+
+
+class LazyTypes:
+    '''
+    Provides the same interface as Types, but unpickles each type on first use.
+    '''
+
+    def __init__(self, profile, index, base_type_names, overrides):
+        self.__profile = profile
+        self.__index = WarnDict(profile.log, 'No type for profile %r')
+        self.__index.update(index)
+        self.__base_type_names = base_type_names
+        self.__base_types = None
+        self.__profile_to_type = {}
+        self.overrides = overrides
+
+    def is_type(self, name):
+        return name in self.__index
+
+    def profile_to_type(self, name):
+        if name not in self.__profile_to_type:
+            self.__profile_to_type[name] = self.__profile.load(*self.__index[name])
+        return self.__profile_to_type[name]
+
+    @property
+    def base_types(self):
+        if self.__base_types is None:
+            self.__base_types = WarnList(self.__profile.log, 'No base type for number %r')
+            self.__base_types.extend(self.profile_to_type(name) for name in self.__base_type_names)
+        return self.__base_types
+
+    def all_types(self):
+        return [self.profile_to_type(name) for name in self.__index]
+
+    def n_loaded(self):
+        return len(self.__profile_to_type)
+
+
+class LazyMessages:
+    '''
+    Provides the same interface as Messages, but unpickles each message on first use.
+    '''
+
+    def __init__(self, profile, index, numbers):
+        self.__profile = profile
+        self.__index = WarnDict(profile.log, 'No message for profile %r')
+        self.__index.update(index)
+        self.__numbers = numbers
+        self.__profile_to_message = {}
+        self.__missing = {}
+
+    def profile_to_message(self, name):
+        if name not in self.__profile_to_message:
+            self.__profile_to_message[name] = self.__profile.load(*self.__index[name])
+        return self.__profile_to_message[name]
+
+    def number_to_message(self, number):
+        if number in self.__numbers:
+            return self.profile_to_message(self.__numbers[number])
+        if number not in self.__missing:
+            self.__missing[number] = Missing(self.__profile.log, number)
+        return self.__missing[number]
+
+    def all_messages(self):
+        return [self.profile_to_message(name) for name in self.__index]
+
+    def n_loaded(self):
+        return len(self.__profile_to_message)
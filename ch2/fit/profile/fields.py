@@ -17,6 +17,10 @@ class ScaledField(Named):
         self._offset = offset if offset else 0
         self._accumulate = accumulate
 
+    @property
+    def units(self):
+        return self._units
+
     def _parse_and_scale(self, type, data, count, endian, timestamp,
                          scale=None, offset=None, accumulators=None, n_bits=None, **options):
         if scale is None: scale = self._scale if self._scale else 1
@@ -49,6 +53,30 @@ class TypedField(ScaledField):
     def parse_field(self, data, count, endian, timestamp, references, message, **options):
         yield from self._parse_and_scale(self.type, data, count, endian, timestamp, **options)
 
+    def compile_field(self, count, endian):
+        '''
+        Return (format, parse) where format is a struct format for the field and
+        parse(values, data, timestamp, **options) returns the (name, (values, units)) pair
+        from parse_field (if the field is not accumulated).  Or None if this isn't possible.
+        '''
+        compiled = self.type.compile_type(count, endian, scale=self._scale, offset=self._offset)
+        if compiled:
+            format, unpack = compiled
+
+            def parse(values, data, timestamp, **options):
+                return self.name, (unpack(values, data, timestamp, **options), self._units)
+
+            return format, parse
+
+    def vectorise_field(self, count, endian):
+        '''
+        Return (dtype, convert, units) for reading the field from many messages at once
+        (see AbstractType.vectorise_type).  Or None if this isn't possible.
+        '''
+        vectorised = self.type.vectorise_type(count, endian, scale=self._scale, offset=self._offset)
+        if vectorised:
+            return vectorised + (self._units,)
+
 
 class RowField(TypedField):
 
@@ -110,6 +138,12 @@ class CompositeField(Zip, TypedField):
         for _, field in self._components:
             field.register_accumulator(accumulators)
 
+    def compile_field(self, count, endian):
+        return None
+
+    def vectorise_field(self, count, endian):
+        return None
+
     def parse_field(self, data, count, endian, timestamp, references, message,
                     rtn_composite=False, check_bad=True, n_bits=None, **options):
         if check_bad and self.type.is_bad(data, count, endian):
@@ -146,6 +180,12 @@ class DynamicField(Zip, RowField):
             else:
                 break
 
+    def compile_field(self, count, endian):
+        return None
+
+    def vectorise_field(self, count, endian):
+        return None
+
     def post(self, message, types):
         # fill in values for when mapping is not used
         for (name, value), field in list(self.__dynamic_lookup.items()):
@@ -42,15 +42,28 @@ class Message(Named):
         return LazyRecord(self.name, self.number, defn.identity, timestamp,
                           self.__parse(data, defn, timestamp, extra=extra, **options))
 
-    def __parse(self, data, defn, timestamp, extra=None, **options):
+    def __parse(self, data, defn, timestamp, extra=None, only=None, **options):
         # this is the generator that lives inside a record and is evaluated on demand
+        # only (if given) restricts parsing to fields starting at those offsets (plus any references)
         if extra is None: extra = {}
         references = {}
         for name, value in extra.items():
             if name in defn.references and value[0] is not None:
                 references[name] = value
             yield name, value
-        for field in defn.fields:
+        accumulators = options.get('accumulators', None)
+        values = defn.decoder.unpack(data)
+        for field, parser in zip(defn.fields, defn.decoder.parsers):
+            if only is not None and field.start not in only and field.name not in defn.references:
+                continue
+            if parser and not (accumulators and field.name in accumulators):
+                # fast path - pre-compiled and already unpacked
+                lo, hi, start, finish, parse = parser
+                name, value = parse(values[lo:hi], data[start:finish], timestamp, **options)
+                if name in defn.references and value[0] is not None:
+                    references[name] = value
+                yield name, value
+                continue
             bytes = data[field.start:field.finish]
             if field.field:
                 for name, value in self._parse_field(
@@ -110,6 +123,9 @@ class Messages:
     def profile_to_message(self, name):
         return self.__profile_to_message[name]
 
+    def all_messages(self):
+        return list(self.__profile_to_message.values())
+
     def number_to_message(self, number):
         try:
             return self.__number_to_message[number]
@@ -1,21 +1,18 @@
-
 from os.path import join, dirname
-from pickle import load, dump
-
-import openpyxl as xls
-from pkg_resources import resource_stream
 
 from ch2 import PACKAGE_FIT_PROFILE
+from .compact import CompactProfile, write_profile
 from .messages import Messages
 from .support import NullableLog
 from .types import Types
 
-PROFILE_NAME = 'global-profile.pkl'
+PROFILE_NAME = 'global-profile.bin'
 PROFILE = []
 
 # todo - remove log from here (and docs)
 
 def read_external_profile(log, path, warn=False):
+    import openpyxl as xls
     nlog = NullableLog(log)
     wb = xls.load_workbook(path)
     types = Types(nlog, wb['Types'], warn=warn)
@@ -25,19 +22,16 @@ def read_external_profile(log, path, warn=False):
 
 def read_internal_profile(log):
     if not PROFILE:
-        log.debug('Unpickling profile')
+        log.debug('Opening profile')
         try:
-            input = resource_stream(__name__, PROFILE_NAME)
-            PROFILE.append(load(input))
-            input.close()
+            PROFILE.append(CompactProfile(log, join(dirname(__file__), PROFILE_NAME)))
         except FileNotFoundError:
-            log.warning('There was a problem reading the pickled profile.')
+            log.warning('There was a problem reading the packaged profile.')
             log.warning('If you installed via pip then please create an issue at')
             log.warning('https://github.com/andrewcooke/choochoo for support.')
             log.warning('If you installed via git please see `ch2 help %s`' % PACKAGE_FIT_PROFILE)
             raise Exception('Could not read %s (see log for more details)' % PROFILE_NAME)
-        PROFILE[0][0].set_log(log)
-    return PROFILE[0][1:]
+    return PROFILE[0].types, PROFILE[0].messages
 
 
 def read_profile(log, warn=False, profile_path=None):
@@ -62,8 +56,9 @@ def pickle_profile(log, in_path, warn=False):
     out_path = join(dirname(__file__), PROFILE_NAME)
     nlog.set_log(None)
     log.info('Writing to %s' % out_path)
-    with open(out_path, 'wb') as output:
-        dump((nlog, types, messages), output)
+    write_profile(out_path, nlog, types, messages)
     # test loading
     log.info('Test loading from %r' % PROFILE_NAME)
-    log.info('Loaded %s, %s' % read_internal_profile(log))
+    del PROFILE[:]
+    types, messages = read_internal_profile(log)
+    log.info('Loaded %d types, %d messages' % (len(types.all_types()), len(messages.all_messages())))
@@ -5,6 +5,8 @@ from collections import namedtuple
 from re import compile
 from struct import unpack, pack
 
+import numpy as np
+
 from .support import Named, Rows
 from ...lib.data import WarnDict, WarnList
 
@@ -32,6 +34,28 @@ class AbstractType(Named):
     def parse_type(self, bytes, count, endian, timestamp, **options):
         raise NotImplementedError('%s: %s' % (self.__class__.__name__, self.name))
 
+    def compile_type(self, count, endian, scale=1, offset=0):
+        '''
+        Return (format, unpack) where format is a struct format (without byte order) for count values
+        and unpack(values, bytes, timestamp, **options) takes the values unpacked with that format (plus
+        the raw bytes) and returns the same result as parse_type.
+
+        Returns None if the type cannot be compiled (the caller should then use parse_type).
+        '''
+        return None
+
+    def vectorise_type(self, count, endian, scale=1, offset=0):
+        '''
+        Return (dtype, convert) where dtype is the numpy type for a single value and
+        convert(raw, **options) takes an array of shape (n, count) of that type and returns
+        (values, mask) - the values that parse_type would give for each row, plus a mask (of the
+        same shape) that is True for bad values.  Rows that parse_type would return as None (bad)
+        are those where every value is masked; elsewhere bad values are unscaled (as parse_type).
+
+        Returns None if the type cannot be vectorised.
+        '''
+        return None
+
 
 class SimpleType(AbstractType):
     '''
@@ -88,6 +112,50 @@ class StructSupport(SimpleType):
                 return tuple(self.__unpack_scaled(data[self.n_bytes*i:self.n_bytes*(i+1)], formats[endian],
                                                   bad[endian], scale, offset) for i in range(count))
 
+    def _compile(self, formats, bad, count, endian, scale, offset):
+        # must match the non-accumulating branches of _unpack above
+        format, n_bytes = formats[endian][1:] % count, self.n_bytes
+        bad, all_bad = bytes(bad[endian]), bytes(bad[endian]) * count
+        if (scale == 1 and offset == 0) or self.name == 'enum':
+            def scaled(values, data):
+                return values
+        elif count == 1:
+            def scaled(values, data):
+                return (values[0] / scale - offset,)
+        else:
+            def scaled(values, data):
+                return tuple(value if data[n_bytes*i:n_bytes*(i+1)] == bad else value / scale - offset
+                             for i, value in enumerate(values))
+
+        def unpack(values, data, timestamp, check_bad=True, **options):
+            if check_bad and data == all_bad:
+                return None
+            else:
+                return scaled(values, data)
+
+        return format, unpack
+
+    def _vectorise(self, formats, bad, count, endian, scale, offset):
+        # must match _compile above
+        order, char = formats[endian][0], formats[endian][-1]
+        dtype = np.dtype(order + char)
+        # compare bad values as unsigned integers (floats are NaN)
+        bits = np.dtype('%su%d' % (order, self.n_bytes))
+        bad = int.from_bytes(bytes(bad[endian]), byteorder='little' if endian == LITTLE else 'big')
+
+        def convert(raw, check_bad=True, **options):
+            elem_bad = raw.view(bits) == bad
+            if (scale == 1 and offset == 0) or self.name == 'enum':
+                values = raw
+            elif count == 1:
+                values = raw / scale - offset
+            else:
+                values = np.where(elem_bad, raw, raw / scale - offset)
+            mask = elem_bad if check_bad else np.zeros(raw.shape, dtype=bool)
+            return values, mask
+
+        return dtype, convert
+
     def __unpack_scaled(self, data, format, bad, scale, offset):
         value = unpack(format % 1, data)[0]
         if data == bad or (scale == 1 and offset == 0):
@@ -222,6 +290,12 @@ class AutoInteger(StructSupport):
     def parse_type(self, data, count, endian, timestamp, check_bad=True, **options):
         return self._unpack(data, self.__formats, self.__bad, count, endian, check_bad=check_bad, **options)
 
+    def compile_type(self, count, endian, scale=1, offset=0):
+        return self._compile(self.__formats, self.__bad, count, endian, scale, offset)
+
+    def vectorise_type(self, count, endian, scale=1, offset=0):
+        return self._vectorise(self.__formats, self.__bad, count, endian, scale, offset)
+
     def pack_type(self, values, count, endian):
         return self._pack(values, self.__formats, count, endian)
 
@@ -236,6 +310,9 @@ class AliasInteger(AutoInteger):
         self.name = name
 
 
+FIT_EPOCH = 631065600  # 1989-12-31 as a unix timestamp
+
+
 def timestamp_to_time(timestamp, tzinfo=dt.timezone.utc):
     return dt.datetime(1989, 12, 31, tzinfo=tzinfo) + dt.timedelta(seconds=timestamp)
 
@@ -253,16 +330,43 @@ class Date(AliasInteger):
         super().__init__(log, name, 'uint32')
         self.__tzinfo = dt.timezone.utc if utc else None
 
+    @property
+    def tzinfo(self):
+        return self.__tzinfo
+
     def convert(self, time, tzinfo=dt.timezone.utc):
         if time is not None:
             return timestamp_to_time(time, tzinfo=tzinfo)
 
     def parse_type(self, data, count, endian, timestamp, raw_time=False, **options):
         times = super().parse_type(data, count, endian, timestamp, raw_time=raw_time, **options)
+        return self.__convert_all(times, raw_time)
+
+    def __convert_all(self, times, raw_time):
         if times and not raw_time:
             times = tuple(self.convert(time, tzinfo=self.__tzinfo) for time in times)
         return times
 
+    def compile_type(self, count, endian, scale=1, offset=0):
+        format, unpack = super().compile_type(count, endian, scale=scale, offset=offset)
+
+        def unpack_times(values, data, timestamp, raw_time=False, **options):
+            return self.__convert_all(unpack(values, data, timestamp, **options), raw_time)
+
+        return format, unpack_times
+
+    def vectorise_type(self, count, endian, scale=1, offset=0):
+        dtype, convert = super().vectorise_type(count, endian, scale=scale, offset=offset)
+
+        def convert_times(raw, raw_time=False, **options):
+            values, mask = convert(raw, **options)
+            if not raw_time:
+                # naive, but UTC unless this is a local time
+                values = (values.astype(np.int64) + FIT_EPOCH).astype('datetime64[s]')
+            return values, mask
+
+        return dtype, convert_times
+
     def pack_type(self, values, count, endian):
         return super().pack_type([time_to_timestamp(value) for value in values], count, endian)
 
@@ -285,6 +389,12 @@ class Date16(AliasInteger):
             times = tuple(self.convert(time, timestamp, tzinfo=self.__tzinfo) for time in times)
         return times
 
+    def compile_type(self, count, endian, scale=1, offset=0):
+        return None  # depends on the current timestamp so always parsed directly
+
+    def vectorise_type(self, count, endian, scale=1, offset=0):
+        return None
+
 
 class AutoFloat(StructSupport):
 
@@ -310,6 +420,12 @@ class AutoFloat(StructSupport):
     def parse_type(self, data, count, endian, timestamp, check_bad=True, **options):
         return self._unpack(data, self.__formats, self.__bad, count, endian, check_bad=check_bad, **options)
 
+    def compile_type(self, count, endian, scale=1, offset=0):
+        return self._compile(self.__formats, self.__bad, count, endian, scale, offset)
+
+    def vectorise_type(self, count, endian, scale=1, offset=0):
+        return self._vectorise(self.__formats, self.__bad, count, endian, scale, offset)
+
 
 class Mapping(AbstractType):
 
@@ -342,10 +458,40 @@ class Mapping(AbstractType):
     # tests against CSV suggest they can (battery_level)
     def parse_type(self, bytes, size, endian, timestamp, map_values=True, check_bad=True, **options):
         values = self.base_type.parse_type(bytes, size, endian, timestamp, check_bad=check_bad, **options)
+        return self.__map_all(values, map_values)
+
+    def __map_all(self, values, map_values):
         if map_values and values:
             values = tuple(self.safe_internal_to_profile(value) for value in values)
         return values
 
+    def compile_type(self, count, endian, scale=1, offset=0):
+        compiled = self.base_type.compile_type(count, endian, scale=scale, offset=offset)
+        if compiled:
+            format, unpack = compiled
+
+            def unpack_mapped(values, data, timestamp, map_values=True, **options):
+                return self.__map_all(unpack(values, data, timestamp, **options), map_values)
+
+            return format, unpack_mapped
+
+    def vectorise_type(self, count, endian, scale=1, offset=0):
+        vectorised = self.base_type.vectorise_type(count, endian, scale=scale, offset=offset)
+        if vectorised:
+            dtype, convert = vectorised
+
+            def convert_mapped(raw, map_values=True, **options):
+                values, mask = convert(raw, **options)
+                if map_values and len(values):
+                    # map each distinct value once
+                    distinct, inverse = np.unique(values, return_inverse=True)
+                    mapped = np.empty(len(distinct), dtype=object)
+                    mapped[:] = [self.safe_internal_to_profile(value) for value in distinct.tolist()]
+                    values = mapped[inverse].reshape(values.shape)
+                return values, mask
+
+            return dtype, convert_mapped
+
     def __add_mapping(self, row):
         profile = row.value_name
         internal = self.base_type.profile_to_internal(row.value)
@@ -410,6 +556,9 @@ class Types:
     def is_type(self, name):
         return name in self.__profile_to_type
 
+    def all_types(self):
+        return list(self.__profile_to_type.values())
+
     def profile_to_type(self, name, auto_create=False):
         try:
             return self.__profile_to_type[name]
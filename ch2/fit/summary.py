@@ -5,9 +5,10 @@ from operator import eq, lt, gt
 from re import compile
 from sys import stdout
 
-from .format.read import filtered_records, filtered_tokens
+from .format.columns import TIMESTAMP
+from .format.read import filtered_records, filtered_tokens, filtered_columns
 from .format.records import no_bad_values, fix_degrees, append_units, no_unknown_fields, join_values, \
-    to_hex, no_filter, merge_duplicates
+    to_hex, no_filter, merge_duplicates, restrict_names, Record
 from ..commands.args import RECORDS, FIELDS, CSV, TABLES, GREP, TOKENS
 from ..lib.io import terminal_width
 from ..lib.utils import unique
@@ -130,15 +131,23 @@ def summarize_tables(data, all_fields=False, all_messages=False, internal=False,
                      warn=False, no_validate=False, max_delta_t=None, profile_path=None,
                      width=None, output=stdout):
 
-    types, messages, records = \
-        filtered_records(data,
+    types, messages, columns = \
+        filtered_columns(data,
                          after_bytes=after_bytes, limit_bytes=limit_bytes,
                          after_records=after_records, limit_records=limit_records,
                          record_names=record_names, field_names=field_names,
-                         warn=warn, no_validate=no_validate, internal=internal,
-                         profile_path=profile_path, max_delta_t=max_delta_t, pipeline=[merge_duplicates])
-
-    records = list(record[2] for record in records)
+                         warn=warn, no_validate=no_validate,
+                         profile_path=profile_path, max_delta_t=max_delta_t)
+
+    records = list(columns_to_records(columns, field_names=field_names))
+    if internal:
+        records.extend(internal_records(data,
+                                        after_bytes=after_bytes, limit_bytes=limit_bytes,
+                                        after_records=after_records, limit_records=limit_records,
+                                        record_names=record_names, field_names=field_names,
+                                        warn=warn, no_validate=no_validate,
+                                        profile_path=profile_path, max_delta_t=max_delta_t))
+    records = [record for offset, record in sorted(records, key=lambda offset_record: offset_record[0])]
     counts = Counter(record.identity for record in records)
     small, large = partition(records, counts)
     width = width or terminal_width()
@@ -147,6 +156,37 @@ def summarize_tables(data, all_fields=False, all_messages=False, internal=False,
     pprint_as_tuples(large, all_fields, all_messages, width=width, output=output)
 
 
+def columns_to_records(columns, field_names=None):
+    '''
+    The data messages, as (offset, record) rebuilt from the columns (see Columns.values()).
+    '''
+    for message in columns.values():
+        for i, offset in enumerate(message.offsets.tolist()):
+            timestamp = message.values(TIMESTAMP, i)
+            data = [(name, (message.values(name, i), message.units[name])) for name in message.names(i)
+                    if not field_names or name in field_names]
+            yield offset, Record(message.name, None, message.identities[i], timestamp and timestamp[0], data)
+
+
+def internal_records(data, after_bytes=None, limit_bytes=-1, after_records=None, limit_records=-1,
+                     record_names=None, field_names=None,
+                     warn=False, no_validate=False, max_delta_t=None, profile_path=None):
+    '''
+    The internal messages (which are not in the columns), as (offset, record).
+    '''
+    types, messages, tokens = \
+        filtered_tokens(data,
+                        after_bytes=after_bytes, limit_bytes=limit_bytes,
+                        after_records=after_records, limit_records=limit_records,
+                        warn=warn, no_validate=no_validate, max_delta_t=max_delta_t, profile_path=profile_path)
+    pipeline = [merge_duplicates] + ([restrict_names(field_names)] if field_names else [])
+    for index, offset, token in tokens:
+        if not token.is_user:
+            record = token.parse_token(warn=warn).force(*pipeline)
+            if not record_names or record.name in record_names:
+                yield offset, record
+
+
 class Done(Exception): pass
 
 
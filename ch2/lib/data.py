@@ -1,6 +1,7 @@
 
 from binascii import hexlify
-from collections import namedtuple
+from collections import namedtuple, ChainMap
+from functools import lru_cache
 from inspect import stack, getmodule
 from json import loads
 from random import choice
@@ -24,6 +25,45 @@ class WarnDict(dict):
             raise KeyError(msg)
 
 
+class LayeredDict(ChainMap):
+    '''
+    A dict that shares the contents of the dict it was forked from (copy on write).  Writes go to the
+    first layer, so the original must not be modified after forking (continue with the fork instead).
+    '''
+
+    MAX_DEPTH = 16  # beyond this, forks are flattened (so lookups stay fast)
+
+    def __init__(self, *maps, missing=None):
+        super().__init__(*maps)
+        self.__missing = missing  # called for missing keys (otherwise KeyError)
+
+    @classmethod
+    def fork_from(cls, mapping, missing=None):
+        if isinstance(mapping, LayeredDict):
+            return mapping.fork()
+        else:
+            return cls({}, dict(mapping), missing=missing)
+
+    def fork(self):
+        if len(self.maps) > self.MAX_DEPTH:
+            return LayeredDict({}, dict(self), missing=self.__missing)
+        else:
+            return LayeredDict({}, *self.maps, missing=self.__missing)
+
+    def __getitem__(self, key):
+        # avoid the exceptions raised by ChainMap for each layer that does not contain the key
+        for mapping in self.maps:
+            if key in mapping:
+                return mapping[key]
+        return self.__missing__(key)
+
+    def __missing__(self, key):
+        if self.__missing:
+            return self.__missing(key)
+        else:
+            raise KeyError(key)
+
+
 class WarnList(list):
 
     def __init__(self, log, msg):
@@ -55,7 +95,13 @@ def kargs_to_attr(**kargs):
 
 
 def dict_to_attr(kargs):
-    return namedtuple('Attr', kargs.keys(), rename=True)(*kargs.values())
+    return _attr_class(tuple(kargs.keys()))(*kargs.values())
+
+
+@lru_cache(1024)
+def _attr_class(names):
+    # creating a namedtuple class is expensive (and records with the same fields are common)
+    return namedtuple('Attr', names, rename=True)
 
 
 class MutableAttr(dict):
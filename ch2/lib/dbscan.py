@@ -29,8 +29,8 @@ class DBSCAN(ABC):
         count = 0
         for candidate in candidates:
             if label[candidate] is None:
-                neighbours = list(self.neighbourhood(candidate, self.__epsilon))
-                if len(neighbours) >= self.__minpts:
+                neighbours = self.core_neighbourhood(candidate, self.__epsilon, self.__minpts)
+                if neighbours is not None:
                     count += 1
                     label[candidate] = count
                     self.grow(count, neighbours, label)
@@ -42,8 +42,8 @@ class DBSCAN(ABC):
         n = 0
         while stack:
             candidate = stack.pop()
-            neighbours = list(self.neighbourhood(candidate, self.__epsilon))
-            if len(neighbours) >= self.__minpts:
+            neighbours = self.core_neighbourhood(candidate, self.__epsilon, self.__minpts)
+            if neighbours is not None:
                 for neighbour in neighbours:
                     if not label[neighbour]:
                         if label[neighbour] is None:
@@ -53,6 +53,14 @@ class DBSCAN(ABC):
             elif label[candidate] is None:
                 label[candidate] = 0  # we know this is a leaf so save some time
 
+    def core_neighbourhood(self, candidate, epsilon, minpts):
+        '''
+        The neighbourhood of a core point (as a list), or None if the candidate is not a core point.
+        Subclasses can override this if they can identify core points without finding all neighbours.
+        '''
+        neighbours = list(self.neighbourhood(candidate, epsilon))
+        return neighbours if len(neighbours) >= minpts else None
+
     @abstractmethod
     def neighbourhood(self, candidate, epsilon):
         raise NotImplementedError()
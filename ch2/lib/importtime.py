@@ -0,0 +1,74 @@
+
+from collections import defaultdict
+from re import compile
+from subprocess import run, PIPE
+from sys import executable, stderr
+from time import perf_counter
+
+IMPORT_TIME = compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$')
+
+
+def profile_startup(argv, n=15):
+    '''
+    Run ch2 (with the given arguments) in a separate process with `-X importtime`, then report
+    which modules (and which libraries, imported from where) took the time.
+    '''
+    returncode, imports, wall = import_times(argv)
+    print(f'\n  {len(imports)} modules imported in {sum(i[0] for i in imports):.2f}s '
+          f'(ch2 {" ".join(argv)} took {wall:.2f}s)')
+    print_packages(imports, n)
+    print_libraries(imports, n)
+    print()
+    return returncode
+
+
+def import_times(argv):
+    '''
+    Run ch2 (with the given arguments) in a separate process with `-X importtime`.  Returns the exit code,
+    a list of (self time, cumulative time, depth, module) for each import, and the total (wall) time.
+    Other output to stderr is passed through.
+    '''
+    start = perf_counter()
+    process = run([executable, '-X', 'importtime', '-m', 'ch2'] + argv, stderr=PIPE, universal_newlines=True)
+    wall = perf_counter() - start
+    imports = []
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            self, cumulative, indent, name = match.groups()
+            imports.append((int(self) / 1e6, int(cumulative) / 1e6, len(indent) // 2, name))
+        elif not line.startswith('import time:'):
+            print(line, file=stderr)
+    return process.returncode, imports, wall
+
+
+def print_packages(imports, n):
+    packages = defaultdict(lambda: [0, 0])
+    for self, _, _, name in imports:
+        package = packages[name.split('.')[0]]
+        package[0] += self
+        package[1] += 1
+    print(f'\n  Slowest packages (total time for all modules):\n')
+    for name, (time, count) in sorted(packages.items(), key=lambda item: -item[1][0])[:n]:
+        print(f'  {time:6.2f}s  {name} ({count} modules)')
+
+
+def print_libraries(imports, n):
+    # importtime lists modules after the modules they import (indented), so we find the parent of
+    # each module by working backwards.  we then report libraries that were imported directly by ch2.
+    parents, stack = [], []
+    for _, _, depth, name in reversed(imports):
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        parents.append(stack[-1][1] if stack else None)
+        stack.append((depth, name))
+    libraries = [(cumulative, name, parent)
+                 for (_, cumulative, _, name), parent in zip(imports, reversed(parents))
+                 if not is_ch2(name) and (parent is None or is_ch2(parent))]
+    print(f'\n  Slowest libraries imported by ch2 (including their dependencies):\n')
+    for cumulative, name, parent in sorted(libraries, reverse=True)[:n]:
+        print(f'  {cumulative:6.2f}s  {name}' + (f' (from {parent})' if parent else ''))
+
+
+def is_ch2(name):
+    return name == 'ch2' or name.startswith('ch2.')
@@ -3,13 +3,13 @@ from hashlib import md5
 from logging import getLogger
 from os import stat
 from shutil import get_terminal_size
-from time import time
+from time import time, perf_counter
 
 from sqlalchemy import desc
 
 from .date import to_time
 from ch2.squeal.utils import add
-from ..squeal.tables.fit import FileScan
+from ..squeal.tables.fit import FileScan, FileHash
 
 log = getLogger(__name__)
 
@@ -35,6 +35,87 @@ def md5_hash(file_path):
     return hash.hexdigest()
 
 
+class HashIndex:
+    '''
+    Provide md5 hashes for files, re-using the stored value when size, mtime and inode are unchanged.
+    The whole index is read in a single query.  Counts and times are kept for reporting.
+    '''
+
+    def __init__(self, s):
+        self._s = s
+        self.__hashes = dict((file_hash.path, file_hash) for file_hash in s.query(FileHash).all())
+        self.n_stat, self.n_hash, self.t_stat, self.t_hash = 0, 0, 0.0, 0.0
+
+    def stat_and_hash(self, file_path):
+        start = perf_counter()
+        stats = stat(file_path)
+        self.n_stat += 1
+        self.t_stat += perf_counter() - start
+        key = (stats.st_size, stats.st_mtime_ns, stats.st_ino)
+        file_hash = self.__hashes.get(file_path)
+        if not file_hash or (file_hash.size, file_hash.mtime_ns, file_hash.inode) != key:
+            start = perf_counter()
+            hash = md5_hash(file_path)
+            self.n_hash += 1
+            self.t_hash += perf_counter() - start
+            if file_hash:
+                file_hash.size, file_hash.mtime_ns, file_hash.inode = key
+                file_hash.md5_hash = hash
+            else:
+                file_hash = add(self._s, FileHash(path=file_path, size=stats.st_size, mtime_ns=stats.st_mtime_ns,
+                                                  inode=stats.st_ino, md5_hash=hash))
+                self.__hashes[file_path] = file_hash
+        return to_time(stats.st_mtime), file_hash.md5_hash
+
+    def report(self, log):
+        log.info(f'Checked {self.n_stat} files in {self.t_stat:.2f}s; hashed {self.n_hash} in {self.t_hash:.2f}s')
+
+
+def _check_scan(log, s, file_path, owner, force, scans, index):
+    '''
+    Update the scan for the given path and return it if the file needs to be processed (otherwise None).
+    '''
+
+    last_modified, hash = index.stat_and_hash(file_path)
+    path_scan = scans.get(file_path)
+
+    # get last scan and make sure it's up-to-date
+    if path_scan:
+        if hash != path_scan.md5_hash:
+            log.warning(f'File at {file_path} appears to have changed since last read on {path_scan.last_scan}')
+            path_scan.md5_hash = hash
+            path_scan.last_scan = to_time(0.0)
+    else:
+        # need to_time here because it's not roundtripped via the database to convert for use below
+        path_scan = add(s, FileScan(path=file_path, owner=owner,
+                                    md5_hash=hash, last_scan=to_time(0.0)))
+        s.flush()  # want this to appear in queries below
+        scans[file_path] = path_scan
+
+    # only look at hash if we are going to process anyway
+    if force or last_modified > path_scan.last_scan:
+
+        hash_scan = s.query(FileScan). \
+            filter(FileScan.md5_hash == hash,
+                   FileScan.owner == owner).\
+            order_by(desc(FileScan.last_scan)).limit(1).one()  # must exist as path_scan is a candidate
+        if hash_scan.path != path_scan.path:
+            log.warning('Ignoring duplicate file (details in debug log)')
+            log.debug('%s' % file_path)
+            log.debug('%s' % hash_scan.path)
+            # update the path to avoid triggering in future
+            path_scan.last_scan = hash_scan.last_scan
+
+        if force or last_modified > hash_scan.last_scan:
+            return path_scan, last_modified
+
+    return None, last_modified
+
+
+def _read_scans(s, owner):
+    return dict((scan.path, scan) for scan in s.query(FileScan).filter(FileScan.owner == owner).all())
+
+
 def for_modified_files(log, s, paths, callback, owner, force=False):
     '''
     This takes a callback because we need to know whether to mark the file as read or not
@@ -45,93 +126,41 @@ def for_modified_files(log, s, paths, callback, owner, force=False):
     transactions across the callback.
     '''
 
+    scans, index = _read_scans(s, owner), HashIndex(s)
+
     for file_path in paths:
 
-        last_modified = to_time(stat(file_path).st_mtime)
-        hash = md5_hash(file_path)
-        path_scan = s.query(FileScan). \
-            filter(FileScan.path == file_path,
-                   FileScan.owner == owner).one_or_none()
+        path_scan, last_modified = _check_scan(log, s, file_path, owner, force, scans, index)
 
-        # get last scan and make sure it's up-to-date
         if path_scan:
-            if hash != path_scan.md5_hash:
-                log.warning('File at %s appears to have changed since last read on %s')
-                path_scan.md5_hash = hash
-                path_scan.last_scan = 0.0
-        else:
-            # need to_time here because it's not roundtripped via the database to convert for use below
-            path_scan = add(s, FileScan(path=file_path, owner=owner,
-                                        md5_hash=hash, last_scan=to_time(0.0)))
-            s.flush()  # want this to appear in queries below
-
-        # only look at hash if we are going to process anyway
-        if force or last_modified > path_scan.last_scan:
-
-            hash_scan = s.query(FileScan). \
-                filter(FileScan.md5_hash == hash,
-                       FileScan.owner == owner).\
-                order_by(desc(FileScan.last_scan)).limit(1).one()  # must exist as path_scan is a candidate
-            if hash_scan.path != path_scan.path:
-                log.warning('Ignoring duplicate file (details in debug log)')
-                log.debug('%s' % file_path)
-                log.debug('%s' % hash_scan.path)
-                # update the path to avoid triggering in future
-                path_scan.last_scan = hash_scan.last_scan
-
             s.commit()
+            if callback(file_path):
+                log.debug('Marking %s as scanned' % file_path)
+                path_scan.last_scan = last_modified  # maybe use now?
+                s.commit()
+            else:
+                log.debug('Not marking %s as scanned' % file_path)
 
-            if force or last_modified > hash_scan.last_scan:
-                if callback(file_path):
-                    log.debug('Marking %s as scanned' % file_path)
-                    path_scan.last_scan = last_modified  # maybe use now?
-                    s.commit()
-                else:
-                    log.debug('Not marking %s as scanned' % file_path)
+    s.commit()
+    index.report(log)
 
 
 def filter_modified_files(s, paths, owner, force=False):
+    '''
+    The paths that need to be processed (new or modified since the last scan).
+    Files are only re-hashed if their size, mtime or inode has changed.
+    '''
 
+    scans, index = _read_scans(s, owner), HashIndex(s)
     modified = []
 
     for file_path in paths:
-
-        last_modified = to_time(stat(file_path).st_mtime)
-        hash = md5_hash(file_path)
-        path_scan = s.query(FileScan). \
-            filter(FileScan.path == file_path,
-                   FileScan.owner == owner).one_or_none()
-
-        # get last scan and make sure it's up-to-date
+        path_scan, last_modified = _check_scan(log, s, file_path, owner, force, scans, index)
         if path_scan:
-            if hash != path_scan.md5_hash:
-                log.warning('File at %s appears to have changed since last read on %s')
-                path_scan.md5_hash = hash
-                path_scan.last_scan = 0.0
-        else:
-            # need to_time here because it's not roundtripped via the database to convert for use below
-            path_scan = add(s, FileScan(path=file_path, owner=owner,
-                                        md5_hash=hash, last_scan=to_time(0.0)))
-            s.flush()  # want this to appear in queries below
-
-        # only look at hash if we are going to process anyway
-        if force or last_modified > path_scan.last_scan:
-
-            hash_scan = s.query(FileScan). \
-                filter(FileScan.md5_hash == hash,
-                       FileScan.owner == owner).\
-                order_by(desc(FileScan.last_scan)).limit(1).one()  # must exist as path_scan is a candidate
-            if hash_scan.path != path_scan.path:
-                log.warning('Ignoring duplicate file (details in debug log)')
-                log.debug('%s' % file_path)
-                log.debug('%s' % hash_scan.path)
-                # update the path to avoid triggering in future
-                path_scan.last_scan = hash_scan.last_scan
-
-            if force or last_modified > hash_scan.last_scan:
-                modified.append(file_path)
+            modified.append(file_path)
 
     s.commit()
+    index.report(log)
     return modified
 
 
@@ -140,3 +169,18 @@ def update_scan(s, file_path, owner):
         filter(FileScan.path == file_path,
                FileScan.owner == owner).one()
     path_scan.last_scan = time()
+
+
+def get_scan(s, file_path, owner):
+    return s.query(FileScan). \
+        filter(FileScan.path == file_path,
+               FileScan.owner == owner).one_or_none()
+
+
+def is_scanned(s, file_path, owner):
+    '''
+    Has the file been read successfully before (and not changed since)?
+    (for_modified_files and filter_modified_files reset last_scan when the hash changes).
+    '''
+    path_scan = get_scan(s, file_path, owner)
+    return bool(path_scan and to_time(path_scan.last_scan) > to_time(0.0))
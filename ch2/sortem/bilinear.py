@@ -18,6 +18,8 @@ class BilinearElevation(ElevationSupport):
     If dir is not None and a file is missing for a particular lat/lon then an exception is raised.
 
     Elevations are bilinear interpolated from the surrounding arcsec grid.
+
+    Use elevations() for many points - it is vectorised (per tile).
     '''
 
     def elevation(self, lat, lon):
@@ -36,3 +38,14 @@ class BilinearElevation(ElevationSupport):
             return h0 * (1-k) + h1 * k
         else:
             return None
+
+    def _interpolate(self, flat, flon, h, lats, lons):
+        # as above, but for arrays
+        x = (lons - flon) * (SAMPLES - 1)
+        y = (lats - flat) * (SAMPLES - 1)
+        i, j = x.astype(int), y.astype(int)
+        k = y - j
+        h0 = h[j, i] * (1-k) + h[j+1, i] * k
+        h1 = h[j, i+1] * (1-k) + h[j+1, i+1] * k
+        k = x - i
+        return h0 * (1-k) + h1 * k
@@ -2,7 +2,9 @@
 from functools import lru_cache
 from genericpath import exists
 from math import floor
+from os import makedirs, getpid, replace
 from os.path import join
+from shutil import copyfileobj
 from zipfile import ZipFile
 
 import numpy as np
@@ -15,39 +17,76 @@ SAMPLES = 3601
 # from view-source:http://dwtkns.com/srtm30m/
 BASE_URL = 'http://e4ftl01.cr.usgs.gov/MEASURES/SRTMGL1.003/2000.02.11/'
 EXTN = '.SRTMGL1.hgt.zip'
+SRTM_CACHE = 'unzipped'  # sub-directory for unpacked zip files
 
 
 # lots of credit to https://github.com/aatishnn/srtm-python/blob/master/srtm.py
 # (although that has bugs...)
 
 
-@lru_cache(4)  # 4 means our tests are quick (and should tile a local patch)
-def cached_file_reader(log, dir, flat, flon):
-    if not exists(dir):
-        raise Exception('SRTM1 directory %s missing' % dir)
+def tile_root(flat, flon):
     # https://wiki.openstreetmap.org/wiki/SRTM
     # The official 3-arc-second and 1-arc-second data for versions 2.1 and 3.0 are divided into 1°×1° data tiles.
     # The tiles are distributed as zip files containing HGT files labeled with the coordinate of the southwest cell.
     # For example, the file N20E100.hgt contains data from 20°N to 21°N and from 100°E to 101°E inclusive.
-    root = '%s%02d%s%03d' % ('S' if flat < 0 else 'N', abs(flat), 'W' if flon < 0 else 'E', abs(flon))
+    return '%s%02d%s%03d' % ('S' if flat < 0 else 'N', abs(flat), 'W' if flon < 0 else 'E', abs(flon))
+
+
+def unzip_tile(log, zip_path, hgt_file, cache_dir):
+    '''
+    Extract the hgt file to the cache directory (once) so that it can be memory mapped.
+    Returns None if that is not possible.
+    '''
+    hgt_path = join(cache_dir, hgt_file)
+    if not exists(hgt_path):
+        try:
+            if not exists(cache_dir):
+                makedirs(cache_dir, exist_ok=True)
+            log.debug('Unpacking %s to %s' % (zip_path, cache_dir))
+            tmp_path = '%s.%d' % (hgt_path, getpid())  # atomic for other processes
+            with ZipFile(zip_path) as zip:
+                with zip.open(hgt_file) as input, open(tmp_path, 'wb') as output:
+                    copyfileobj(input, output)
+            replace(tmp_path, hgt_path)
+        except OSError as e:
+            log.warning('Could not unpack %s to %s: %s' % (zip_path, cache_dir, e))
+            return None
+    return hgt_path
+
+
+def read_tile(log, dir, flat, flon):
+    '''
+    The elevation data for a tile, indexed as [lat, lon].
+
+    Uncompressed files are memory mapped (read-only), so pages are loaded only when used and are
+    shared between processes (via the OS page cache).  Zipped files are unpacked once to a cache
+    directory and then mapped.
+    '''
+    if not exists(dir):
+        raise Exception('SRTM1 directory %s missing' % dir)
+    root = tile_root(flat, flon)
     hgt_file = root + '.hgt'
     hgt_path = join(dir, hgt_file)
     zip_path = join(dir, root + EXTN)
-    if exists(hgt_path):
-        log.debug('Reading %s' % hgt_path)
-        with open(hgt_path, 'rb') as input:
-            data = input.read()
-    elif exists(zip_path):
-        log.debug('Reading %s' % zip_path)
-        with open(zip_path, 'rb') as input:
-            zip = ZipFile(input)
-            log.debug('Found %s' % zip.filelist)
-            data = zip.open(hgt_file).read()
-    else:
+    if not exists(hgt_path) and exists(zip_path):
+        hgt_path = unzip_tile(log, zip_path, hgt_file, join(dir, SRTM_CACHE))
+        if hgt_path is None:
+            log.debug('Reading %s' % zip_path)
+            with ZipFile(zip_path) as zip:
+                data = zip.open(hgt_file).read()
+            return np.flip(np.frombuffer(data, np.dtype('>i2'), SAMPLES * SAMPLES).reshape((SAMPLES, SAMPLES)), 0)
+    elif not exists(hgt_path):
         # i tried automating download, but couldn't get ouath2 to work
         log.warning('Download %s' % BASE_URL + root + EXTN)
         raise Exception('Missing %s' % hgt_file)
-    return np.flip(np.frombuffer(data, np.dtype('>i2'), SAMPLES * SAMPLES).reshape((SAMPLES, SAMPLES)), 0)
+    log.debug('Mapping %s' % hgt_path)
+    return np.flip(np.memmap(hgt_path, np.dtype('>i2'), mode='r', shape=(SAMPLES, SAMPLES)), 0)
+
+
+# mapped tiles are cheap (the OS pages data in and out) so we can keep many (eg for long tours)
+@lru_cache(64)
+def cached_file_reader(log, dir, flat, flon):
+    return read_tile(log, dir, flat, flon)
 
 
 class ElevationSupport:
@@ -62,6 +101,35 @@ class ElevationSupport:
         # construct the path in the reader so it's skipped if we hit the cache
         return flat, flon, self._reader(self._log, self._dir, flat, flon)
 
+    def _tiles(self, lats, lons):
+        '''
+        Group points by tile, yielding (flat, flon, data, indices) where indices select the points
+        (as numpy arrays) inside the tile.  Points with missing (NaN) coords are skipped.
+        '''
+        flats, flons = np.floor(lats), np.floor(lons)
+        valid = np.flatnonzero(~(np.isnan(flats) | np.isnan(flons)))
+        tiles, inverse = np.unique(np.stack([flats[valid], flons[valid]], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        for i, (flat, flon) in enumerate(tiles):
+            flat, flon = int(flat), int(flon)
+            yield flat, flon, self._reader(self._log, self._dir, flat, flon), valid[inverse == i]
+
+    def elevations(self, lats, lons):
+        '''
+        Elevations for arrays of coords (NaN where coords are missing) in a single call.
+        '''
+        if self._dir:
+            lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+            elevations = np.full(lats.shape, np.nan)
+            for flat, flon, data, indices in self._tiles(lats, lons):
+                elevations[indices] = self._interpolate(flat, flon, data, lats[indices], lons[indices])
+            return elevations
+        else:
+            return None
+
+    def _interpolate(self, flat, flon, data, lats, lons):
+        raise NotImplementedError()
+
 
 def elevation_from_constant(log, s, interp, dir_name=SRTM1_DIR):
     try:
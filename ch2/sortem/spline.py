@@ -23,6 +23,9 @@ class SplineElevation(ElevationSupport):
         else:
             return None
 
+    def _interpolate(self, flat, flon, spline, lats, lons):
+        return spline.ev(lats, lons)  # not a grid - evaluated at each (lat, lon)
+
 
 def make_cached_spline_builder(smooth):
 
@@ -1,9 +1,9 @@
 
-from .tables.activity import ActivityGroup, ActivityTimespan, ActivityJournal, ActivityBookmark
+from .tables.activity import ActivityGroup, ActivityTimespan, ActivityJournal, ActivityBookmark, ActivityBlob
 from .tables.constant import Constant
 from .tables.system import SystemConstant, SystemProcess
 from .tables.monitor import MonitorJournal
-from .tables.nearby import ActivitySimilarity, ActivityNearby
+from .tables.nearby import ActivitySimilarity, ActivityNearby, ActivitySample
 from .tables.pipeline import Pipeline, PipelineType
 from .tables.segment import Segment, SegmentJournal
 from .tables.source import Source, Interval, NoStatistics, Dummy, Composite, CompositeComponent
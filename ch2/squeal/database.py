@@ -15,14 +15,14 @@ from ..lib.log import make_log
 
 # mention these so they are "created" (todo - is this needed? missing tables seem to get created anyway)
 Source,  Interval, Dummy, Composite, CompositeComponent
-ActivityGroup, ActivityJournal, ActivityTimespan, ActivityBookmark
+ActivityGroup, ActivityJournal, ActivityTimespan, ActivityBookmark, ActivityBlob
 Topic, TopicJournal, TopicField,
 StatisticName, StatisticJournal, StatisticJournalInteger, StatisticJournalFloat, StatisticJournalText, StatisticMeasure
 Segment, SegmentJournal
 Pipeline
 MonitorJournal
 Constant, SystemConstant, SystemProcess
-ActivitySimilarity, ActivityNearby
+ActivitySimilarity, ActivityNearby, ActivitySample
 Timestamp
 
 log = getLogger(__name__)
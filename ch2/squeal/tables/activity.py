@@ -1,7 +1,9 @@
 
 import datetime as dt
+from zlib import compress, decompress
 
-from sqlalchemy import Column, Text, Integer, ForeignKey, UniqueConstraint
+import numpy as np
+from sqlalchemy import Column, Text, Integer, ForeignKey, UniqueConstraint, LargeBinary
 from sqlalchemy.orm import relationship, backref
 
 from .source import Source, SourceType
@@ -92,3 +94,51 @@ class ActivityBookmark(Base):
 
     def __str__(self):
         return 'ActivityBookmark from %s - %s' % (format_time(self.start), format_time(self.finish))
+
+
+class ActivityBlob(Base):
+    '''
+    An optional, packed copy of a complete activity statistic (a column of waypoint data), stored as
+    compressed binary arrays.  Reading a whole activity from here is much faster than reading the
+    individual StatisticJournal rows (which are still stored, because many queries use them directly).
+
+    Times are epoch seconds, stored as (lossless) differences between the bit patterns of successive
+    values, which compress well.  Only integer and float values are packed.
+    '''
+
+    __tablename__ = 'activity_blob'
+
+    activity_journal_id = Column(Integer, ForeignKey('source.id', ondelete='cascade'), primary_key=True)
+    statistic_name_id = Column(Integer, ForeignKey('statistic_name.id', ondelete='cascade'), primary_key=True)
+    dtype = Column(Text, nullable=False)
+    times = Column(LargeBinary, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+    @classmethod
+    def pack(cls, s, activity_journal, statistic_name, times, values, dtype):
+        '''
+        Add a packed copy of the values (with epoch times), replacing any previous copy.
+        '''
+        if len(times) != len(values):
+            raise Exception(f'Packing {len(values)} values for {len(times)} times')
+        times = np.asarray(times, dtype=np.float64).view(np.int64)
+        deltas = np.diff(times, prepend=np.int64(0))
+        s.query(ActivityBlob). \
+            filter(ActivityBlob.activity_journal_id == activity_journal.id,
+                   ActivityBlob.statistic_name_id == statistic_name.id).delete()
+        s.add(ActivityBlob(activity_journal_id=activity_journal.id, statistic_name_id=statistic_name.id,
+                           dtype=np.dtype(dtype).str, times=compress(deltas.tobytes()),
+                           data=compress(np.asarray(values, dtype=dtype).tobytes())))
+
+    @classmethod
+    def read(cls, s, activity_journal, statistic_name_ids):
+        '''
+        A map from statistic name id to (epoch times, values) for any packed statistics.
+        '''
+        packed = {}
+        for blob in s.query(ActivityBlob). \
+                filter(ActivityBlob.activity_journal_id == activity_journal.id,
+                       ActivityBlob.statistic_name_id.in_(statistic_name_ids)).all():
+            times = np.cumsum(np.frombuffer(decompress(blob.times), dtype=np.int64)).view(np.float64)
+            packed[blob.statistic_name_id] = (times, np.frombuffer(decompress(blob.data), dtype=blob.dtype))
+        return packed
@@ -1,5 +1,4 @@
-
-from sqlalchemy import Column, Text
+from sqlalchemy import Column, Text, Integer
 
 from ..support import Base
 from ..types import Time, ShortCls
@@ -13,3 +12,18 @@ class FileScan(Base):
     owner = Column(ShortCls, nullable=False, primary_key=True)
     md5_hash = Column(Text, nullable=False, index=True)
     last_scan = Column(Time, nullable=False)
+
+
+class FileHash(Base):
+    '''
+    The md5 hash of a file, along with the stat values when it was calculated.  If these are unchanged
+    we assume the hash is too, and so avoid re-reading the file.
+    '''
+
+    __tablename__ = 'file_hash'
+
+    path = Column(Text, nullable=False, primary_key=True)
+    size = Column(Integer, nullable=False)
+    mtime_ns = Column(Integer, nullable=False)
+    inode = Column(Integer, nullable=False)
+    md5_hash = Column(Text, nullable=False)
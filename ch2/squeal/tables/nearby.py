@@ -1,5 +1,8 @@
 
-from sqlalchemy import Column, Integer, ForeignKey, Float, UniqueConstraint
+from zlib import compress, decompress
+
+import numpy as np
+from sqlalchemy import Column, Integer, ForeignKey, Float, UniqueConstraint, LargeBinary
 from sqlalchemy.orm import relationship, backref
 
 from ..support import Base
@@ -32,3 +35,45 @@ class ActivityNearby(Base):
                                     backref=backref('nearby', cascade='all, delete-orphan',
                                                     passive_deletes=True))
     UniqueConstraint(constraint, activity_journal_id)
+
+
+class ActivitySample(Base):
+    '''
+    The (sampled) positions of an activity used to calculate similarities for a constraint, with their
+    bounds.  Stored so that adding an activity needs only the positions of activities that are nearby
+    (and so that the sample for an activity does not change once it has been compared with others).
+
+    Longitudes and latitudes are stored as compressed float64 arrays.  The bounds are null if the sample
+    is empty.
+    '''
+
+    __tablename__ = 'activity_sample'
+
+    constraint = Column(Str, primary_key=True)
+    activity_journal_id = Column(Integer, ForeignKey('activity_journal.id', ondelete='cascade'), primary_key=True)
+    n_points = Column(Integer, nullable=False)
+    lon_min = Column(Float)
+    lon_max = Column(Float)
+    lat_min = Column(Float)
+    lat_max = Column(Float)
+    longitudes = Column(LargeBinary, nullable=False)
+    latitudes = Column(LargeBinary, nullable=False)
+
+    @classmethod
+    def pack(cls, s, constraint, activity_journal_id, lon_lats):
+        '''
+        Add the sample (a list of (lon, lat) pairs).
+        '''
+        lon_lat = np.array(lon_lats, dtype=np.float64).reshape(-1, 2)
+        bounds = (lon_lat.min(axis=0).tolist() + lon_lat.max(axis=0).tolist()) if len(lon_lat) else [None] * 4
+        s.add(ActivitySample(constraint=constraint, activity_journal_id=activity_journal_id, n_points=len(lon_lat),
+                             lon_min=bounds[0], lat_min=bounds[1], lon_max=bounds[2], lat_max=bounds[3],
+                             longitudes=compress(lon_lat[:, 0].tobytes()),
+                             latitudes=compress(lon_lat[:, 1].tobytes())))
+
+    def lon_lats(self):
+        '''
+        The sample as a list of (lon, lat) pairs.
+        '''
+        return list(zip(np.frombuffer(decompress(self.longitudes), dtype=np.float64).tolist(),
+                        np.frombuffer(decompress(self.latitudes), dtype=np.float64).tolist()))
@@ -11,6 +11,7 @@ from sqlalchemy.sql.functions import count
 from ..support import Base
 from ..types import OpenSched, Date, ShortCls, short_cls
 from ...lib.date import to_time, time_to_local_date, max_time, min_time, extend_range
+from ...lib.schedule import Schedule
 
 log = getLogger(__name__)
 
@@ -169,20 +170,6 @@ class Interval(Source):
                    Interval.schedule == schedule,
                    Interval.owner == interval_owner).one_or_none()
 
-    @classmethod
-    def _missing_interval_dates_from(cls, log, s, schedule, interval_owner, start, finish):
-        '''
-        Iterator over start DATES for intervals that are not present in the database,
-        starting from `start` and ending when an interval is found, or with `finish` if no intervals are found.
-        '''
-        while start <= time_to_local_date(finish):
-            next = schedule.next_frame(start)
-            log.debug('Missing Interval %s - %s' % (start, next))
-            yield start, next
-            start = next
-            if cls._existing_interval_at(s, schedule, interval_owner, start):
-                return
-
     @classmethod
     def first_missing_date(cls, log, s, schedule, interval_owner, statistic_owner=None):
         '''
@@ -199,16 +186,48 @@ class Interval(Source):
         '''
         Iterator over start DATES for all missing intervals, given the constraints supplied.
         '''
-        def intervals():
-            starts, overall_finish = cls._missing_interval_start_dates(log, s, schedule, interval_owner,
-                                                                       statistic_owner)
-            for block_start in starts:
-                yield from cls._missing_interval_dates_from(log, s, schedule, interval_owner, block_start,
-                                                            overall_finish)
-        for a, b in intervals():
-            if start and b <= start: continue
-            if finish and a >= finish: continue
-            yield a, b
+        yield from cls.missing_date_ranges(log, s, [schedule], interval_owner, statistic_owner=statistic_owner,
+                                           start=start, finish=finish)[0]
+
+    @classmethod
+    def missing_date_ranges(cls, log, s, schedules, interval_owner, statistic_owner=None, start=None, finish=None):
+        '''
+        For each schedule, a sorted list of (start, finish) DATES for missing intervals.
+
+        All existing intervals (for all schedules) are read in a single query and the candidate frames are
+        then generated in memory (the same frames as stepping through the database one interval at a time).
+        '''
+        stats_start, stats_finish = cls._raw_statistics_time_range(s, statistic_owner)
+        log.debug('Statistics (in general) exist %s - %s' % (stats_start, stats_finish))
+        keys = [_open_schedule(schedule) for schedule in schedules]
+        existing = dict((key, {}) for key in keys)
+        for schedule, interval_start, interval_finish in \
+                s.query(Interval.schedule, Interval.start, Interval.finish). \
+                        filter(Interval.owner == interval_owner,
+                               Interval.schedule.in_(keys)).all():
+            existing[_open_schedule(schedule)][interval_start] = interval_finish
+        return [sorted(set(cls.__missing_frames(log, schedule, existing[key], stats_start, stats_finish,
+                                                start, finish)))
+                for schedule, key in zip(schedules, keys)]
+
+    @classmethod
+    def __missing_frames(cls, log, schedule, existing, stats_start, stats_finish, start, finish):
+        # existing is a map from start to finish DATES for intervals of the given schedule
+        starts = sorted(set(existing.values()) - set(existing))  # finishes with no following interval
+        stats_start_date = schedule.start_of_frame(time_to_local_date(stats_start))
+        if (not starts or starts[0] > stats_start_date) and stats_start_date not in existing:
+            starts = [stats_start_date] + starts
+        last = time_to_local_date(stats_finish)
+        for block_start in starts:
+            frame = block_start
+            while frame is not None and frame <= last:
+                next = schedule.next_frame(frame)
+                if not (start and next <= start) and not (finish and frame >= finish):
+                    log.debug('Missing Interval %s - %s' % (frame, next))
+                    yield frame, next
+                frame = next
+                if frame in existing:
+                    break
 
     @classmethod
     def delete_all(cls, log, s):
@@ -311,3 +330,10 @@ class Composite(Source):
                 n = s.connection().execute(q3).scalar()
             log.warning(f'Deleted {total} Composite entries')
             s.commit()
+
+
+def _open_schedule(schedule):
+    # the (string) form of the schedule used in the database
+    schedule = Schedule(str(schedule))
+    schedule.start, schedule.finish = None, None
+    return str(schedule)
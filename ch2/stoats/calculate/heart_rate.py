@@ -4,7 +4,9 @@ from collections import namedtuple
 from json import loads
 from logging import getLogger
 
-from sqlalchemy import desc, inspect, select, and_
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect, select, and_
 
 from ch2.data import hr_zones
 from . import MultiProcCalculator, ActivityJournalCalculatorMixin, DirectCalculatorMixin
@@ -26,14 +28,16 @@ class HeartRateCalculator(ActivityJournalCalculatorMixin, DirectCalculatorMixin,
         super().__init__(*args, **kargs)
 
     def _startup(self, s):
+        # for each activity group, the times (epoch microseconds, increasing) and values of FTHR
         self.__fthr_cache = {}
         for activity_group in s.query(ActivityGroup).all():
-            self.__fthr_cache[activity_group.id] = \
-                list(s.query(StatisticJournal).join(StatisticName).
-                     filter(StatisticName.name == FTHR,
-                            StatisticName.owner == Constant,
-                            StatisticName.constraint == activity_group).
-                     order_by(desc(StatisticJournal.time)).all())
+            fthrs = s.query(StatisticJournal).join(StatisticName). \
+                filter(StatisticName.name == FTHR,
+                       StatisticName.owner == Constant,
+                       StatisticName.constraint == activity_group). \
+                order_by(StatisticJournal.time).all()
+            self.__fthr_cache[activity_group.id] = (epoch_micros([fthr.time for fthr in fthrs]),
+                                                    [fthr.value for fthr in fthrs])
 
     def _read_data(self, s, ajournal):
         sn = inspect(StatisticName).local_table
@@ -53,60 +57,70 @@ class HeartRateCalculator(ActivityJournalCalculatorMixin, DirectCalculatorMixin,
 
         hr_impulse = HRImpulse(**loads(Constant.get(s, self.impulse).at(s).value))
         log.debug('%s: %s' % (self.impulse, hr_impulse))
-        impulses = []
-        prev_time, prev_heart_rate_zone = None, None
-
-        for time, heart_rate in data:
-            if heart_rate:
-                heart_rate_zone = self._calculate_zone(s, heart_rate, time, ajournal.activity_group)
-                if heart_rate_zone is not None:
-                    loader.add(HR_ZONE, None, None, ajournal.activity_group, ajournal, heart_rate_zone, time,
-                               StatisticJournalFloat)
-            else:
-                heart_rate_zone = None
-            if prev_heart_rate_zone is not None:
-                duration = (time - prev_time).total_seconds()
-                if duration <= hr_impulse.max_secs:
-                    heart_rate_impulse = self._calculate_impulse(prev_heart_rate_zone, duration, hr_impulse)
-                    impulses.append((heart_rate_impulse, time))
-                    loader.add(hr_impulse.dest_name, None, None, ajournal.activity_group, ajournal,
-                               heart_rate_impulse, time, StatisticJournalFloat)
-                    loader.add('%s (duration)' % hr_impulse.dest_name, S, None, ajournal.activity_group, ajournal,
-                               duration, time, StatisticJournalFloat)
-            elif not impulses:
-                impulses.append((0, time))
-            prev_time, prev_heart_rate_zone = time, heart_rate_zone
-
-        if impulses:
-            loader = StatisticJournalLoader(s, self)
-            self._interpolate(hr_impulse.dest_name, loader, impulses, ajournal)
-            # if there are no values, add a single null so we don't re-process
-            if not loader:
-                loader.add(HR_ZONE, None, None, ajournal.activity_group, ajournal, None, ajournal.start,
-                           StatisticJournalFloat)
-            loader.load()
-
-    def _calculate_impulse(self, heart_rate_zone, duration, hr_impulse):
-        return duration * ((max(heart_rate_zone, hr_impulse.zero) - hr_impulse.zero)
-                           / (6 - hr_impulse.zero)) ** hr_impulse.gamma
-
-    def _calculate_zone(self, s, heart_rate, time, activity_group):
-        for fthr in self.__fthr_cache[activity_group.id]:
-            if fthr.time <= time:  # ordered in descending time
-                lower_limit, prev_delta = 0, None
-                zones = hr_zones(fthr.value)
-                for zone, upper_limit in enumerate(zones):
-                    if lower_limit <= heart_rate < upper_limit:
-                        if zone == 0:
-                            return 1 + zone
-                        elif zone == 5:
-                            return 1 + zone + (heart_rate - lower_limit) / prev_delta
-                        else:
-                            return 1 + zone + (heart_rate - lower_limit) / (upper_limit - lower_limit)
-                    prev_delta = upper_limit - lower_limit
-                    lower_limit = upper_limit
-
-    def _interpolate(self, name, loader, impulses, ajournal, interval=10):
+        if not data:
+            return
+
+        # times are handled as integer microseconds so that durations are exact (as timedelta)
+        times = [time for time, _ in data]
+        micros = epoch_micros(times)
+        heart_rates = np.array([heart_rate if heart_rate else np.nan for _, heart_rate in data], dtype=float)
+        zones = self._calculate_zones(micros, heart_rates, ajournal.activity_group)
+        durations = np.full(len(times), np.nan)
+        durations[1:] = np.diff(micros) / 1e6
+        impulses = self._calculate_impulses(zones, durations, hr_impulse)
+
+        present = ~np.isnan(impulses)
+        loader.add_columns(ajournal.activity_group, ajournal, times,
+                           [(HR_ZONE, None, None, StatisticJournalFloat, zones.tolist(), ~np.isnan(zones)),
+                            (hr_impulse.dest_name, None, None, StatisticJournalFloat, impulses.tolist(), present),
+                            ('%s (duration)' % hr_impulse.dest_name, S, None, StatisticJournalFloat,
+                             durations.tolist(), present)])
+
+        # the integral starts from zero at the first sample
+        knots = np.concatenate([[micros[0]], micros[present]])
+        integral = np.cumsum(np.concatenate([[0.0], impulses[present]]))
+        loader = StatisticJournalLoader(s, self)
+        self._interpolate(hr_impulse.dest_name, loader, times[0], knots - micros[0], integral, ajournal)
+        # if there are no values, add a single null so we don't re-process
+        if not loader:
+            loader.add(HR_ZONE, None, None, ajournal.activity_group, ajournal, None, ajournal.start,
+                       StatisticJournalFloat)
+        loader.load()
+
+    def _calculate_impulses(self, zones, durations, hr_impulse):
+        # the impulse at each sample comes from the zone of the previous sample (nan if none)
+        previous = np.full(len(zones), np.nan)
+        previous[1:] = zones[:-1]
+        valid = ~np.isnan(previous) & (durations <= hr_impulse.max_secs)  # nan compares false
+        scaled = (np.maximum(previous[valid], hr_impulse.zero) - hr_impulse.zero) / (6 - hr_impulse.zero)
+        impulses = np.full(len(zones), np.nan)
+        # float_power (unlike power) uses the same pow() as python, so results are identical to scalar code
+        impulses[valid] = durations[valid] * np.float_power(scaled, hr_impulse.gamma)
+        return impulses
+
+    def _calculate_zones(self, micros, heart_rates, activity_group):
+        # the zone for each heart rate, using the FTHR that applied at the time (nan if none or out of range)
+        fthr_micros, fthrs = self.__fthr_cache[activity_group.id]
+        zones = np.full(len(heart_rates), np.nan)
+        indices = np.searchsorted(fthr_micros, micros, side='right') - 1
+        for index in np.unique(indices[indices >= 0]).tolist():
+            selected = (indices == index) & ~np.isnan(heart_rates)
+            heart_rate = heart_rates[selected]
+            upper = np.array(hr_zones(fthrs[index]))
+            lower = np.concatenate([[0], upper])
+            zone = np.digitize(heart_rate, upper)  # lower[zone] <= heart_rate < upper[zone]
+            valid = zone < len(upper)
+            heart_rate, zone = heart_rate[valid], zone[valid]
+            value = 1 + zone + (heart_rate - lower[zone]) / (upper[zone] - lower[zone])
+            # the top zone is open-ended, so uses the width of the zone below
+            top = zone == len(upper) - 1
+            value[top] = 1 + zone[top] + (heart_rate[top] - lower[zone[top]]) / \
+                         (lower[zone[top]] - lower[zone[top] - 1])
+            value[zone == 0] = 1
+            zones[np.flatnonzero(selected)[valid]] = value
+        return zones
+
+    def _interpolate(self, name, loader, start, knots, integral, ajournal, interval=10):
 
         # we need evenly-sampled statistics so we can do distributions over time.
         # why interpolate just this one statistic?
@@ -116,22 +130,20 @@ class HeartRateCalculator(ActivityJournalCalculatorMixin, DirectCalculatorMixin,
 
         # you can configure names, but plotting assumes HR_IMPULSE_10 exists...
 
-        integral, sum = [], 0
-        for impulse, time in impulses:
-            sum += impulse
-            integral.append((sum, time))
-
-        impulse_0, time_0 = integral.pop(0)
-        time, prev = time_0, 0
-        while integral:
-            impulse_1, time_1 = integral[0]
-            delta = (time_1 - time_0).total_seconds()
-            while time <= time_1:
-                interp = impulse_0 + (impulse_1 - impulse_0) * (time - time_0).total_seconds() / delta
-                diff = (interp - prev) / interval
-                loader.add(f'{name} / {interval}s', None, None, ajournal.activity_group, ajournal, diff, time,
-                           StatisticJournalFloat)
-                time += dt.timedelta(seconds=interval)
-                prev = interp
-            while integral and time > integral[0][1]:
-                impulse_0, time_0 = integral.pop(0)
+        # knots are microseconds from start (increasing, from zero)
+        if len(knots) < 2:
+            return
+        grid = np.arange(0, knots[-1] + 1, interval * 1000000)
+        right = np.maximum(np.searchsorted(knots, grid, side='left'), 1)
+        left = right - 1
+        interp = integral[left] + (integral[right] - integral[left]) * ((grid - knots[left]) / 1e6) / \
+                 ((knots[right] - knots[left]) / 1e6)
+        diffs = np.diff(interp, prepend=0) / interval
+        times = [start + dt.timedelta(microseconds=micros) for micros in grid.tolist()]
+        loader.add_columns(ajournal.activity_group, ajournal, times,
+                           [(f'{name} / {interval}s', None, None, StatisticJournalFloat, diffs.tolist(),
+                             np.ones(len(times), dtype=bool))])
+
+
+def epoch_micros(times):
+    return pd.DatetimeIndex(times).asi8 // 1000
@@ -1,14 +1,16 @@
 
+import datetime as dt
 from collections import namedtuple
 from json import loads
 from logging import getLogger
 
+import pandas as pd
 from sqlalchemy.sql.functions import count
 
 from . import UniProcCalculator, DataFrameCalculatorMixin
 from ..load import StatisticJournalLoader
 from ...data.frame import statistics
-from ...data.impulse import pre_calc, DecayModel, calc
+from ...data.impulse import pre_calc, DecayModel, calc, restart
 from ...lib.date import round_hour, to_time, local_date_to_time
 from ...squeal import StatisticJournal, Composite, StatisticName, Source, Constant, CompositeComponent, \
     StatisticJournalFloat
@@ -23,16 +25,18 @@ Response = namedtuple('Response', 'src_name, src_owner, dest_name, tau_days, sca
 
 class ImpulseCalculator(DataFrameCalculatorMixin, UniProcCalculator):
     '''
-    this is hard to do correctly, incrementally.
-
-    for now, we do all or nothing.
-
     first, we check if the current solution is complete:
     * extends across full date range
     * all sources used
     (no need to check for gaps - composite chaining should do that)
 
-    if not complete, we regenerate the whole damn thing.
+    if not complete, we find the last hour before any change (the earliest unused source or the
+    end of the existing data) and continue the calculation from there (the decay is a recurrence,
+    so the stored values at that hour are all we need).  the values (and composite sources) after
+    that hour are deleted first.
+
+    if there is no such hour (eg no existing data, or the change is before it) we regenerate the
+    whole damn thing.
     '''
 
     def __init__(self, *args, responses=None, impulse=None, **kargs):
@@ -86,11 +90,54 @@ class ImpulseCalculator(DataFrameCalculatorMixin, UniProcCalculator):
         if missing_coverage or missing_sources:
             if missing_coverage: log.info('Incomplete coverage (so will re-calculate)')
             if missing_sources: log.info('Additional sources (so will re-calculate)')
-            self._delete_from(s)
-            return [(start, finish)]
+            restart = self.__restart_time(s)
+            if restart:
+                log.info(f'Continuing from {restart}')
+                self._delete_after(s, restart)
+                return [(restart, finish)]
+            else:
+                self._delete_from(s)
+                return [(start, finish)]
         else:
             return []
 
+    def __restart_time(self, s):
+        # the last hour (common to all responses) before the first unused source
+        q = s.query(StatisticJournal.time). \
+            join(StatisticName, StatisticJournal.statistic_name_id == StatisticName.id). \
+            filter(StatisticName.name == self.impulse.dest_name,
+                   StatisticName.owner == self.owner_in,
+                   ~StatisticJournal.source_id.in_(self.__used_sources(s)))
+        first_unused = q.order_by(StatisticJournal.time.asc()).limit(1).scalar()
+        latest = []
+        for response in self.responses:
+            q = s.query(StatisticJournal.time). \
+                join(StatisticName, StatisticJournal.statistic_name_id == StatisticName.id). \
+                filter(StatisticName.name == response.dest_name,
+                       StatisticName.owner == self.owner_out)
+            if first_unused:
+                q = q.filter(StatisticJournal.time <= round_hour(first_unused, up=False))
+            latest.append(q.order_by(StatisticJournal.time.desc()).limit(1).scalar())
+        if latest and all(latest):
+            return min(latest)
+
+    def _delete_after(self, s, time):
+        # delete the values after the given time and the composite sources that were created for them.
+        # deleting the successor of the composite used at that time unzips the rest of the chain.
+        name_ids = s.query(StatisticName.id).filter(StatisticName.owner == self.owner_out)
+        composite_id = s.query(StatisticJournal.source_id). \
+            filter(StatisticJournal.statistic_name_id.in_(name_ids),
+                   StatisticJournal.time == time).limit(1).scalar()
+        n = s.query(StatisticJournal). \
+            filter(StatisticJournal.statistic_name_id.in_(name_ids),
+                   StatisticJournal.time > time).delete(synchronize_session=False)
+        log.debug(f'Deleted {n} values after {time}')
+        successor_ids = s.query(CompositeComponent.output_source_id). \
+            filter(CompositeComponent.input_source_id == composite_id)
+        s.query(Source).filter(Source.id.in_(successor_ids)).delete(synchronize_session=False)
+        s.commit()
+        Composite.clean(s)
+
     def __missing_coverage(self, s, response, n_secs):
         q = s.query(StatisticJournal.time). \
             join(StatisticName, StatisticJournal.statistic_name_id == StatisticName.id). \
@@ -107,17 +154,19 @@ class ImpulseCalculator(DataFrameCalculatorMixin, UniProcCalculator):
             return True
         return False
 
-    def __missing_sources(self, s):
+    def __used_sources(self, s):
         response_ids = s.query(StatisticName.id). \
             filter(StatisticName.owner == self.owner_out)
-        inputs = s.query(CompositeComponent.input_source_id). \
+        return s.query(CompositeComponent.input_source_id). \
             join(StatisticJournal, StatisticJournal.source_id == CompositeComponent.output_source_id). \
             filter(StatisticJournal.statistic_name_id.in_(response_ids))
+
+    def __missing_sources(self, s):
         unused = s.query(count(StatisticJournal.id)). \
             join(StatisticName, StatisticJournal.statistic_name_id == StatisticName.id). \
             filter(StatisticName.name == self.impulse.dest_name,
                    StatisticName.owner == self.owner_in,
-                   ~StatisticJournal.source_id.in_(inputs)).scalar()
+                   ~StatisticJournal.source_id.in_(self.__used_sources(s))).scalar()
         return unused
 
     def __full_range(self, s, start=True):
@@ -131,32 +180,65 @@ class ImpulseCalculator(DataFrameCalculatorMixin, UniProcCalculator):
 
     def _run_one(self, s, missed):
         start, finish = missed
-        hr10 = statistics(s, self.impulse.dest_name, owner=self.owner_in, with_sources=True, check=False)
-        if not hr10.empty:
+        previous = self.__previous(s, start)
+        hr10 = statistics(s, self.impulse.dest_name, owner=self.owner_in, with_sources=True, check=False,
+                          start=start if previous else None)
+        if previous:
+            prev_source, values = previous
+            if hr10.empty:
+                hr10 = pd.DataFrame({self.impulse.dest_name: []}, index=pd.DatetimeIndex([], tz=dt.timezone.utc))
+            used = set(id for (id,) in self.__used_sources(s))
+            all_sources = list(self.__make_sources(s, hr10, prev_source, used)) if len(hr10) else []
+            all_sources = [(start, prev_source)] + all_sources
+            start = start + dt.timedelta(hours=1)  # first new value
+        elif hr10.empty:
+            return
+        else:
             all_sources = list(self.__make_sources(s, hr10))
-            for response in self.responses:
-                log.info(f'Creating values for {response.dest_name}')
-                model = DecayModel(start=response.start, zero=0, scale=response.scale,
-                                   period=response.tau_days * 24 * 60 * 60 / 3600,  # convert to intervals
-                                   input=self.impulse.dest_name, output=response.dest_name)
-                hr3600 = pre_calc(hr10.copy(), model, start=start, finish=finish)
-                result = calc(hr3600, model)
-                loader = StatisticJournalLoader(s, self.owner_out, add_serial=False)
-                source, sources = None, list(all_sources)
-                for time, row in result.iterrows():
-                    while sources and time >= sources[0][0]:
-                        source = sources.pop(0)[1]
-                    loader.add(response.dest_name, None, None, None, source, row[response.dest_name], time,
-                               StatisticJournalFloat)
-                loader.load()
-
-    def __make_sources(self, s, hr10):
+        for response in self.responses:
+            log.info(f'Creating values for {response.dest_name}')
+            model = DecayModel(start=response.start, zero=0, scale=response.scale,
+                               period=response.tau_days * 24 * 60 * 60 / 3600,  # convert to intervals
+                               input=self.impulse.dest_name, output=response.dest_name)
+            if previous:
+                model = restart(model, values[response.dest_name])
+            hr3600 = pre_calc(hr10.copy(), model, start=start, finish=finish)
+            result = calc(hr3600, model)
+            if previous:
+                result = result.loc[result.index >= start]  # first row is the existing value
+            loader = StatisticJournalLoader(s, self.owner_out, add_serial=False)
+            source, sources = None, list(all_sources)
+            for time, value in zip(result.index, result[response.dest_name]):
+                while sources and time >= sources[0][0]:
+                    source = sources.pop(0)[1]
+                loader.add(response.dest_name, None, None, None, source, value, time, StatisticJournalFloat)
+            loader.load()
+
+    def __previous(self, s, time):
+        # the composite source and values at the given time, if we are continuing a calculation
+        values, source = {}, None
+        for response in self.responses:
+            journal = s.query(StatisticJournal). \
+                join(StatisticName, StatisticJournal.statistic_name_id == StatisticName.id). \
+                filter(StatisticName.name == response.dest_name,
+                       StatisticName.owner == self.owner_out,
+                       StatisticJournal.time == time).one_or_none()
+            if journal is None:
+                return None
+            values[response.dest_name] = journal.value
+            source = journal.source
+        return source, values
+
+    def __make_sources(self, s, hr10, prev=None, used=()):
         log.info('Creating sources')
         name = _src(self.impulse.dest_name)
-        prev = add(s, Composite(n_components=0))
-        yield to_time(0.0), prev
+        if prev is None:
+            prev = add(s, Composite(n_components=0))
+            yield to_time(0.0), prev
         for time, row in hr10.loc[hr10[name].ne(hr10[name].shift())].iterrows():
             id = row[name]
+            if id in used:
+                continue  # already included in prev (when continuing a calculation)
             composite = add(s, Composite(n_components=2))
             add(s, CompositeComponent(input_source_id=id, output_source=composite))
             add(s, CompositeComponent(input_source=prev, output_source=composite))
@@ -5,24 +5,31 @@ from json import loads
 from logging import getLogger
 from random import uniform
 
-from sqlalchemy import inspect, select, alias, and_, distinct, func, not_, or_
+import numpy as np
+from sqlalchemy import inspect, select, alias, and_, func, not_, or_
 from sqlalchemy.sql.functions import count
 
 from . import UniProcCalculator
 from ..names import LONGITUDE, LATITUDE, ACTIVE_DISTANCE
 from ...arty import MatchType
-from ...arty.spherical import SQRTree
+from ...arty.spherical import SQRTree, LocalTangent, norm180
 from ...lib.date import to_time, local_date_to_time
 from ...lib.dbscan import DBSCAN
 from ...lib.optimizn import expand_max
-from ...squeal import ActivityJournal, ActivityGroup, Constant, ActivitySimilarity, ActivityNearby, StatisticName, \
-    StatisticJournal, StatisticJournalFloat, Timestamp
+from ...squeal import ActivityJournal, ActivityGroup, Constant, ActivitySimilarity, ActivityNearby, ActivitySample, \
+    StatisticName, StatisticJournal, StatisticJournalFloat, Timestamp
 
 log = getLogger(__name__)
 Nearby = namedtuple('Nearby', 'constraint, activity_group, border, start, finish, '
                               'latitude, longitude, height, width, fraction')
 
 
+def chunks(ids, n=500):
+    # avoid too many parameters in a query
+    for i in range(0, len(ids), n):
+        yield ids[i:i+n]
+
+
 class SimilarityCalculator(UniProcCalculator):
 
     def __init__(self, *args, nearby=None, **kargs):
@@ -64,40 +71,84 @@ class SimilarityCalculator(UniProcCalculator):
                    or_(ActivitySimilarity.activity_journal_lo_id.in_(activity_ids.cte()),
                        ActivitySimilarity.activity_journal_hi_id.in_(activity_ids.cte()))). \
             delete(synchronize_session=False)
+        s.query(ActivitySample). \
+            filter(ActivitySample.constraint == self.nearby.constraint,
+                   ActivitySample.activity_journal_id.in_(activity_ids.cte())). \
+            delete(synchronize_session=False)
         Timestamp.clear(s, self.owner_out, self.nearby.constraint)
         s.commit()
 
     def _run_one(self, s, missed):
-        rtree = SQRTree(default_match=MatchType.OVERLAP, default_border=self.nearby.border)
+        self._delete_unsampled(s)
+        new = self._sample(s)
+        zero = (self.nearby.longitude, self.nearby.latitude)  # fixed so that _margin is correct
+        rtree = SQRTree(default_match=MatchType.OVERLAP, default_border=self.nearby.border, zero=zero)
         n_points = defaultdict(lambda: 0)
-        self._prepare(s, rtree, n_points, 30000)
+        self._prepare(s, rtree, n_points, new, zero)
         n_overlaps = defaultdict(lambda: defaultdict(lambda: 0))
-        new_ids, affected_ids = self._count_overlaps(s, rtree, n_points, n_overlaps, 10000)
+        new_ids, affected_ids = self._count_overlaps(rtree, n_points, n_overlaps, new, 10000)
         # this clears itself beforehand
         # use explicit class to distinguish from subclasses (which compare against this)
         with Timestamp(owner=self.owner_out, constraint=self.nearby.constraint).on_success(log, s):
+            for aj_id, lon_lats in new:
+                ActivitySample.pack(s, self.nearby.constraint, aj_id, lon_lats)
             self._save(s, new_ids, affected_ids, n_points, n_overlaps, 10000)
 
-    def _prepare(self, s, rtree, n_points, delta):
-        n = 0
-        for aj_id_in, lon, lat in self._filter(self._aj_lon_lat(s, new=False)):
-            posn = [(lon, lat)]
-            rtree[posn] = aj_id_in
-            n_points[aj_id_in] += 1
-            n += 1
-            if n % delta == 0:
-                log.info('Loaded %s points for %s' % (n, self.nearby.constraint))
-        if n % delta:
-            log.info('Loaded %s points for %s' % (n, self.nearby.constraint))
-
-    def _count_overlaps(self, s, rtree, n_points, n_overlaps, delta):
+    def _delete_unsampled(self, s):
+        # similarities from before samples were stored cannot be extended, so start again
+        if not s.query(ActivitySample).filter(ActivitySample.constraint == self.nearby.constraint).first() and \
+                s.query(ActivitySimilarity).filter(ActivitySimilarity.constraint == self.nearby.constraint).first():
+            log.warning(f'No samples for {self.nearby.constraint} so recalculating all similarities')
+            s.query(ActivitySimilarity).filter(ActivitySimilarity.constraint == self.nearby.constraint). \
+                delete(synchronize_session=False)
+            s.commit()
+
+    def _sample(self, s):
+        new = [(aj_id, [(lon, lat) for _, lon, lat in self._filter(aj_lon_lats)])
+               for aj_id, aj_lon_lats in groupby(self._aj_lon_lat(s), key=lambda aj_lon_lat: aj_lon_lat[0])]
+        log.info(f'Sampled {sum(len(lon_lats) for _, lon_lats in new)} points from {len(new)} new activities '
+                 f'for {self.nearby.constraint}')
+        return new
+
+    def _prepare(self, s, rtree, n_points, new, zero):
+        # only existing activities whose bounds are within reach of a new activity can overlap
+        dlon, dlat = self._margin(zero)
+        bounds = s.query(ActivitySample.activity_journal_id, ActivitySample.lon_min, ActivitySample.lon_max,
+                         ActivitySample.lat_min, ActivitySample.lat_max). \
+            filter(ActivitySample.constraint == self.nearby.constraint, ActivitySample.n_points > 0).all()
+        candidates = set()
+        if bounds:
+            ids, lon_min, lon_max, lat_min, lat_max = (np.array(column) for column in zip(*bounds))
+            for _, lon_lats in new:
+                if lon_lats:
+                    lon, lat = np.array(lon_lats).T
+                    near = (lon_min <= lon.max() + dlon) & (lon_max >= lon.min() - dlon) & \
+                           (lat_min <= lat.max() + dlat) & (lat_max >= lat.min() - dlat)
+                    candidates.update(ids[near].tolist())
+        items = []
+        for ids in chunks(sorted(candidates)):
+            for sample in s.query(ActivitySample). \
+                    filter(ActivitySample.constraint == self.nearby.constraint,
+                           ActivitySample.activity_journal_id.in_(ids)).all():
+                items.extend(([lon_lat], sample.activity_journal_id) for lon_lat in sample.lon_lats())
+                n_points[sample.activity_journal_id] = sample.n_points
+        rtree.load(items)  # bulk load is much faster than adding one at a time
+        log.info(f'Loaded {len(items)} points from {len(candidates)} of {len(bounds)} activities '
+                 f'for {self.nearby.constraint}')
+
+    def _margin(self, zero):
+        # points overlap if their MBRs (each extended by the border) overlap, so they are at most
+        # two borders apart (in the tree's local plane).  a little slack allows for rounding.
+        lon, lat = LocalTangent(zero).denormalize((2 * self.nearby.border, 2 * self.nearby.border))
+        return 1.001 * abs(norm180(lon - zero[0])), 1.001 * abs(lat - zero[1])
+
+    def _count_overlaps(self, rtree, n_points, n_overlaps, new, delta):
         new_aj_ids, affected_aj_ids, n, no = [], set(), 0, 0
-        for aj_id_in, aj_lon_lats in groupby(self._aj_lon_lat(s, new=True), key=lambda aj_lon_lat: aj_lon_lat[0]):
-            aj_lon_lats = list(self._filter(aj_lon_lats))  # reuse below
+        for aj_id_in, lon_lats in new:
             seen_posns = set()
             new_aj_ids.append(aj_id_in)
             affected_aj_ids.add(aj_id_in)
-            for _, lon, lat in aj_lon_lats:
+            for lon, lat in lon_lats:
                 posn = [(lon, lat)]
                 for other_posn, aj_id_out in rtree.get_items(posn):
                     if other_posn not in seen_posns:
@@ -106,7 +157,7 @@ class SimilarityCalculator(UniProcCalculator):
                         n_overlaps[lo][hi] += 1
                         no += 1
                         seen_posns.add(other_posn)
-            for _, lon, lat in aj_lon_lats:  # adding after avoids matching ourselves
+            for lon, lat in lon_lats:  # adding after avoids matching ourselves
                 posn = [(lon, lat)]
                 rtree[posn] = aj_id_in
                 n_points[aj_id_in] += 1
@@ -122,12 +173,12 @@ class SimilarityCalculator(UniProcCalculator):
             if uniform(0, 1 / self.nearby.fraction) < 1:
                 yield lon_lat
 
-    def _aj_lon_lat(self, s, new=True):
+    def _aj_lon_lat(self, s):
 
         start = to_time(self.nearby.start)
         finish = to_time(self.nearby.finish)
 
-        agroup = s.query(ActivityGroup.id).filter(ActivityGroup.name == self.nearby.activity_group).scalar()
+        agroup = s.query(ActivityGroup).filter(ActivityGroup.name == self.nearby.activity_group).one()
         lat = s.query(StatisticName.id). \
             filter(StatisticName.name == LATITUDE, StatisticName.constraint == agroup).scalar()
         lon = s.query(StatisticName.id). \
@@ -138,20 +189,17 @@ class SimilarityCalculator(UniProcCalculator):
         sjf_lat = inspect(StatisticJournalFloat).local_table
         sjf_lon = alias(inspect(StatisticJournalFloat).local_table)
         aj = inspect(ActivityJournal).local_table
-        ns = inspect(ActivitySimilarity).local_table
+        sample = inspect(ActivitySample).local_table
 
-        existing_lo = select([ns.c.activity_journal_lo_id]). \
-            where(ns.c.constraint == self.nearby.constraint)
-        existing_hi = select([ns.c.activity_journal_hi_id]). \
-            where(ns.c.constraint == self.nearby.constraint)
-        existing = existing_lo.union(existing_hi).cte()
+        existing = select([sample.c.activity_journal_id]). \
+            where(sample.c.constraint == self.nearby.constraint).cte()
 
         stmt = select([sj_lat.c.source_id, sjf_lon.c.value, sjf_lat.c.value]). \
             select_from(sj_lat).select_from(sj_lon).select_from(sjf_lat).select_from(sjf_lat).select_from(aj). \
             where(and_(sj_lat.c.source_id == sj_lon.c.source_id,  # same source
                        sj_lat.c.time == sj_lon.c.time,            # same time
                        sj_lat.c.source_id == aj.c.id,             # and associated with an activity
-                       aj.c.activity_group_id == agroup,          # of the right group
+                       aj.c.activity_group_id == agroup.id,       # of the right group
                        sj_lat.c.id == sjf_lat.c.id,               # lat sub-class
                        sj_lon.c.id == sjf_lon.c.id,               # lon sub-class
                        sj_lat.c.statistic_name_id == lat,         # lat name
@@ -163,19 +211,18 @@ class SimilarityCalculator(UniProcCalculator):
                        sjf_lon.c.value > self.nearby.longitude - self.nearby.width / 2,
                        sjf_lon.c.value < self.nearby.longitude + self.nearby.width / 2))
 
-        if new:
-            stmt = stmt.where(func.not_(sj_lat.c.source_id.in_(existing)))
-        else:
-            stmt = stmt.where(sj_lat.c.source_id.in_(existing))
+        stmt = stmt.where(func.not_(sj_lat.c.source_id.in_(existing)))  # only new activities
         stmt = stmt.order_by(sj_lat.c.source_id)  # needed for seen logic
         yield from s.connection().execute(stmt)
 
     def _save(self, s, new_ids, affected_ids, n_points, n_overlaps, delta):
-        distances = dict((s.source.id, s.value)
-                         for s in s.query(StatisticJournalFloat).
-                         join(StatisticName).
-                         filter(StatisticName.name == ACTIVE_DISTANCE,
-                                StatisticName.owner == self.owner_in).all())  # todo - another owner
+        new_ids, distances = set(new_ids), {}
+        for ids in chunks(sorted(affected_ids)):
+            distances.update(s.query(StatisticJournalFloat.source_id, StatisticJournalFloat.value).
+                             join(StatisticName).
+                             filter(StatisticName.name == ACTIVE_DISTANCE,
+                                    StatisticName.owner == self.owner_in,  # todo - another owner
+                                    StatisticJournalFloat.source_id.in_(ids)).all())
         n = 0
         for lo in affected_ids:
             add_lo, d_lo = lo in new_ids, distances.get(lo, None)
@@ -201,37 +248,68 @@ class SimilarityCalculator(UniProcCalculator):
             log.info('Wrote %d for %s' % (n, self.nearby.constraint))
 
 
+class NearbySimilarityGraph:
+    '''
+    The similarities for a constraint, read once and held in memory as a sparse (CSR) adjacency list,
+    so that DBSCAN neighbourhoods (at any epsilon) are array slices rather than database queries.
+
+    Neighbours are in the order the original queries returned them, so the clusters are unchanged:
+    activities with a lower id (via the hi index, so by ActivitySimilarity.id), then activities with a
+    higher id (via the unique constraint, so by activity id).
+    '''
+
+    def __init__(self, s, constraint):
+        rows = s.query(ActivitySimilarity.id, ActivitySimilarity.activity_journal_lo_id,
+                       ActivitySimilarity.activity_journal_hi_id, ActivitySimilarity.similarity). \
+            filter(ActivitySimilarity.constraint == constraint).all()
+        id, lo, hi, similarity = (np.array(column) for column in zip(*rows)) if rows else [np.empty(0)] * 4
+        # only the lower ids are candidates (as before)
+        self.candidates = sorted(set(lo.tolist()))
+        distance = (similarity.max() - similarity) / similarity.max() if rows else similarity
+        node, neighbour = np.concatenate([hi, lo]), np.concatenate([lo, hi])
+        order = np.lexsort((np.concatenate([id, hi]), np.repeat([0, 1], len(id)), node))
+        self.__neighbours, self.__distances, node = neighbour[order], np.concatenate([distance, distance])[order], \
+                                                    node[order]
+        nodes, starts = np.unique(node, return_index=True)
+        self.__nodes, self.__starts, self.__ends = nodes, starts, np.append(starts[1:], len(node))
+        self.__index = dict(zip(nodes.tolist(), zip(starts.tolist(), self.__ends.tolist())))
+        self.__core_distances = {}
+
+    def neighbourhood(self, candidate, epsilon):
+        start, end = self.__index.get(candidate, (0, 0))
+        return self.__neighbours[start:end][self.__distances[start:end] < epsilon].tolist()
+
+    def core_distance(self, minpts):
+        '''
+        For each activity, the distance to the minpts'th nearest neighbour (inf if there are fewer).
+        An activity is a core point (at epsilon) if this is less than epsilon.
+        '''
+        if minpts not in self.__core_distances:
+            segment = np.repeat(np.arange(len(self.__nodes)), self.__ends - self.__starts)
+            ordered = self.__distances[np.lexsort((self.__distances, segment))]
+            core = np.full(len(self.__nodes), np.inf)
+            enough = self.__ends - self.__starts >= minpts
+            core[enough] = ordered[self.__starts[enough] + minpts - 1]
+            self.__core_distances[minpts] = dict(zip(self.__nodes.tolist(), core.tolist()))
+        return self.__core_distances[minpts]
+
+
 class NearbySimilarityDBSCAN(DBSCAN):
 
-    def __init__(self, s, constraint, epsilon, minpts):
+    def __init__(self, graph, epsilon, minpts):
         super().__init__(epsilon, minpts)
-        self.__s = s
-        self.__constraint = constraint
-        self.__max_similarity = self.__s.query(func.max(ActivitySimilarity.similarity)). \
-            filter(ActivitySimilarity.constraint == constraint).scalar()
-        # self._log.info('Max similarity %.2f' % self.__max_similarity)
+        self.__graph = graph
 
     def run(self):
-        candidates = set(x[0] for x in
-                         self.__s.query(distinct(ActivitySimilarity.activity_journal_lo_id)).
-                         filter(ActivitySimilarity.constraint == self.__constraint).all())
-        candidates.union(set(x[0] for x in
-                             self.__s.query(distinct(ActivitySimilarity.activity_journal_lo_id)).
-                             filter(ActivitySimilarity.constraint == self.__constraint).all()))
-        candidates = sorted(candidates)
         # shuffle(candidates)  # skip for repeatability
-        return super().run(candidates)
+        return super().run(self.__graph.candidates)
+
+    def core_neighbourhood(self, candidate, epsilon, minpts):
+        if self.__graph.core_distance(minpts).get(candidate, np.inf) < epsilon:
+            return self.neighbourhood(candidate, epsilon)
 
     def neighbourhood(self, candidate, epsilon):
-        qlo = self.__s.query(ActivitySimilarity.activity_journal_lo_id). \
-            filter(ActivitySimilarity.constraint == self.__constraint,
-                   ActivitySimilarity.activity_journal_hi_id == candidate,
-                   (self.__max_similarity - ActivitySimilarity.similarity) / self.__max_similarity < epsilon)
-        qhi = self.__s.query(ActivitySimilarity.activity_journal_hi_id). \
-            filter(ActivitySimilarity.constraint == self.__constraint,
-                   ActivitySimilarity.activity_journal_lo_id == candidate,
-                   (self.__max_similarity - ActivitySimilarity.similarity) / self.__max_similarity < epsilon)
-        return [x[0] for x in qlo.all()] + [x[0] for x in qhi.all()]
+        return self.__graph.neighbourhood(candidate, epsilon)
 
 
 class NearbyCalculator(UniProcCalculator):
@@ -255,12 +333,17 @@ class NearbyCalculator(UniProcCalculator):
 
     def _run_one(self, s, missed):
         with Timestamp(owner=self.owner_out, constraint=self.constraint).on_success(log, s):
-            d_min, n = expand_max(log, 0, 1, 5, lambda d: len(self.dbscan(s, d)))
-            log.info(f'{n} groups at d={d_min}')
-            self.save(s, self.dbscan(s, d_min))
+            graph, groups = NearbySimilarityGraph(s, self.constraint), {}
+
+            def dbscan(d):
+                # the graph (and core distances) are shared across the search; each result is kept for reuse
+                if d not in groups:
+                    groups[d] = NearbySimilarityDBSCAN(graph, d, 3).run()
+                return groups[d]
 
-    def dbscan(self, s, d):
-        return NearbySimilarityDBSCAN(s, self.constraint, d, 3).run()
+            d_min, n = expand_max(log, 0, 1, 5, lambda d: len(dbscan(d)))
+            log.info(f'{n} groups at d={d_min}')
+            self.save(s, dbscan(d_min))
 
     def save(self, s, groups):
         for i, group in enumerate(groups):
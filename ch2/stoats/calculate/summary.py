@@ -1,18 +1,18 @@
-
 from logging import getLogger
 from random import choice
 from re import split
-
-from sqlalchemy import func, inspect, and_, select
-from sqlalchemy.sql.functions import coalesce
+from sqlite3 import sqlite_version_info
 
 from . import IntervalCalculatorMixin, MultiProcCalculator
 from ..names import MAX, MIN, SUM, CNT, AVG, MSR, ENTRIES
-from ...lib.date import local_date_to_time
+from ...lib.date import local_date_to_time, format_date
+from ...lib.log import log_current_exception
+from ...squeal import Interval
 from ...squeal.tables.statistic import StatisticJournal, StatisticName, StatisticMeasure, StatisticJournalInteger, \
     StatisticJournalFloat, StatisticJournalText, TYPE_TO_JOURNAL_CLASS
 
 log = getLogger(__name__)
+AGGREGATES = (MAX, MIN, SUM, CNT, AVG)  # order of values in rows from _read_data
 
 
 def fuzz(n, q):
@@ -24,99 +24,202 @@ def fuzz(n, q):
 
 class SummaryCalculator(IntervalCalculatorMixin, MultiProcCalculator):
 
-    def __init__(self, *args, owner_in='[unused]', **kargs):
+    # intervals are calculated in batches, with grouped sql:
+    # - a single query gives max, min, sum, count and avg for every statistic name in every interval
+    # - a single insert (for each sort order) adds all measures, ranked with window functions
+    # (previously there were separate queries for each statistic, summary and interval, and measures
+    # were sorted in python and added via the orm - this is still used if sqlite has no window functions).
+    # intervals are only committed with their results; if a batch fails each interval is retried alone.
+
+    def __init__(self, *args, owner_in='[unused]', batch=100, window=None, **kargs):
+        self.batch = batch  # maximum number of intervals calculated together
+        # window functions need sqlite 3.25
+        self.window = sqlite_version_info >= (3, 25) if window is None else window
         super().__init__(*args, owner_in=owner_in, **kargs)
 
-    def _read_data(self, s, interval):
-        # here, data is only statistics names, because calculation also involves loading data
-        start, finish = local_date_to_time(interval.start), local_date_to_time(interval.finish)
-        statistics_with_data_but_no_summary = s.query(StatisticName.id). \
-            join(StatisticJournal). \
-            filter(StatisticJournal.time >= start,
-                   StatisticJournal.time < finish,
-                   StatisticName.summary != None)
-        # avoid duplicates
-        return s.query(StatisticName). \
-            filter(StatisticName.id.in_(statistics_with_data_but_no_summary)).all()
-
-    def _calculate_results(self, s, interval, data, loader):
-        start, finish = local_date_to_time(interval.start), local_date_to_time(interval.finish)
-        measures = []
-        for statistic_name in data:
+    def _run_one(self, s, missing):
+        self._run_all(s, [missing])
+
+    def _run_all(self, s, missing):
+        for i in range(0, len(missing), self.batch):
+            self._run_batch(s, missing[i:i+self.batch])
+
+    def _run_batch(self, s, missing):
+        intervals = self._add_intervals(s, missing)
+        ids = [interval.id for interval in intervals]
+        try:
+            data = self._read_data(s, intervals)
+            if self.load_once and self._prev_loader:
+                loader = self._prev_loader
+            else:
+                loader = self._get_loader(s, add_serial=False, clear_timestamp=False)
+            self._calculate_results(s, intervals, data, loader)
+            if not self.load_once:
+                loader.load()
+            s.commit()
+            self._prev_loader = loader
+        except Exception as e:
+            self._discard_intervals(s, ids)
+            if not self.load_once:
+                self._prev_loader = None
+            if len(missing) > 1:
+                log.warning(f'Error calculating {format_date(missing[0][0])} - {format_date(missing[-1][1])} '
+                            f'({e}); retrying intervals individually')
+                for missed in missing:
+                    self._run_batch(s, [missed])
+            else:
+                log.warning(f'No statistics for {format_date(missing[0][0])} - {format_date(missing[0][1])} '
+                            f'due to error ({e})')
+                log_current_exception()
+
+    def _discard_intervals(self, s, ids):
+        # the loader commits before loading, so intervals may exist; deleting them cascades to results
+        s.rollback()
+        for interval in s.query(Interval).filter(Interval.id.in_(ids)).all():
+            s.delete(interval)
+        s.commit()
+
+    def _add_intervals(self, s, missing):
+        if s.query(Interval). \
+                filter(Interval.schedule == self.schedule,
+                       Interval.owner == self.owner_out,
+                       Interval.start.in_([start for start, finish in missing])).count():
+            raise Exception('Interval already exists')
+        intervals = [Interval(schedule=self.schedule, owner=self.owner_out, start=start, finish=finish)
+                     for start, finish in missing]
+        s.add_all(intervals)
+        s.flush()  # not committed until the results are loaded
+        return sorted(intervals, key=lambda interval: interval.start)
+
+    def _with_intervals(self, intervals):
+        # a common table expression for the interval ids and time ranges (plus parameters)
+        sql = 'intervals (id, start, finish) as (values %s)' % ', '.join(['(?, ?, ?)'] * len(intervals))
+        params = [x for interval in intervals
+                  for x in (interval.id, local_date_to_time(interval.start).timestamp(),
+                            local_date_to_time(interval.finish).timestamp())]
+        return sql, params
+
+    def _from_values(self):
+        # joins for all statistics (with a summary) in all intervals, with a coalesced value
+        return f'''
+  from intervals as i
+  join {StatisticName.__tablename__} as sn
+       on sn.summary is not null
+  join {StatisticJournal.__tablename__} as sj
+       on sj.statistic_name_id = sn.id and sj.time >= i.start and sj.time < i.finish
+  left outer join {StatisticJournalFloat.__tablename__} as sjf on sjf.id = sj.id
+  left outer join {StatisticJournalInteger.__tablename__} as sji on sji.id = sj.id
+  left outer join {StatisticJournalText.__tablename__} as sjt on sjt.id = sj.id''', \
+               'coalesce(sjf.value, sji.value, sjt.value)'
+
+    def _read_data(self, s, intervals):
+        # (interval id, statistic name id, *AGGREGATES) for each statistic with data and a summary
+        with_intervals, params = self._with_intervals(intervals)
+        from_values, value = self._from_values()
+        sql = f'''
+with {with_intervals}
+select i.id, sn.id, max({value}), min({value}), sum({value}), count({value}), avg({value})
+{from_values}
+ group by i.id, sn.id
+ order by i.id, sn.id'''
+        return s.connection().connection.cursor().execute(sql, params).fetchall()
+
+    def _calculate_results(self, s, intervals, data, loader):
+        # read everything from the intervals first, because the loader may commit (expiring them)
+        ranges = dict((interval.id, (local_date_to_time(interval.start), local_date_to_time(interval.finish)))
+                      for interval in intervals)
+        with_intervals = self._with_intervals(intervals)
+        statistic_names = dict((statistic_name.id, statistic_name) for statistic_name in
+                               s.query(StatisticName).
+                               filter(StatisticName.id.in_(set(row[1] for row in data))).all()) if data else {}
+        measured, values = [], []
+        for interval_id, statistic_name_id, *aggregates in data:
+            statistic_name = statistic_names[statistic_name_id]
+            aggregates = dict(zip(AGGREGATES, aggregates))
             summaries = [x.lower() for x in split(r'[\s,]*(\[[^\]]+\])[\s ]*', statistic_name.summary) if x]
             pessimistic = MIN in summaries
             for summary in summaries:
-                value, units = self._calculate_value(s, statistic_name, summary, pessimistic,
-                                                     start, finish, interval, measures)
-                if value is not None:
-                    name = self.fmt_name(statistic_name.name, summary, self.schedule)
-                    # constraint is statistic_name so that we distinguish between stats of the same name
-                    loader.add(name, units, None, statistic_name, interval, value, start,
-                               TYPE_TO_JOURNAL_CLASS[type(value)])
-        # add and commit these here - what else can we do?
-        log.debug(f'Adding {len(measures)} measures')
-        for measure in measures:
-            s.add(measure)
-        s.commit()
-
-    def _calculate_value(self, s, statistic_name, summary, pessimistic, start_time, finish_time, interval, measures):
-
-        sj = inspect(StatisticJournal).local_table
-        sji = inspect(StatisticJournalInteger).local_table
-        sjf = inspect(StatisticJournalFloat).local_table
-        sjt = inspect(StatisticJournalText).local_table
-
-        units = statistic_name.units
-        values = coalesce(sjf.c.value, sji.c.value, sjt.c.value)
-
-        if summary == MAX:
-            result = func.max(values)
-        elif summary == MIN:
-            result = func.min(values)
-        elif summary == SUM:
-            result = func.sum(values)
-        elif summary == CNT:
-            result = func.count(values)
-            units = ENTRIES
-        elif summary == AVG:
-            result = func.avg(values)
-        elif summary == MSR:
-            self._calculate_measures(s, statistic_name, pessimistic, start_time, finish_time, interval, measures)
-            return None, None
+                if summary == MSR:
+                    measured.append((interval_id, statistic_name_id, aggregates[CNT], pessimistic))
+                elif summary in aggregates:
+                    value, units = aggregates[summary], ENTRIES if summary == CNT else statistic_name.units
+                    if value is not None:
+                        name = self.fmt_name(statistic_name.name, summary, self.schedule)
+                        # constraint is statistic_name so that we distinguish between stats of the same name
+                        values.append((name, units, None, statistic_name, interval_id, value,
+                                       ranges[interval_id][0], TYPE_TO_JOURNAL_CLASS[type(value)]))
+                else:
+                    raise Exception('Bad summary: %s' % summary)
+        if self.window:
+            self._calculate_measures(s, with_intervals, measured)
         else:
-            raise Exception('Bad summary: %s' % summary)
-
-        stmt = select([result]). \
-            select_from(sj.outerjoin(sjf).outerjoin(sji).outerjoin(sjt)). \
-            where(and_(sj.c.statistic_name_id == statistic_name.id,
-                       sj.c.time >= start_time,
-                       sj.c.time < finish_time))
-
-        return next(s.connection().execute(stmt))[0], units
-
-    def _calculate_measures(self, s, statistic_name, pessimistic, start_time, finish_time, interval, measures):
-
-        data = sorted([x for x in
-                       s.query(StatisticJournal).
-                       filter(StatisticJournal.statistic_name == statistic_name,
-                              StatisticJournal.time >= start_time,
-                              StatisticJournal.time < finish_time).all()
-                       if x is not None and x.value is not None],
-                       key=lambda x: x.value, reverse=not pessimistic)
-
-        n, local_measures = len(data), []
-        for rank, journal in enumerate(data, start=1):
-            if n > 1:
-                percentile = (n - rank) / (n - 1) * 100
-            else:
-                percentile = 100
-            measure = StatisticMeasure(statistic_journal=journal, source=interval, rank=rank, percentile=percentile)
-            local_measures.append(measure)
-            measures.append(measure)
-        if n > 8:  # avoid overlap in fuzzing (and also, plot individual points in this case)
-            for q in range(5):
-                local_measures[fuzz(n, q)].quartile = q
-        log.debug('Ranked %s' % statistic_name)
+            self._calculate_measures_python(s, ranges, measured)
+        # add to the loader only when everything else has worked (it may be shared if load_once)
+        for value in values:
+            loader.add(*value)
+
+    def _calculate_measures(self, s, with_intervals, measured):
+        # measured contains (interval id, statistic name id, number of values, pessimistic)
+        quartiles = [(interval_id, statistic_name_id, fuzz(n, q) + 1, q)
+                     for interval_id, statistic_name_id, n, _ in measured
+                     if n > 8  # avoid overlap in fuzzing (and also, plot individual points in this case)
+                     for q in range(5)]
+        with_intervals, params = with_intervals
+        if quartiles:
+            # all integers that we have generated, so safe to include directly
+            with_quartiles = ',\nquartiles (source_id, statistic_name_id, rank, quartile) as (values %s)' % \
+                             ', '.join('(%d, %d, %d, %d)' % quartile for quartile in quartiles)
+            quartile = 'q.quartile'
+            join_quartiles = '''
+  left outer join quartiles as q
+       on q.source_id = r.source_id and q.statistic_name_id = r.statistic_name_id and q.rank = r.rank'''
+        else:
+            with_quartiles, quartile, join_quartiles = '', 'null', ''
+        from_values, value = self._from_values()
+        cursor, n = s.connection().connection.cursor(), 0
+        for pessimistic, order in ((True, 'asc'), (False, 'desc')):
+            ids = sorted(set(statistic_name_id for _, statistic_name_id, _, p in measured if p == pessimistic))
+            if ids:
+                # ties are ordered by id, as in a stable sort
+                sql = f'''
+with {with_intervals}{with_quartiles}
+insert into {StatisticMeasure.__tablename__} (statistic_journal_id, source_id, rank, percentile, quartile)
+select r.id, r.source_id, r.rank,
+       case when r.n > 1 then (r.n - r.rank) * 1.0 / (r.n - 1) * 100 else 100 end, {quartile}
+  from (select sj.id as id, i.id as source_id, sn.id as statistic_name_id,
+               row_number() over (partition by i.id, sn.id order by {value} {order}, sj.id) as rank,
+               count(*) over (partition by i.id, sn.id) as n
+        {from_values}
+         where sn.id in ({", ".join(map(str, ids))}) and {value} is not null) as r{join_quartiles}'''
+                n += cursor.execute(sql, params).rowcount
+        log.debug(f'Added {n} measures')
+
+    def _calculate_measures_python(self, s, ranges, measured):
+        # without window functions, measures are sorted in python for each statistic in each interval
+        measures = []
+        for interval_id, statistic_name_id, _, pessimistic in measured:
+            start, finish = ranges[interval_id]
+            # ties are ordered by id, as in a stable sort
+            data = sorted([journal for journal in
+                           s.query(StatisticJournal).
+                           filter(StatisticJournal.statistic_name_id == statistic_name_id,
+                                  StatisticJournal.time >= start,
+                                  StatisticJournal.time < finish).
+                           order_by(StatisticJournal.id).all()
+                           if journal.value is not None],
+                          key=lambda journal: journal.value, reverse=not pessimistic)
+            n, local_measures = len(data), []
+            for rank, journal in enumerate(data, start=1):
+                percentile = (n - rank) / (n - 1) * 100 if n > 1 else 100
+                local_measures.append(StatisticMeasure(statistic_journal_id=journal.id, source_id=interval_id,
+                                                       rank=rank, percentile=percentile))
+            if n > 8:  # avoid overlap in fuzzing (and also, plot individual points in this case)
+                for q in range(5):
+                    local_measures[fuzz(n, q)].quartile = q
+            measures.extend(local_measures)
+        log.debug(f'Adding {len(measures)} measures')
+        s.add_all(measures)
+        s.flush()
 
     @classmethod
     def parse_name(cls, name):
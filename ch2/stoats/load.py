@@ -1,38 +1,49 @@
 
 from collections import defaultdict
+from itertools import count
 from logging import getLogger
-from time import sleep
 
-from sqlalchemy.exc import IntegrityError
+import numpy as np
 
-from ch2.squeal.tables.statistic import TYPE_TO_JOURNAL_CLASS, STATISTIC_JOURNAL_CLASSES, STATISTIC_JOURNAL_TYPES
+from ch2.squeal.tables.statistic import STATISTIC_JOURNAL_CLASSES, STATISTIC_JOURNAL_TYPES
 from .waypoint import make_waypoint
-from ..commands.args import UNLOCK
+from ..lib.date import to_time
 from ..squeal import StatisticJournal, StatisticName, Dummy, Interval
 from ..squeal.types import short_cls
 
 log = getLogger(__name__)
 
 
+class Staged:
+    '''
+    A value waiting to be loaded.  Has the same attributes as the StatisticJournal that will be created,
+    but is much cheaper to construct.
+    '''
+
+    __slots__ = ('statistic_name_id', 'source_id', 'value', 'time', 'serial')
+
+    def __init__(self, statistic_name_id, source_id, value, time, serial):
+        self.statistic_name_id = statistic_name_id
+        self.source_id = source_id
+        self.value = value
+        self.time = time
+        self.serial = serial
+
+
 class StatisticJournalLoader:
 
     # we want to load multiple tables (because we're using inheritance) quickly and safely.
-    # to do this, we need to generate IDs ourselves (to avoid reading the ID for the base class)
-    # on sqlite we can do this by:
-    # - using a single transaction
-    # - starting to write (a dummy StatisticJournal, which also gets us the last ID)
-    # - calculating IDs from the dummy ID
-    # - writing the data (still in the same transaction)
-    # - removing the dummy
-    # - committing
-    # afaict that would work on any SQL database with a reasonable level of isolation.
-    # what is special to sqlite is that the final commit will not fail, because there is only ever one
-    # process writing (this is true even when using multiple processes)
-
-    # well the above worked for a while. then started throwing exceptions, so i needed to add
-    # the while loop below.
-
-    def __init__(self, s, owner, add_serial=True, clear_timestamp=True, abort_after=100):
+    # to do this we write directly to the database (bypassing the ORM) in a single transaction:
+    # - insert all the base (StatisticJournal) rows, letting the database allocate ids
+    # - read the final id and so infer the ids of the rows we added
+    # - insert the rows for the subclass tables, using those ids
+    # - commit
+    # this works on sqlite because the first insert takes the write lock, which is held until commit,
+    # and rowids are allocated as max(rowid)+1, so the ids we added are contiguous (even when other
+    # processes are waiting to write).
+    # (previously we wrote a dummy entry to get the initial id and then retried on failure).
+
+    def __init__(self, s, owner, add_serial=True, clear_timestamp=True):
         self._s = s
         self._owner = owner
         self.__statistic_name_cache = dict()
@@ -44,7 +55,6 @@ class StatisticJournalLoader:
         self.__last_time = None
         self.__serial = 0 if add_serial else None
         self.__clear_timestamp = clear_timestamp
-        self.__abort_after = abort_after
 
     @property
     def start(self):
@@ -59,53 +69,35 @@ class StatisticJournalLoader:
 
     def load(self):
         self._s.commit()
-        dummy = self._preload()
         try:
-            self._load_ids(dummy)
+            self._preload()
+            self._load_rows()
         except Exception:
             self._s.rollback()
-            # dummy may have been deleted in the rollback - it depends if there were any intermediate commits
-            # (which is a whole other problem), so to be sure...
-            self.unlock(self._s)
             raise
         self._postload()
 
     def _preload(self):
-        dummy_source, dummy_name = Dummy.singletons(self._s)
-        dummy, count = None, 0
-        while not dummy:
-            try:
-                log.debug(f'Trying to acquire database ({count})')
-                dummy = StatisticJournal(source=dummy_source, statistic_name=dummy_name, time=0.0)
-                self._s.add(dummy)
-                self._s.flush()
-                log.debug('Acquired database')
-            except IntegrityError:
-                log.debug('Failed to acquire database')
-                self._s.rollback()
-                dummy, count = None, count+1
-                if count > self.__abort_after:
-                    raise Exception(f'Could not acquire database after {count} attempts '
-                                    f'(you may need to use `ch2 {UNLOCK}` once all workers have stopped)')
-                sleep(0.1)
-        log.debug(f'Dummy ID {dummy.id}')
-        return dummy
-
-    def _load_ids(self, dummy):
-        rowid, count = dummy.id + 1, 0
-        for type in self.__staging:
-            log.debug('Loading %d values for type %s' % (len(self.__staging[type]), short_cls(type)))
-            for sjournal in self.__staging[type]:
-                sjournal.id = rowid
-                rowid += 1
-            self._s.bulk_save_objects(self.__staging[type])
-            count += len(self.__staging[type])
-        self._s.commit()
-        log.info(f'Loaded {count} statistics')
-        log.debug('Removing Dummy')
-        self._s.delete(dummy)
+        pass
+
+    def _load_rows(self):
+        n = sum(len(staged) for staged in self.__staging.values())
+        if n:
+            cursor = self._s.connection().connection.cursor()
+            base = StatisticJournal.__table__.name
+            cursor.executemany(f'insert into {base} (type, statistic_name_id, source_id, time, serial) '
+                               f'values (?, ?, ?, ?, ?)',
+                               ((int(type.__mapper__.polymorphic_identity), staged.statistic_name_id,
+                                 staged.source_id, to_time(staged.time).timestamp(), staged.serial)
+                                for type in self.__staging for staged in self.__staging[type]))
+            rowid = cursor.execute(f'select max(id) from {base}').fetchone()[0] - n + 1
+            for type in self.__staging:
+                log.debug('Loading %d values for type %s' % (len(self.__staging[type]), short_cls(type)))
+                cursor.executemany(f'insert into {type.__tablename__} (id, value) values (?, ?)',
+                                   zip(count(rowid), (staged.value for staged in self.__staging[type])))
+                rowid += len(self.__staging[type])
         self._s.commit()
-        log.debug('Dummy removed')
+        log.info(f'Loaded {n} statistics')
 
     def _postload(self):
         # manually clean out intervals because we're doing a fast load
@@ -115,6 +107,7 @@ class StatisticJournalLoader:
 
     @classmethod
     def unlock(cls, s):
+        # remove the dummy entry that was used for locking by earlier versions
         dummy_source, dummy_name = Dummy.singletons(s)
         s.query(StatisticJournal). \
             filter(StatisticJournal.source == dummy_source,
@@ -149,8 +142,7 @@ class StatisticJournalLoader:
         journal_class = STATISTIC_JOURNAL_CLASSES[statistic_name.statistic_journal_type]
         if cls != journal_class:
             raise Exception(f'Inconsistent class for {name}: {cls}/{journal_class}')
-        instance = journal_class(statistic_name_id=statistic_name.id, source_id=source, value=value,
-                                 time=time, serial=self.__serial)
+        instance = Staged(statistic_name.id, source, value, time, self.__serial)
         if key in self.__latest:
             prev = self.__latest[key]
             if instance.time > prev.time:
@@ -167,6 +159,68 @@ class StatisticJournalLoader:
             self.__latest[key] = instance
             self.__staging[journal_class].append(instance)
 
+    def add_columns(self, constraint, source, times, columns):
+        '''
+        Add many values at once.  This gives the same result as calling add() for each time and then for
+        each column (in order), but is much faster.
+
+        `times` must be strictly increasing.  `columns` is a sequence of (name, units, summary, cls, values,
+        present) where values (a sequence) are aligned with times and present is a boolean array that is
+        false where there is no value.
+        '''
+        if not len(times) or not columns:
+            return
+        if self.__last_time is not None or \
+                any((name, constraint) in self.__latest for name, *_ in columns):
+            # fall back to the general case if we might need to check ordering or duplicates
+            for i, time in enumerate(times):
+                for name, units, summary, cls, values, present in columns:
+                    if present[i]:
+                        self.add(name, units, summary, constraint, source, values[i], time, cls)
+            return
+
+        try:
+            source = source.id
+        except AttributeError:
+            pass  # literal id
+        used = np.logical_or.reduce([present for *_, present in columns])
+        if not used.any():
+            return
+        if self.__add_serial:
+            serials = (np.cumsum(used) - 1 + self.__serial).tolist()
+            self.__serial = serials[-1]
+            self.__last_time = times[np.flatnonzero(used)[-1]]
+        else:
+            serials = [None] * len(times)
+        first, last = times[np.flatnonzero(used)[0]], times[np.flatnonzero(used)[-1]]
+        self.__start = min(self.__start, first) if self.__start else first
+        self.__finish = max(self.__finish, last) if self.__finish else last
+
+        staging, keys, n_columns = [None] * len(columns), [], len(columns)
+        # create any missing names in the same order as add() (by first appearance)
+        for first, index in sorted((np.flatnonzero(present)[0], index)
+                                   for index, (*_, present) in enumerate(columns) if np.any(present)):
+            name, units, summary, cls, values, present = columns[index]
+            key = (name, constraint)
+            if key not in self.__statistic_name_cache:
+                self.__statistic_name_cache[key] = \
+                    StatisticName.add_if_missing(log, self._s, name, STATISTIC_JOURNAL_TYPES[cls],
+                                                 units, summary, self._owner, constraint)
+            statistic_name = self.__statistic_name_cache[key]
+            journal_class = STATISTIC_JOURNAL_CLASSES[statistic_name.statistic_journal_type]
+            if cls != journal_class:
+                raise Exception(f'Inconsistent class for {name}: {cls}/{journal_class}')
+            staging[index] = (key, statistic_name.id, values, journal_class)
+            keys.append(np.flatnonzero(present) * n_columns + index)
+
+        # stage in the same order as add() (by time, then column)
+        positions = np.sort(np.concatenate(keys))
+        for row, index in zip((positions // n_columns).tolist(), (positions % n_columns).tolist()):
+            key, statistic_name_id, values, journal_class = staging[index]
+            instance = Staged(statistic_name_id, source, values[row], times[row], serials[row])
+            self.__staging[journal_class].append(instance)
+            self.__latest[key] = instance
+
     def _resolve_duplicate(self, name, instance, prev):
         raise Exception(f'Duplicate time ({prev.time}) for {name} ({instance.value}/{prev.value})')
 
@@ -1,6 +1,8 @@
 
 from abc import abstractmethod
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from logging import getLogger
+from multiprocessing import get_context, get_all_start_methods
 from time import time
 
 from psutil import cpu_count
@@ -17,6 +19,10 @@ CPU_FRACTION = 0.9
 MAX_REPEAT = 3
 NONE = object()
 
+# how workers are run
+SUBPROCESS = 'subprocess'  # a separate ch2 command per batch, coordinated via the database
+POOL = 'pool'  # a pool of forked processes that receive batches directly
+
 
 def run_pipeline(db, type, like=None, id=None, **extra_kargs):
     with db.session_context() as s:
@@ -47,7 +53,8 @@ class BasePipeline:
 class MultiProcPipeline(BasePipeline):
 
     def __init__(self, db, *args, owner_out=None, force=False,
-                 overhead=1, cost_calc=20, cost_write=1, n_cpu=None, worker=None, id=None, **kargs):
+                 overhead=1, cost_calc=20, cost_write=1, n_cpu=None, worker=None, id=None, engine=SUBPROCESS,
+                 **kargs):
         self._db = db
         self.owner_out = owner_out or self  # the future owner of any calculated statistics
         self.force = force  # force re-processing
@@ -57,6 +64,7 @@ class MultiProcPipeline(BasePipeline):
         self.n_cpu = max(1, int(cpu_count() * CPU_FRACTION)) if n_cpu is None else n_cpu  # number of cpus available
         self.worker = worker  # if True, then we're in a sub-process
         self.id = id  # the id for the pipeline entry in the database (passed to sub-processes)
+        self.engine = engine  # how workers are run (SUBPROCESS or POOL)
         super().__init__(*args, **kargs)
 
     def run(self):
@@ -80,7 +88,11 @@ class MultiProcPipeline(BasePipeline):
                 n_total, n_parallel = self.__cost_benefit(missing, self.n_cpu)
                 if n_parallel < 2 or len(missing) == 1:
                     self._run_all(s, missing)
+                elif self.engine == POOL and 'fork' in get_all_start_methods():
+                    self.__pool(s, missing, n_total, n_parallel)
                 else:
+                    if self.engine != SUBPROCESS:
+                        log.warning(f'Cannot use engine {self.engine}; using {SUBPROCESS}')
                     self.__spawn(s, missing, n_total, n_parallel)
             self._shutdown(s)
 
@@ -143,21 +155,45 @@ class MultiProcPipeline(BasePipeline):
         log.info(f'Threads: {n_total}/{n_parallel}')
         return n_total, n_parallel
 
-    def __spawn(self, s, missing, n_total, n_parallel):
+    @staticmethod
+    def __batches(missing, n_total):
 
         # unfortunately we have to do things with contiguous dates, which may introduce systematic
         # errors in our timing estimates
 
         n_missing = len(missing)
-        workers = Workers(s, n_parallel, self.owner_out, self._base_command())
         start, finish = None, -1
         for i in range(n_total):
             start = finish + 1
             finish = int(0.5 + (i+1) * (n_missing-1) / n_total)
             if start > finish: raise Exception('Bad chunking logic')
+            yield start, finish
+
+    def __spawn(self, s, missing, n_total, n_parallel):
+        workers = Workers(s, n_parallel, self.owner_out, self._base_command())
+        for start, finish in self.__batches(missing, n_total):
             workers.run(self._args(missing, start, finish))
         workers.wait()
 
+    def __pool(self, s, missing, n_total, n_parallel):
+        # the workers are forked from this process, so are already configured, with everything imported.
+        # each batch is run as a worker sub-process would run it, but without re-calculating missing.
+        s.commit()  # workers use their own connections
+        with ProcessPoolExecutor(max_workers=n_parallel, mp_context=get_context('fork'),
+                                 initializer=_pool_initializer, initargs=(self,)) as pool:
+            futures = []
+            for start, finish in self.__batches(missing, n_total):
+                log.info(f'Queueing batch for {missing[start]} - {missing[finish]}')
+                futures.append(pool.submit(_pool_run, missing[start:finish+1]))
+            try:
+                for future in as_completed(futures):
+                    log.debug(f'Batch of {future.result()} finished')
+            except Exception:
+                for future in futures:
+                    future.cancel()  # (cancel_futures in shutdown needs python 3.9)
+                pool.shutdown(wait=True)
+                raise
+
     # as a general rule, _missing and _args should be implemented together
     @abstractmethod
     def _args(self, missing, start, finish):
@@ -168,6 +204,26 @@ class MultiProcPipeline(BasePipeline):
         raise NotImplementedError()
 
 
+_POOL_PIPELINE = None
+
+
+def _pool_initializer(pipeline):
+    # called once in each pool process
+    global _POOL_PIPELINE
+    pipeline._db.engine.dispose()  # never share connections with the parent
+    pipeline.worker = True
+    _POOL_PIPELINE = pipeline
+
+
+def _pool_run(missing):
+    pipeline = _POOL_PIPELINE
+    with pipeline._db.session_context() as s:
+        pipeline._startup(s)
+        pipeline._run_all(s, missing)
+        pipeline._shutdown(s)
+    return len(missing)
+
+
 class UniProcPipeline(MultiProcPipeline):
 
     def __init__(self, *args, overhead=None, cost_calc=None, cost_write=None, n_cpu=None, worker=None, id=None,
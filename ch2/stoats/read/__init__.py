@@ -3,10 +3,12 @@ from abc import abstractmethod
 from logging import getLogger
 
 from ..pipeline import MultiProcPipeline, UniProcPipeline, LoaderMixin
+from ...commands.args import MEMORY
+from ...fit.cache import FitCache, default_cache_dir, DEFAULT_MAX_MB
 from ...fit.format.read import filtered_records
 from ...fit.profile.profile import read_fit
 from ...lib.date import to_time
-from ...lib.io import filter_modified_files, update_scan
+from ...lib.io import filter_modified_files, update_scan, get_scan, is_scanned
 from ...lib.log import log_current_exception
 from ...squeal import Timestamp
 
@@ -23,8 +25,9 @@ class AbortImportButMarkScanned(AbortImport):
 
 class FitReaderMixin(LoaderMixin):
 
-    def __init__(self, *args, paths=None, **kargs):
+    def __init__(self, *args, paths=None, fit_cache_mb=DEFAULT_MAX_MB, **kargs):
         self.paths = paths
+        self.fit_cache_mb = fit_cache_mb  # 0 disables the cache of decoded files
         super().__init__(*args, **kargs)
 
     def _delete(self, s):
@@ -57,11 +60,22 @@ class FitReaderMixin(LoaderMixin):
             self._load_data(s, loader, data)
             loader.load()
 
-    def _read_fit_file(self, path, *options):
-        types, messages, records = filtered_records(read_fit(log, path))
-        return [record.as_dict(*options)
-                for _, _, record in sorted(records,
-                                           key=lambda r: r[2].timestamp if r[2].timestamp else to_time(0.0))]
+    def _read_fit_file(self, s, path, *options):
+        scan, cache = get_scan(s, path, self.owner_out), self.__fit_cache()
+        records = cache.get(scan.md5_hash) if cache and scan else None
+        if records is None:
+            # no need to check the CRC of files that have been read before (the md5 hash is unchanged)
+            types, messages, records = filtered_records(read_fit(log, path),
+                                                        trust_crc=is_scanned(s, path, self.owner_out))
+            records = sorted((record for _, _, record in records),
+                             key=lambda r: r.timestamp if r.timestamp else to_time(0.0))
+            if cache and scan:
+                cache.put(scan.md5_hash, records)
+        return [record.as_dict(*options) for record in records]
+
+    def __fit_cache(self):
+        if self.fit_cache_mb and self._db.path != MEMORY:
+            return FitCache(default_cache_dir(self._db.path), max_mb=self.fit_cache_mb)
 
     def _first(self, path, records, *names):
         return self.__assert_contained(path, records, names, 0)
@@ -1,8 +1,10 @@
 
 from logging import getLogger
+from math import log as ln, tan, pi
 from os.path import splitext, basename
 
-from pygeotile.point import Point
+import numpy as np
+from pygeotile.meta import ORIGIN_SHIFT
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql.functions import count
 
@@ -13,11 +15,13 @@ from ...fit.format.records import fix_degrees, merge_duplicates, no_bad_values
 from ...lib.date import to_time
 from ...sortem.bilinear import bilinear_elevation_from_constant
 from ...squeal.database import Timestamp, StatisticJournalText
-from ...squeal.tables.activity import ActivityGroup, ActivityJournal, ActivityTimespan
-from ...squeal.tables.statistic import StatisticJournalFloat, STATISTIC_JOURNAL_CLASSES
+from ...squeal.tables.activity import ActivityGroup, ActivityJournal, ActivityTimespan, ActivityBlob
+from ...squeal.tables.statistic import StatisticJournalFloat, StatisticJournalInteger, StatisticName, \
+    STATISTIC_JOURNAL_CLASSES, STATISTIC_JOURNAL_TYPES
 from ...squeal.utils import add
 
 log = getLogger(__name__)
+PACKED_TYPES = {StatisticJournalFloat: np.float64, StatisticJournalInteger: np.int64}
 
 
 # duplicate data in
@@ -26,8 +30,9 @@ log = getLogger(__name__)
 
 class ActivityReader(MultiProcFitReader):
 
-    def __init__(self, *args, constants=None, sport_to_activity=None, record_to_db=None, **kargs):
+    def __init__(self, *args, constants=None, sport_to_activity=None, record_to_db=None, pack=False, **kargs):
         self.constants = constants
+        self.pack = pack  # also store packed copies of numerical data (see ActivityBlob)
         self.sport_to_activity = self._assert('sport_to_activity', sport_to_activity)
         self.record_to_db = [(field, name, units, STATISTIC_JOURNAL_CLASSES[type])
                              for field, (name, units, type)
@@ -49,7 +54,7 @@ class ActivityReader(MultiProcFitReader):
 
     def _read_data(self, s, path):
         log.info('Reading activity data from %s' % path)
-        records = self._read_fit_file(path, merge_duplicates, fix_degrees, no_bad_values)
+        records = self._read_fit_file(s, path, merge_duplicates, fix_degrees, no_bad_values)
         ajournal, activity_group, first_timestamp = self._create_activity(s, path, records)
         self._load_constants(s, ajournal)
         return ajournal.id, (ajournal, activity_group, first_timestamp, path, records)
@@ -128,7 +133,7 @@ class ActivityReader(MultiProcFitReader):
     def _load_data(self, s, loader, data):
 
         ajournal, activity_group, first_timestamp, path, records = data
-        timespan, warned, logged, last_timestamp = None, 0, 0, to_time(0.0)
+        timespan, last_timestamp = None, to_time(0.0)
         log.debug(f'Loading {self.record_to_db}')
 
         def is_event(record, *types):
@@ -148,6 +153,8 @@ class ActivityReader(MultiProcFitReader):
             timespan = add(s, ActivityTimespan(activity_journal=ajournal,
                                                start=first_timestamp))
 
+        rows = []
+
         for record in records:
 
             if have_timespan and is_event(record, 'start'):
@@ -160,32 +167,7 @@ class ActivityReader(MultiProcFitReader):
 
             elif record.name == 'record':
                 if record.value.timestamp > last_timestamp:
-                    lat, lon, timestamp = None, None, record.value.timestamp
-                    # customizable loader
-                    for field, name, units, type in self.record_to_db:
-                        value = record.data.get(field, None)
-                        if logged < 3:
-                            log.debug(f'{name} = {value}')
-                        if value is not None:
-                            value = value[0][0]
-                            loader.add(name, units, None, activity_group, ajournal, value, timestamp, type)
-                            if name == LATITUDE:
-                                lat = value
-                            elif name == LONGITUDE:
-                                lon = value
-                    logged += 1
-                    # values derived from lat/lon
-                    if lat is not None and lon is not None:
-                        x, y = Point.from_latitude_longitude(lat, lon).meters
-                        loader.add(SPHERICAL_MERCATOR_X, M, None, activity_group, ajournal, x, timestamp,
-                                   StatisticJournalFloat)
-                        loader.add(SPHERICAL_MERCATOR_Y, M, None, activity_group, ajournal, y, timestamp,
-                                   StatisticJournalFloat)
-                        if self.add_elevation:
-                            elevation = self.__oracle.elevation(lat, lon)
-                            if elevation:
-                                loader.add(RAW_ELEVATION, M, None, activity_group, ajournal, elevation, timestamp,
-                                           StatisticJournalFloat)
+                    rows.append(record)
                 else:
                     log.warning('Ignoring duplicate record data for %s at %s - some data may be missing' %
                                 (path, record.value.timestamp))
@@ -204,3 +186,72 @@ class ActivityReader(MultiProcFitReader):
         if timespan:
             log.warning('Cleaning up dangling timespan')
             timespan.finish = final_timestamp
+
+        self.__load_rows(s, loader, activity_group, ajournal, rows)
+
+    def __load_rows(self, s, loader, activity_group, ajournal, rows):
+        # this is columnar - we build an array for each field and derived value and then stage them
+        # all together (much faster than adding values one at a time).
+        n = len(rows)
+        times = [record.value.timestamp for record in rows]
+        datas = [record.data for record in rows]
+        columns = []
+        lat, lon = np.full(n, np.nan), np.full(n, np.nan)
+        # customizable loader
+        for field, name, units, type in self.record_to_db:
+            values = [data.get(field, None) for data in datas]
+            present = np.array([value is not None for value in values], dtype=bool)
+            values = [None if value is None else value[0][0] for value in values]
+            columns.append((name, units, None, type, values, present))
+            if name in (LATITUDE, LONGITUDE):
+                column = lat if name == LATITUDE else lon
+                column[present] = [value for value in values if value is not None]
+        for data in datas[:3]:
+            for field, name, units, type in self.record_to_db:
+                log.debug(f'{name} = {data.get(field, None)}')
+        # values derived from lat/lon
+        present = ~(np.isnan(lat) | np.isnan(lon))
+        x, y = mercator(lat[present], lon[present])
+        columns.append((SPHERICAL_MERCATOR_X, M, None, StatisticJournalFloat, self.__expand(x, present), present))
+        columns.append((SPHERICAL_MERCATOR_Y, M, None, StatisticJournalFloat, self.__expand(y, present), present))
+        if self.add_elevation:
+            elevations = self.__oracle.elevations(lat[present], lon[present])
+            if elevations is not None:
+                elevation_present = present.copy()
+                elevation_present[present] = ~np.isnan(elevations) & (elevations != 0)
+                columns.append((RAW_ELEVATION, M, None, StatisticJournalFloat,
+                                self.__expand(list(elevations), present), elevation_present))
+        loader.add_columns(activity_group, ajournal, times, columns)
+        if self.pack:
+            self.__pack(s, activity_group, ajournal, times, columns)
+
+    def __pack(self, s, activity_group, ajournal, times, columns):
+        times = np.array([to_time(time).timestamp() for time in times])
+        # names first, because add_if_missing commits (and may rollback)
+        names = [StatisticName.add_if_missing(log, s, name, STATISTIC_JOURNAL_TYPES[type], units, summary,
+                                              self.owner_out, activity_group)
+                 for name, units, summary, type, values, present in columns]
+        for statistic_name, (name, units, summary, type, values, present) in zip(names, columns):
+            if np.any(present) and type in PACKED_TYPES:
+                values = [values[i] for i in np.flatnonzero(present).tolist()]  # aligned with times
+                ActivityBlob.pack(s, ajournal, statistic_name, times[present], values, PACKED_TYPES[type])
+
+    @staticmethod
+    def __expand(values, present):
+        # a list of values aligned with present (None where not present)
+        expanded = [None] * len(present)
+        for i, value in zip(np.flatnonzero(present).tolist(), values):
+            expanded[i] = value
+        return expanded
+
+
+def mercator(lats, lons):
+    '''
+    Spherical mercator (x, y) in m for arrays of lat, lon (the same values as pygeotile).
+    '''
+    if len(lats) and not (np.all((-90 <= lats) & (lats <= 90)) and np.all((-180 <= lons) & (lons <= 180))):
+        raise Exception('Latitude / longitude out of range')
+    xs = (lons * ORIGIN_SHIFT / 180.0).tolist()
+    # math (not numpy) log and tan so that results are identical
+    ys = [ln(tan(angle)) / (pi / 180.0) * ORIGIN_SHIFT / 180.0 for angle in ((90.0 + lats) * pi / 360.0).tolist()]
+    return xs, ys
@@ -58,7 +58,7 @@ def missing_dates(s):
 class MonitorLoader(StatisticJournalLoader):
 
     def _preload(self):
-        dummy = super()._preload()
+        super()._preload()
         try:
             for name in self._s.query(StatisticName). \
                     filter(StatisticName.name == CUMULATIVE_STEPS,
@@ -77,7 +77,6 @@ class MonitorLoader(StatisticJournalLoader):
             log.debug('Failed to clean database')
             self._s.rollback()
             raise
-        return dummy
 
     def _resolve_duplicate(self, name, instance, prev):
         log.warning(f'Using max of duplicate values at {instance.time} for {name} ({instance.value}/{prev.value})')
@@ -129,7 +128,7 @@ class MonitorReader(MultiProcFitReader):
 
     def _read_data(self, s, path):
 
-        records = self._read_fit_file(path, merge_duplicates, fix_degrees, unpack_single_bytes)
+        records = self._read_fit_file(s, path, merge_duplicates, fix_degrees, unpack_single_bytes)
 
         first_timestamp = self._first(path, records, MONITORING_INFO_ATTR).timestamp
         last_timestamp = self._last(path, records, MONITORING_ATTR).timestamp
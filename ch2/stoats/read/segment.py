@@ -247,10 +247,12 @@ class SegmentReader(ActivityReader):
         '''
         Check each waypoint against the r-tree and return all matches.
         '''
-        found = set()
+        found, segments = set(), {}
         for i, waypoint in enumerate(waypoints):
             for start, id in self.__segments[agroup_id][[(waypoint.lon, waypoint.lat)]]:
-                segment = s.query(Segment).filter(Segment.id == id).one()
+                if id not in segments:
+                    segments[id] = s.query(Segment).filter(Segment.id == id).one()
+                segment = segments[id]
                 if segment not in found:
                     log.info('Candidate segment "%s"' % segment.name)
                     found.add(segment)
@@ -261,9 +263,11 @@ class SegmentReader(ActivityReader):
         Read segment endpoints into a global R-tree so we can detect when waypoints pass nearby.
         '''
         segments = Global(tree=lambda: SQRTree(default_border=self.match_bound, default_match=MatchType.OVERLAP))
+        items = []
         for segment in s.query(Segment).filter(Segment.activity_group == agroup).all():
-            segments[[segment.start]] = (True, segment.id)
-            segments[[segment.finish]] = (False, segment.id)
+            items.append(([segment.start], (True, segment.id)))
+            items.append(([segment.finish], (False, segment.id)))
+        segments.load(items)
         if not segments:
             log.warning('No segments defined in database for %s' % agroup)
         return segments
@@ -6,6 +6,8 @@ from logging import getLogger
 from sqlalchemy import select, and_
 from sqlalchemy.sql.functions import coalesce
 
+from ..lib.date import to_time
+from ..squeal.tables.activity import ActivityBlob
 from ..squeal.tables.statistic import StatisticName, StatisticJournal, StatisticJournalInteger, StatisticJournalFloat
 from ..squeal.utils import tables
 
@@ -31,7 +33,8 @@ class WaypointReader:
         t = tables(StatisticName, StatisticJournal, StatisticJournalInteger, StatisticJournalFloat)
 
         id_map = self._id_map(s, ajournal, names, owner=owner)
-        ids = list(id_map.keys())
+        packed = ActivityBlob.read(s, ajournal, list(id_map.keys()))
+        ids = [id for id in id_map.keys() if id not in packed]
 
         Waypoint = make_waypoint(names.values(), extra='timespan' if self._with_timespan else None)
 
@@ -57,7 +60,10 @@ class WaypointReader:
             if finish:
                 stmt = stmt.where(t.StatisticJournal.c.time <= finish)
             # log.debug(stmt)
-            for id, time, value in s.connection().execute(stmt):
+            rows = list(s.connection().execute(stmt)) if ids else []
+            if packed:
+                rows = sorted(rows + self._packed_rows(packed, timespan, start, finish), key=lambda row: row[1])
+            for id, time, value in rows:
                 if waypoint and waypoint.time != time:
                     # log.debug(waypoint)
                     yield waypoint
@@ -69,6 +75,16 @@ class WaypointReader:
                 waypoint = waypoint._replace(**{id_map[id]: value})
         log.debug('Waypoints generated')
 
+    def _packed_rows(self, packed, timespan, start, finish):
+        # (id, time, value) from packed data in the same form as the database rows
+        lo = max(to_time(time).timestamp() for time in (timespan.start, start) if time)
+        hi = min(to_time(time).timestamp() for time in (timespan.finish, finish) if time)
+        rows = []
+        for id, (times, values) in packed.items():
+            keep = (times >= lo) & (times <= hi)
+            rows.extend((id, to_time(time), value) for time, value in zip(times[keep].tolist(), values[keep].tolist()))
+        return rows
+
     def _id_map(self, s, ajournal, names, owner):
         # need to convert from statistic_name_id to attribute name
         return dict((self._id(s, ajournal, key, owner), value) for key, value in names.items())
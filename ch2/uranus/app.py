@@ -0,0 +1,30 @@
+
+from logging import getLogger
+
+from notebook.notebookapp import NotebookApp
+
+log = getLogger(__name__)
+
+
+class JupyterServer(NotebookApp):
+
+    # the name of this class is used (via JUPYTER_SERVER in .server) as the owner of the service process
+
+    def __init__(self, started, **kwargs):
+        self._started = started
+        super().__init__(**kwargs)
+
+    @property
+    def log_level(self):
+        # this silences jupyter's logging
+        # the existing mechanism only lets you set a value of 50, which means that "critical" messages
+        # are still logged, and the decidedly non-critical usage instructions are printed.
+        return 60
+
+    def init_signal(self):
+        log.debug('Skipping signal init')
+
+    def start(self):
+        self._started.set()
+        super().start()
+
@@ -6,35 +6,12 @@ from os import makedirs
 from threading import Thread, Event
 from time import sleep
 
-from notebook.notebookapp import NotebookApp
-from tornado.platform.asyncio import AnyThreadEventLoopPolicy
-
 from ..commands.args import NOTEBOOKS, JUPYTER, SERVICE
 from ..lib.workers import command_root
 from ..squeal import SystemConstant, SystemProcess
 
 log = getLogger(__name__)
-
-
-class JupyterServer(NotebookApp):
-
-    def __init__(self, started, **kwargs):
-        self._started = started
-        super().__init__(**kwargs)
-
-    @property
-    def log_level(self):
-        # this silences jupyter's logging
-        # the existing mechanism only lets you set a value of 50, which means that "critical" messages
-        # are still logged, and the decidedly non-critical usage instructions are printed.
-        return 60
-
-    def init_signal(self):
-        log.debug('Skipping signal init')
-
-    def start(self):
-        self._started.set()
-        super().start()
+JUPYTER_SERVER = 'JupyterServer'  # process owner (see .app, which is imported only when the server is run)
 
 
 class JupyterController:
@@ -47,16 +24,16 @@ class JupyterController:
 
     def start_service(self):
         with self._db.session_context() as s:
-            if SystemProcess.exists_any(s, JupyterServer):
+            if SystemProcess.exists_any(s, JUPYTER_SERVER):
                 log.debug('Jupyter already running')
             else:
                 log.debug('Starting remote Jupyter server')
                 ch2 = command_root()
                 log_name = 'jupyter-service.log'
                 cmd = f'{ch2} -v0 -l {log_name} --{NOTEBOOKS} {self._notebooks} {JUPYTER} {SERVICE}'
-                SystemProcess.run(s, cmd, log_name, JupyterServer)
+                SystemProcess.run(s, cmd, log_name, JUPYTER_SERVER)
                 retries = 0
-                while not SystemProcess.exists_any(s, JupyterServer):
+                while not SystemProcess.exists_any(s, JUPYTER_SERVER):
                     retries += 1
                     if retries > self._max_retries:
                         raise Exception('Jupyter server did not start')
@@ -66,7 +43,7 @@ class JupyterController:
     def stop_service(self):
         log.info('Stopping any running Jupyter server')
         with self._db.session_context() as s:
-            SystemProcess.delete_all(s, JupyterServer)
+            SystemProcess.delete_all(s, JUPYTER_SERVER)
             SystemConstant.delete(s, SystemConstant.JUPYTER_URL)
             SystemConstant.delete(s, SystemConstant.JUPYTER_DIR)
 
@@ -81,6 +58,9 @@ class JupyterController:
             return SystemConstant.get(s, SystemConstant.JUPYTER_DIR)
 
     def run_local(self):
+        from tornado.platform.asyncio import AnyThreadEventLoopPolicy
+        from .app import JupyterServer
+
         self.stop_service()
 
         log.info('Starting a local Jupyter server')
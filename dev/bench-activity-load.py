@@ -0,0 +1,48 @@
+# time ActivityReader staging and loading activity points from the test FIT files.
+# run from the project root (compare before / after changes by checking out different versions):
+#   python dev/bench-activity-load.py [PATH ...]
+
+from logging import getLogger
+from sys import argv
+from tempfile import NamedTemporaryFile
+from time import perf_counter
+
+from ch2.commands.args import bootstrap_file, m, V
+from ch2.config.default import default
+from ch2.squeal import Pipeline, PipelineType
+from ch2.stoats.read.activity import ActivityReader
+
+log = getLogger(__name__)
+PATHS = ('data/test/source/personal/2018-08-27-rec.fit',
+         'data/test/source/personal/2018-03-04-qdp.fit',
+         'data/test/source/personal/2016-07-19-mpu-s-z2.fit',
+         'data/test/source/other/2018-05-30-22-00-44.fit')
+
+
+def main(paths):
+    with NamedTemporaryFile() as f:
+        bootstrap_file(f, m(V), '0', configurator=default)
+        args, db = bootstrap_file(f, m(V), '0')
+        with db.session_context() as s:
+            pipeline = next(Pipeline.all(s, PipelineType.ACTIVITY))  # a subclass of ActivityReader
+            reader = pipeline.cls(db, *pipeline.args, id=pipeline.id, paths=paths, force=True,
+                                  fit_cache_mb=0, **pipeline.kargs)
+            reader._startup(s)
+            points, staged, loaded = 0, 0, 0
+            for path in paths:
+                key, data = reader._read_data(s, path)
+                s.commit()
+                points += sum(1 for record in data[-1] if record.name == 'record')
+                start = perf_counter()
+                loader = reader._get_loader(s)
+                ActivityReader._load_data(reader, s, loader, data)  # exclude subclass work (segments)
+                staged += perf_counter() - start
+                start = perf_counter()
+                loader.load()
+                loaded += perf_counter() - start
+    print(f'{points} points; staged in {staged:.2f}s ({1e4 * staged / points:.3f}s / 10k points), '
+          f'loaded in {loaded:.2f}s ({1e4 * loaded / points:.3f}s / 10k points)')
+
+
+if __name__ == '__main__':
+    main(argv[1:] if len(argv) > 1 else PATHS)
@@ -0,0 +1,84 @@
+# compare the (mutable) r-tree, bulk loaded with STR, against the flat (read-only, numpy array) tree:
+# memory per million points (traced allocations for the tree alone) and queries per second, one at a
+# time and in a single batch.  the points are random walks (like GPS tracks) within a few km and
+# results must be identical.
+# run from the project root:
+#   python dev/bench-arty-flat.py [N_POINTS ...]
+
+from random import seed, gauss, uniform
+from sys import argv
+from time import perf_counter
+from tracemalloc import start, stop, take_snapshot
+
+from ch2.arty import MatchType, PackType
+from ch2.arty.flat import SFRTree
+from ch2.arty.spherical import SQRTree
+
+N_QUERIES = 10000
+BORDER = 3
+
+
+def tracks(n, length=5000):
+    seed(1)
+    points = []
+    while len(points) < n:
+        lon, lat = uniform(-0.05, 0.05), uniform(-0.05, 0.05)
+        for i in range(min(length, n - len(points))):
+            lon, lat = lon + gauss(0, 0.00005), lat + gauss(0, 0.00005)
+            points.append([(lon, lat)])
+    return points
+
+
+def mutable(items):
+    tree = SQRTree(default_match=MatchType.OVERLAP, default_border=BORDER)
+    tree.load(items, pack=PackType.STR)
+    return tree
+
+
+def flat(items):
+    return SFRTree(items, default_match=MatchType.OVERLAP, default_border=BORDER)
+
+
+def build(factory, items):
+    start()
+    before = take_snapshot()
+    t = perf_counter()
+    tree = factory(items)
+    built = perf_counter() - t
+    memory = sum(diff.size_diff for diff in take_snapshot().compare_to(before, 'filename'))
+    stop()
+    return tree, built, memory
+
+
+def single(tree, queries):
+    t = perf_counter()
+    results = [sorted(tree.get(query)) for query in queries]
+    return len(queries) / (perf_counter() - t), results
+
+
+def batch(tree, queries):
+    t = perf_counter()
+    results = [sorted(values) for values in tree.get_batch(queries)]
+    return len(queries) / (perf_counter() - t), results
+
+
+def main(sizes):
+    print('%10s %10s %10s %10s %10s %10s' % ('points', 'tree', 'build', 'MB/Mpt', 'q/s', 'batch q/s'))
+    for n in sizes:
+        points = tracks(n)
+        items = [(point, i) for i, point in enumerate(points)]
+        queries = points[::max(1, n // N_QUERIES)]
+        tree, built, memory = build(mutable, items)
+        qps, expected = single(tree, queries)
+        print('%10d %10s %10.2f %10.1f %10.0f %10s' % (n, 'mutable', built, memory / n, qps, '-'))
+        del tree
+        tree, built, memory = build(flat, items)
+        qps, results = single(tree, queries)
+        batch_qps, batch_results = batch(tree, queries)
+        if results != expected or batch_results != expected:
+            raise Exception('Results differ')
+        print('%10d %10s %10.2f %10.1f %10.0f %10.0f' % (n, 'flat', built, memory / n, qps, batch_qps))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in argv[1:]] or [10000, 100000])
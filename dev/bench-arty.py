@@ -0,0 +1,67 @@
+
+# compare building an r-tree one entry at a time with bulk loading (STR and hilbert packing),
+# and the time for queries (overlap and nearest neighbour) against the resulting trees.
+# the points are random walks (like GPS tracks) within a few km.
+# run from the project root:
+#   python dev/bench-arty.py [N_POINTS ...]
+
+from random import seed, gauss, uniform
+from sys import argv
+from time import perf_counter
+
+from ch2.arty import MatchType, PackType
+from ch2.arty.spherical import SQRTree
+
+N_QUERIES = 10000
+BORDER = 3
+
+
+def tracks(n, length=5000):
+    seed(1)
+    points = []
+    while len(points) < n:
+        lon, lat = uniform(-0.05, 0.05), uniform(-0.05, 0.05)
+        for i in range(min(length, n - len(points))):
+            lon, lat = lon + gauss(0, 0.00005), lat + gauss(0, 0.00005)
+            points.append([(lon, lat)])
+    return points
+
+
+def build(points, pack=None):
+    tree = SQRTree(default_match=MatchType.OVERLAP, default_border=BORDER)
+    start = perf_counter()
+    if pack is None:
+        for i, point in enumerate(points):
+            tree[point] = i
+    else:
+        tree.load((point, i) for i, point in enumerate(points))
+    return tree, perf_counter() - start
+
+
+def query(tree, points):
+    start, n = perf_counter(), 0
+    for point in points[::max(1, len(points) // N_QUERIES)]:
+        n += len(list(tree.get_items(point)))
+    return perf_counter() - start, n
+
+
+def nearest(tree, points):
+    start = perf_counter()
+    for point in points[::max(1, len(points) // N_QUERIES)]:
+        list(tree.nearest(point[0]))
+    return perf_counter() - start
+
+
+def main(sizes):
+    print('%10s %10s %10s %10s %10s %10s' % ('points', 'method', 'build', 'query', 'nearest', 'height'))
+    for n in sizes:
+        points = tracks(n)
+        for name, pack in ('insert', None), ('str', PackType.STR), ('hilbert', PackType.HILBERT):
+            tree, built = build(points, pack)
+            queried, _ = query(tree, points)
+            print('%10d %10s %10.2f %10.2f %10.2f %10d' % (n, name, built, queried, nearest(tree, points),
+                                                          tree.height))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in argv[1:]] or [10000, 30000, 100000])
@@ -0,0 +1,68 @@
+# compare packed activity data (ActivityBlob) with the row-per-value layout: storage per value and the
+# time to read complete activities with activity_statistics.
+# run from the project root:
+#   python dev/bench-blob.py [PATH ...]
+
+from logging import getLogger
+from sqlite3 import connect
+from sys import argv
+from tempfile import NamedTemporaryFile
+from time import perf_counter
+
+from sqlalchemy.sql.functions import count
+
+from ch2.commands.activities import activities
+from ch2.commands.args import bootstrap_file, m, V, mm, FAST
+from ch2.config.default import default
+from ch2.data.frame import activity_statistics
+from ch2.squeal import ActivityJournal, ActivityBlob, Pipeline, PipelineType, StatisticJournal, StatisticName
+
+log = getLogger(__name__)
+PATHS = ('data/test/source/personal/2018-08-27-rec.fit',
+         'data/test/source/personal/2018-03-04-qdp.fit',
+         'data/test/source/personal/2016-07-19-mpu-s-z2.fit',
+         'data/test/source/other/2018-05-30-22-00-44.fit')
+ROW_TABLES = ('statistic_journal', 'statistic_journal_float', 'statistic_journal_integer')
+
+
+def read_all(s, names):
+    start = perf_counter()
+    for journal in s.query(ActivityJournal).all():
+        activity_statistics(s, *names, activity_journal=journal)
+    return perf_counter() - start
+
+
+def main(paths):
+    with NamedTemporaryFile() as f:
+        bootstrap_file(f, m(V), '0', configurator=default)
+        args, db = bootstrap_file(f, m(V), '0')
+        with db.session_context() as s:
+            for pipeline in s.query(Pipeline).filter(Pipeline.type == PipelineType.ACTIVITY).all():
+                pipeline.kargs = dict(pipeline.kargs, pack=True)
+        args, db = bootstrap_file(f, m(V), '0', 'activities', mm(FAST), *paths)
+        activities(args, db)
+        with db.session_context() as s:
+            ids = [id for (id,) in s.query(ActivityBlob.statistic_name_id).distinct().all()]
+            names = [name for (name,) in s.query(StatisticName.name).filter(StatisticName.id.in_(ids)).all()]
+            n_rows = s.query(count(StatisticJournal.id)).scalar()
+            n_packed = s.query(count(StatisticJournal.id)). \
+                filter(StatisticJournal.statistic_name_id.in_(ids)).scalar()
+        db_stat = connect(f.name)
+        row_bytes = db_stat.execute('select sum(pgsize) from dbstat where name in (%s) or name in '
+                                    '(select name from sqlite_master where type="index" and tbl_name in (%s))' %
+                                    (','.join(f'"{table}"' for table in ROW_TABLES),
+                                     ','.join(f'"{table}"' for table in ROW_TABLES))).fetchone()[0]
+        blob_bytes = db_stat.execute('select sum(length(times) + length(data)) from activity_blob').fetchone()[0]
+        db_stat.close()
+        print(f'{n_rows} values as rows: {row_bytes / n_rows:.1f} bytes/value (including indices)')
+        print(f'{n_packed} values packed: {blob_bytes / n_packed:.1f} bytes/value')
+        with db.session_context() as s:
+            packed = read_all(s, names)
+            s.query(ActivityBlob).delete()
+            s.commit()
+            rows = read_all(s, names)
+        print(f'reading {len(names)} statistics for all activities: {rows:.2f}s from rows, {packed:.2f}s packed')
+
+
+if __name__ == '__main__':
+    main(argv[1:] if len(argv) > 1 else PATHS)
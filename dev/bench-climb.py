@@ -0,0 +1,56 @@
+
+# time climb detection on synthetic 1Hz profiles of increasing length.
+# the original (quadratic) search is only run for the shorter profiles (it takes minutes beyond that).
+# run from the project root:
+#   python dev/bench-climb.py [MAX_HOURS [MAX_REFERENCE_HOURS]]
+
+from sys import argv
+from time import perf_counter
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from ch2.data.climb import find_climbs, search_by_offset, biggest_reversal_by_offset
+from ch2.stoats.names import DISTANCE, ELEVATION
+
+
+def profile(hours, seed=0):
+    rng = np.random.RandomState(seed)
+    n = int(hours * 3600)
+    index = pd.date_range(start='2000-01-01', periods=n, freq='1s', tz='UTC')
+    distance = np.cumsum(np.clip(rng.normal(7, 1, n), 0.5, None))
+    # rolling hills on top of a few long climbs, plus some noise
+    elevation = 400 * np.sin(distance / 15000) ** 2 + 30 * np.sin(distance / 800) + \
+        np.cumsum(rng.normal(0, 0.05, n))
+    return pd.DataFrame({DISTANCE: distance, ELEVATION: elevation}, index=index)
+
+
+def time_climbs(df, reference=False):
+    start = perf_counter()
+    if reference:
+        with patch('ch2.data.climb.search', search_by_offset), \
+                patch('ch2.data.climb.biggest_reversal', biggest_reversal_by_offset):
+            climbs = list(find_climbs(df))
+    else:
+        climbs = list(find_climbs(df))
+    return perf_counter() - start, climbs
+
+
+def main(max_hours, max_reference_hours):
+    print('%10s %10s %10s %10s %10s' % ('hours', 'points', 'climbs', 'seconds', 'reference'))
+    for hours in sorted(set(hours for hours in (1, 2, 4, 8, 16) if hours < max_hours) | {max_hours}):
+        df = profile(hours)
+        elapsed, climbs = time_climbs(df)
+        if hours <= max_reference_hours:
+            reference, reference_climbs = time_climbs(df, reference=True)
+            if reference_climbs != climbs:
+                print('Climbs differ!')
+            reference = '%10.1f' % reference
+        else:
+            reference = '%10s' % '-'
+        print('%10d %10d %10d %10.1f %s' % (hours, len(df), len(climbs), elapsed, reference))
+
+
+if __name__ == '__main__':
+    main(int(argv[1]) if len(argv) > 1 else 24, int(argv[2]) if len(argv) > 2 else 4)
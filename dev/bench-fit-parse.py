@@ -0,0 +1,65 @@
+
+# time tokenizing every fit file in the test data and check that cost is linear in file size.
+# run from the project root:
+#   python dev/bench-fit-parse.py [dir]
+
+from glob import glob
+from logging import getLogger, basicConfig, ERROR
+from math import log as ln
+from os.path import join, getsize
+from sys import argv
+from time import perf_counter
+
+from ch2.fit.format.read import parse_data
+from ch2.fit.profile.profile import read_fit, read_profile
+
+log = getLogger(__name__)
+
+
+def tokenize(data, types, messages):
+    state, tokens = parse_data(data, types, messages, no_validate=True)
+    n = 0
+    for n, _ in enumerate(tokens, start=1):
+        pass
+    return n
+
+
+def time_file(path, types, messages, repeat=3):
+    data = read_fit(log, path)
+    best, n = None, 0
+    for _ in range(repeat):
+        start = perf_counter()
+        n = tokenize(data, types, messages)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(data), n, best
+
+
+def slope(xs, ys):
+    lx, ly = [ln(x) for x in xs], [ln(y) for y in ys]
+    mx, my = sum(lx) / len(lx), sum(ly) / len(ly)
+    return sum((x - mx) * (y - my) for x, y in zip(lx, ly)) / sum((x - mx) ** 2 for x in lx)
+
+
+def main(root):
+    basicConfig(level=ERROR)
+    types, messages = read_profile(log)
+    sizes, times = [], []
+    paths = sorted(set(glob(join(root, '**', '*.fit'), recursive=True)) |
+                   set(glob(join(root, '**', '*.FIT'), recursive=True)), key=getsize)
+    print('%10s %8s %10s %10s  %s' % ('bytes', 'tokens', 'seconds', 'us/byte', 'file'))
+    for path in paths:
+        try:
+            size, n, elapsed = time_file(path, types, messages)
+        except Exception:
+            continue  # corrupt test files
+        if size > 10000:  # small files are dominated by fixed costs
+            sizes.append(size)
+            times.append(elapsed)
+        print('%10d %8d %10.4f %10.3f  %s' % (size, n, elapsed, 1e6 * elapsed / size, path))
+    print()
+    print('log-log slope of time against size: %.2f (1 is linear, 2 is quadratic)' % slope(sizes, times))
+
+
+if __name__ == '__main__':
+    main(argv[1] if len(argv) > 1 else 'data/test/source')
@@ -0,0 +1,60 @@
+# measure the cost of the profile in a new (worker-like) process: time (after imports) to the first parsed
+# record and to the end of the file, and the memory used (unique to the process and resident), when only the
+# messages in the file are loaded (lazy) and when everything is loaded (eager - as when the profile was a
+# single pickle).  each run is a separate process.
+# run from the project root:
+#   python dev/bench-fit-profile.py [PATH [REPEAT]]
+
+from subprocess import run, PIPE
+from sys import argv, executable
+
+CHILD = 'child'
+PATH = 'data/test/source/personal/2018-08-27-rec.fit'
+
+
+def child(mode, path):
+    from logging import getLogger
+    from time import perf_counter
+    from psutil import Process
+    start = perf_counter()
+    from ch2.fit.format.read import parse_data
+    from ch2.fit.profile.profile import read_fit, read_profile
+    imports = perf_counter() - start
+    log = getLogger(__name__)
+    data = read_fit(log, path)
+    process = Process()
+    start, before = perf_counter(), process.memory_full_info()
+    types, messages = read_profile(log)
+    if mode == 'eager':
+        types.all_types(), messages.all_messages()
+    state, tokens = parse_data(data, types, messages, no_validate=True)
+    for offset, token in tokens:
+        token.parse_token().force()
+        if token.is_user:
+            break
+    first = perf_counter() - start
+    for offset, token in tokens:
+        token.parse_token().force()
+    after = process.memory_full_info()
+    print(imports, first, perf_counter() - start, (after.uss - before.uss) / 1e6, (after.rss - before.rss) / 1e6,
+          types.n_loaded(), messages.n_loaded())
+
+
+def main(path, repeat):
+    print(f'{path} ({repeat} runs, best time, mean memory)')
+    for mode in 'lazy', 'eager':
+        results = []
+        for _ in range(repeat):
+            process = run([executable, argv[0], CHILD, mode, path], stdout=PIPE, universal_newlines=True, check=True)
+            results.append([float(x) for x in process.stdout.split()])
+        imports, first, total = (min(r[i] for r in results) for i in (0, 1, 2))
+        uss, rss = (sum(r[i] for r in results) / repeat for i in (3, 4))
+        print(f'  {mode:>5s}: (imports {imports:5.3f}s) first record {first:5.3f}s, all {total:5.3f}s, '
+              f'uss {uss:5.2f}MB, rss {rss:5.2f}MB, loaded {int(results[0][5])} types, {int(results[0][6])} messages')
+
+
+if __name__ == '__main__':
+    if len(argv) > 1 and argv[1] == CHILD:
+        child(argv[2], argv[3])
+    else:
+        main(argv[1] if len(argv) > 1 else PATH, int(argv[2]) if len(argv) > 2 else 5)
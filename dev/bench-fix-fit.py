@@ -0,0 +1,61 @@
+# compare the backtracking (--drop) and streaming (--resync) repair of deliberately corrupted copies of test
+# files.  each copy has N_BAD short runs of random bytes; each repair is stopped after LIMIT seconds.
+# run from the project root:
+#   python dev/bench-fix-fit.py [N_BAD [LIMIT]]
+
+from logging import getLogger, basicConfig, ERROR
+from random import Random
+from signal import signal, alarm, SIGALRM
+from sys import argv
+from time import perf_counter
+
+from ch2.fit.fix import fix
+from ch2.fit.profile.profile import read_fit
+
+log = getLogger(__name__)
+PATHS = ('data/test/source/personal/2018-08-27-rec.fit',
+         'data/test/source/other/2018-02-24-10-04-10.fit',
+         'data/test/source/other/77F73023.FIT')
+
+
+class Timeout(BaseException): pass  # not caught by the search
+
+
+def timeout(signum, frame):
+    raise Timeout()
+
+
+def corrupt(data, n_bad, seed):
+    random, data = Random(seed), bytearray(data)
+    for offset in sorted(random.sample(range(100, len(data) - 100), n_bad)):
+        length = random.randint(1, 20)
+        data[offset:offset+length] = bytes(random.randrange(256) for _ in range(length))
+    return data
+
+
+def repair(name, data, limit, **kargs):
+    alarm(limit)
+    start = perf_counter()
+    try:
+        fixed = fix(data, fix_header=True, fix_checksum=True, **kargs)
+        print(f'  {name:>6s}: {perf_counter() - start:6.2f}s, kept {len(fixed):7d} bytes')
+    except Timeout:
+        print(f'  {name:>6s}: >{limit}s')
+    except Exception as e:
+        print(f'  {name:>6s}: {perf_counter() - start:6.2f}s, failed ({e})')
+    finally:
+        alarm(0)
+
+
+def main(n_bad, limit):
+    basicConfig(level=ERROR + 10)
+    signal(SIGALRM, timeout)
+    for seed, path in enumerate(PATHS):
+        data = corrupt(read_fit(log, path), n_bad, seed)
+        print(f'{path} ({len(data)} bytes, {n_bad} corruptions)')
+        repair('drop', data, limit, drop=True, max_drop_cnt=2 * n_bad)
+        repair('resync', data, limit, resync=True, max_drop_cnt=2 * n_bad, max_time=limit)
+
+
+if __name__ == '__main__':
+    main(int(argv[1]) if len(argv) > 1 else 5, int(argv[2]) if len(argv) > 2 else 60)
@@ -0,0 +1,81 @@
+# time the single-query (wide) readers in data.frame for 1, 5 and 20 columns over a synthetic season
+# of activities.  if JOIN is 1 the original joins are also timed (these are very slow - use few activities).
+# run from the project root:
+#   python dev/bench-frame.py [ACTIVITIES [HOURS [JOIN]]]
+
+import datetime as dt
+from logging import getLogger
+from math import sin
+from sys import argv
+from tempfile import NamedTemporaryFile
+from time import perf_counter
+
+from ch2.commands.args import bootstrap_file, m, V
+from ch2.config.default import default
+from ch2.data.frame import statistics, activity_statistics, statistic_names, _labels, _statistics_by_join, \
+    _activity_statistics_by_join
+from ch2.squeal import ActivityGroup, ActivityJournal
+from ch2.squeal.tables.statistic import StatisticJournalFloat
+from ch2.squeal.utils import add
+from ch2.stoats.load import StatisticJournalLoader
+
+log = getLogger(__name__)
+NAMES = [f'Bench {i}' for i in range(20)]
+
+
+def populate(s, n_activities, hours):
+    group = s.query(ActivityGroup).first()
+    start = dt.datetime(2018, 3, 1, tzinfo=dt.timezone.utc)
+    for i in range(n_activities):
+        first = start + dt.timedelta(days=2 * i)
+        journal = add(s, ActivityJournal(activity_group=group, start=first,
+                                         finish=first + dt.timedelta(hours=hours),
+                                         fit_file=f'synthetic-{i}', name=f'synthetic-{i}'))
+        s.commit()
+        loader = StatisticJournalLoader(s, owner=ActivityJournal)
+        for j in range(int(hours * 3600)):
+            time = first + dt.timedelta(seconds=j)
+            for k, name in enumerate(NAMES):
+                loader.add(name, None, None, group, journal, sin(j / 100 + k), time, StatisticJournalFloat)
+        loader.load()
+    return group
+
+
+def timed(label, n, f, *args, **kargs):
+    start = perf_counter()
+    result = f(*args, **kargs)
+    print(f'{label:>12s} {n:2d} columns: {perf_counter() - start:6.2f}s')
+    return result
+
+
+def main(n_activities, hours, join):
+    with NamedTemporaryFile() as f:
+        bootstrap_file(f, m(V), '0', configurator=default)
+        args, db = bootstrap_file(f, m(V), '0')
+        with db.session_context() as s:
+            start = perf_counter()
+            populate(s, n_activities, hours)
+            print(f'Loaded {n_activities} activities in {perf_counter() - start:.1f}s')
+            journals = s.query(ActivityJournal).all()
+            for n in 1, 5, 20:
+                names = statistic_names(s, *NAMES[:n])
+                timed('statistics', n, statistics, s, *NAMES[:n])
+                if join:
+                    timed('(join)', n, _statistics_by_join, s, names, _labels(names))
+
+                def wide():
+                    for journal in journals:
+                        activity_statistics(s, *NAMES[:n], activity_journal=journal)
+
+                def by_join():
+                    for journal in journals:
+                        _activity_statistics_by_join(s, names, _labels(names), journal)
+
+                timed('activity', n, wide)
+                if join:
+                    timed('(join)', n, by_join)
+
+
+if __name__ == '__main__':
+    main(int(argv[1]) if len(argv) > 1 else 100, float(argv[2]) if len(argv) > 2 else 1,
+         len(argv) > 3 and argv[3] == '1')
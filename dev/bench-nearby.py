@@ -0,0 +1,99 @@
+# compare clustering of nearby activities (the expand_max search over epsilon, as in NearbyCalculator) using
+# database queries for each neighbourhood (as before) and the in-memory similarity graph.  the similarities
+# are synthetic (activities scattered around a few routes) and the groups must be identical.
+# run from the project root:
+#   python dev/bench-nearby.py [N_ACTIVITIES [SEED]]
+
+from logging import getLogger
+from random import seed, gauss, randrange, shuffle
+from sys import argv
+from time import perf_counter
+
+from sqlalchemy import create_engine, distinct, func
+from sqlalchemy.orm import sessionmaker
+
+from ch2.lib.dbscan import DBSCAN
+from ch2.lib.optimizn import expand_max
+from ch2.squeal import ActivitySimilarity
+from ch2.stoats.calculate.nearby import NearbySimilarityGraph, NearbySimilarityDBSCAN
+
+log = getLogger(__name__)
+CONSTRAINT = 'bench'
+
+
+class QueryDBSCAN(DBSCAN):
+
+    def __init__(self, s, epsilon, minpts):
+        super().__init__(epsilon, minpts)
+        self.__s = s
+        self.__max_similarity = s.query(func.max(ActivitySimilarity.similarity)). \
+            filter(ActivitySimilarity.constraint == CONSTRAINT).scalar()
+
+    def run(self):
+        return super().run(sorted(x[0] for x in
+                                  self.__s.query(distinct(ActivitySimilarity.activity_journal_lo_id)).
+                                  filter(ActivitySimilarity.constraint == CONSTRAINT).all()))
+
+    def neighbourhood(self, candidate, epsilon):
+        qlo = self.__s.query(ActivitySimilarity.activity_journal_lo_id). \
+            filter(ActivitySimilarity.constraint == CONSTRAINT,
+                   ActivitySimilarity.activity_journal_hi_id == candidate,
+                   (self.__max_similarity - ActivitySimilarity.similarity) / self.__max_similarity < epsilon)
+        qhi = self.__s.query(ActivitySimilarity.activity_journal_hi_id). \
+            filter(ActivitySimilarity.constraint == CONSTRAINT,
+                   ActivitySimilarity.activity_journal_lo_id == candidate,
+                   (self.__max_similarity - ActivitySimilarity.similarity) / self.__max_similarity < epsilon)
+        return [x[0] for x in qlo.all()] + [x[0] for x in qhi.all()]
+
+
+def populate(s, n):
+    routes = [(gauss(0, 10), gauss(0, 10), abs(gauss(1, 0.5))) for _ in range(max(1, n // 20))]
+    points = []
+    for i in range(n):
+        x, y, spread = routes[randrange(len(routes))]
+        points.append((i + 1, x + gauss(0, spread), y + gauss(0, spread)))
+    rows = [(lo, hi, 1 / (1 + (xlo - xhi) ** 2 + (ylo - yhi) ** 2))
+            for lo, xlo, ylo in points for hi, xhi, yhi in points if lo < hi]
+    rows = [row for row in rows if row[2] > 0.05]
+    shuffle(rows)  # so that ids are not ordered by activity
+    s.bulk_save_objects([ActivitySimilarity(constraint=CONSTRAINT, activity_journal_lo_id=lo,
+                                            activity_journal_hi_id=hi, similarity=similarity)
+                         for lo, hi, similarity in rows])
+    s.commit()
+    return len(rows)
+
+
+def sweep(dbscan):
+    groups = {}
+
+    def f(d):
+        if d not in groups:
+            groups[d] = dbscan(d)
+        return len(groups[d])
+
+    start = perf_counter()
+    d_min, n = expand_max(log, 0, 1, 5, f)
+    return perf_counter() - start, groups
+
+
+def main(n):
+    engine = create_engine('sqlite://')
+    engine.execute('pragma foreign_keys=OFF')  # no activity journals
+    ActivitySimilarity.__table__.create(engine)
+    s = sessionmaker(bind=engine)()
+    n_rows = populate(s, n)
+    print(f'{n} activities, {n_rows} similarities')
+    query, query_groups = sweep(lambda d: QueryDBSCAN(s, d, 3).run())
+    start = perf_counter()
+    graph = NearbySimilarityGraph(s, CONSTRAINT)
+    load = perf_counter() - start
+    memory, memory_groups = sweep(lambda d: NearbySimilarityDBSCAN(graph, d, 3).run())
+    if query_groups != memory_groups:
+        raise Exception('Groups differ')
+    print(f'  queries: {query:6.3f}s for {len(query_groups)} values of epsilon')
+    print(f'    graph: {memory + load:6.3f}s (load {load:5.3f}s), identical groups')
+
+
+if __name__ == '__main__':
+    seed(int(argv[2]) if len(argv) > 2 else 1)
+    main(int(argv[1]) if len(argv) > 1 else 300)
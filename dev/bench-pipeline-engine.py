@@ -0,0 +1,61 @@
+
+# compare wall time for reading activities with the two worker engines (see MultiProcPipeline).
+# the activities are copies of a test file, shifted in time so that they do not overlap.
+# run from the project root:
+#   python dev/bench-pipeline-engine.py [N_FILES [N_CPU]]
+
+import datetime as dt
+from logging import getLogger, basicConfig, ERROR
+from os.path import join
+from sqlite3 import connect
+from subprocess import run
+from sys import argv, executable
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from ch2.fit.fix import fix
+from ch2.fit.profile.profile import read_fit
+from ch2.stoats.pipeline import SUBPROCESS, POOL
+
+log = getLogger(__name__)
+SOURCE = 'data/test/source/personal/2018-08-27-rec.fit'
+
+
+def synthetic(dir, n):
+    data = read_fit(log, SOURCE)
+    paths = []
+    for i in range(n):
+        start = dt.datetime(2000, 1, 1, tzinfo=dt.timezone.utc) + dt.timedelta(days=i)
+        path = join(dir, '%03d.fit' % i)
+        with open(path, 'wb') as output:
+            output.write(fix(data, start=start, fix_checksum=True))
+        paths.append(path)
+    return paths
+
+
+def ch2(dir, db, *args):
+    run([executable, '-m', 'ch2', '--root', dir, '-f', db, '-v', '0'] + list(args), check=True)
+
+
+def time_engine(dir, paths, engine, n_cpu):
+    db = join(dir, f'{engine}.sqlr')
+    ch2(dir, db, 'config', 'default')
+    start = perf_counter()
+    ch2(dir, db, 'activities', '--fast', *paths, '-K', f'engine={engine}', f'n_cpu={n_cpu}')
+    elapsed = perf_counter() - start
+    n = connect(db).execute('select count(*) from activity_journal').fetchone()[0]
+    return elapsed, n
+
+
+def main(n_files, n_cpu):
+    basicConfig(level=ERROR)
+    with TemporaryDirectory() as dir:
+        paths = synthetic(dir, n_files)
+        print('%10s %10s %10s' % ('engine', 'seconds', 'loaded'))
+        for engine in SUBPROCESS, POOL:
+            elapsed, n = time_engine(dir, paths, engine, n_cpu)
+            print('%10s %10.1f %10d' % (engine, elapsed, n))
+
+
+if __name__ == '__main__':
+    main(int(argv[1]) if len(argv) > 1 else 12, int(argv[2]) if len(argv) > 2 else 4)
@@ -0,0 +1,60 @@
+
+# time StatisticJournalLoader on a synthetic 10 hour activity with 1 second samples.
+# run from the project root:
+#   python dev/bench-statistic-load.py [HOURS]
+
+import datetime as dt
+from logging import getLogger
+from math import sin, cos
+from sys import argv
+from tempfile import NamedTemporaryFile
+from time import perf_counter
+
+from sqlalchemy.sql.functions import count
+
+from ch2.commands.args import bootstrap_file, m, V
+from ch2.config.default import default
+from ch2.squeal import ActivityGroup, ActivityJournal, StatisticJournal
+from ch2.squeal.tables.statistic import StatisticJournalFloat, StatisticJournalInteger
+from ch2.squeal.utils import add
+from ch2.stoats.load import StatisticJournalLoader
+
+log = getLogger(__name__)
+FLOATS = ('Latitude', 'Longitude', 'Distance', 'Speed', 'Elevation')
+INTEGERS = ('Heart Rate', 'Cadence')
+
+
+def stage(s, source, hours):
+    loader = StatisticJournalLoader(s, owner=ActivityJournal)
+    start = dt.datetime(2000, 1, 1, tzinfo=dt.timezone.utc)
+    for i in range(int(hours * 3600)):
+        time = start + dt.timedelta(seconds=i)
+        for j, name in enumerate(FLOATS):
+            loader.add(name, None, None, None, source, sin(i / 100 + j), time, StatisticJournalFloat)
+        for j, name in enumerate(INTEGERS):
+            loader.add(name, None, None, None, source, int(100 + 50 * cos(i / 100 + j)), time,
+                       StatisticJournalInteger)
+    return loader
+
+
+def main(hours):
+    with NamedTemporaryFile() as f:
+        bootstrap_file(f, m(V), '0', configurator=default)
+        args, db = bootstrap_file(f, m(V), '0')
+        with db.session_context() as s:
+            group = s.query(ActivityGroup).first()
+            source = add(s, ActivityJournal(activity_group=group, start=0.0, finish=hours * 3600.0,
+                                            fit_file='synthetic', name='synthetic'))
+            s.commit()
+            start = perf_counter()
+            loader = stage(s, source, hours)
+            staged = perf_counter() - start
+            start = perf_counter()
+            loader.load()
+            loaded = perf_counter() - start
+            n = s.query(count(StatisticJournal.id)).filter(StatisticJournal.source == source).scalar()
+    print(f'{n} rows; staged in {staged:.1f}s, loaded in {loaded:.1f}s ({n / loaded:.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main(float(argv[1]) if len(argv) > 1 else 10)
@@ -0,0 +1,58 @@
+# time SummaryCalculator (monthly and yearly summaries, including measures) over synthetic data covering
+# several years.  compare before / after changes by checking out different versions.
+# run from the project root:
+#   python dev/bench-summary.py [YEARS [PER_DAY [NAMES]]]
+
+import datetime as dt
+from logging import getLogger
+from math import sin
+from sys import argv
+from tempfile import NamedTemporaryFile
+from time import perf_counter
+
+from sqlalchemy.sql.functions import count
+
+from ch2.commands.args import bootstrap_file, m, V
+from ch2.config.default import default
+from ch2.squeal import Source, StatisticJournal, StatisticMeasure
+from ch2.squeal.tables.source import SourceType
+from ch2.squeal.tables.statistic import StatisticJournalFloat
+from ch2.squeal.utils import add
+from ch2.stoats.calculate.summary import SummaryCalculator
+from ch2.stoats.load import StatisticJournalLoader
+from ch2.stoats.names import summaries, MAX, MIN, SUM, CNT, AVG, MSR
+
+log = getLogger(__name__)
+
+
+def populate(s, years, per_day, n_names):
+    source = add(s, Source(type=SourceType.SOURCE))
+    s.commit()
+    loader = StatisticJournalLoader(s, owner=Source)
+    start = dt.datetime(2019 - years, 1, 1, tzinfo=dt.timezone.utc)
+    for i in range(int(365.25 * years * per_day)):
+        time = start + dt.timedelta(days=i / per_day)
+        for j in range(n_names):
+            summary = summaries(MIN, AVG, MSR) if j % 2 else summaries(MAX, SUM, CNT, AVG, MSR)
+            loader.add(f'Bench {j}', None, summary, None, source, sin(i + j) * 100, time, StatisticJournalFloat)
+    loader.load()
+
+
+def main(years, per_day, n_names):
+    with NamedTemporaryFile() as f:
+        bootstrap_file(f, m(V), '0', configurator=default)
+        args, db = bootstrap_file(f, m(V), '0')
+        with db.session_context() as s:
+            populate(s, years, per_day, n_names)
+            print(f'{s.query(count(StatisticJournal.id)).scalar()} values')
+        for schedule in 'm', 'y':
+            start = perf_counter()
+            SummaryCalculator(db, schedule=schedule, n_cpu=1).run()
+            print(f'{schedule}: {perf_counter() - start:.2f}s')
+        with db.session_context() as s:
+            print(f'{s.query(count(StatisticMeasure.id)).scalar()} measures')
+
+
+if __name__ == '__main__':
+    main(int(argv[1]) if len(argv) > 1 else 10, int(argv[2]) if len(argv) > 2 else 4,
+         int(argv[3]) if len(argv) > 3 else 4)
@@ -4,8 +4,9 @@ from random import uniform, gauss, seed, randrange
 from time import time
 from unittest import TestCase
 
-from ch2.arty.spherical import Global
-from ch2.arty.tree import CLRTree, MatchType, CQRTree, CERTree, LQRTree
+from ch2.arty.flat import CFRTree, LFRTree, SFRTree
+from ch2.arty.spherical import Global, SQRTree
+from ch2.arty.tree import CLRTree, MatchType, CQRTree, CERTree, LQRTree, PackType, haversine
 
 
 class TestArty(TestCase):
@@ -199,6 +200,37 @@ class TestArty(TestCase):
                     print('n_data %d' % n_data)
                     self.stress(type, n_children, n_data)
 
+    def test_load(self):
+        for type in CLRTree, CQRTree, LQRTree, SQRTree:
+            for pack in PackType.STR, PackType.HILBERT:
+                for n_children in 2, 3, 4, 10:
+                    for n_data in 0, 1, 2, 3, 100:
+                        seed(n_data)
+                        data = list(self.gen_random(n_data))
+                        added = type(max_entries=n_children)
+                        for value, box in data:
+                            added.add(box, value)
+                        loaded = type(max_entries=n_children)
+                        loaded.load(((box, value) for value, box in data), pack=pack)
+                        loaded.assert_consistent()
+                        self.assertEqual(added, loaded)
+                        for j in range(10):
+                            box = self.random_box(10, 100)
+                            for match in range(4):
+                                self.assertEqual(sorted(added.get(box, match=MatchType(match))),
+                                                 sorted(loaded.get(box, match=MatchType(match))))
+                        # further changes work as usual
+                        for value, box in data[:n_data // 2]:
+                            loaded.delete_one(box, value=value)
+                            loaded.assert_consistent()
+                        for value, box in self.gen_random(10):
+                            loaded.add(box, value)
+                            loaded.assert_consistent()
+                        # and existing entries are kept
+                        loaded.load(((box, value) for value, box in self.gen_random(10)), pack=pack)
+                        loaded.assert_consistent()
+                        self.assertEqual(len(loaded), n_data - n_data // 2 + 20)
+
     def test_latlon(self):
         tree = LQRTree()
         for lon in -180, 180:
@@ -295,6 +327,79 @@ class TestArty(TestCase):
         test_point(179.9, -89.99, 1)
         test_point(-179.9, -89.99, 2)
 
+        t = Global()
+        t.load([([(0.01, 0.01)], 0), ([(179.9, 89.99)], 1)])
+        self.assertEqual(list(t.get([(0.01, 0.01)])), [0] * 9)
+        self.assertEqual(list(t.get([(179.9, 89.99)])), [1] * 9)
+
+    def assert_nearest(self, tree, items, distance, lon, lat, k):
+        expected = sorted((distance((lon, lat), points[0]), value) for points, value in items)
+        found = list(tree.nearest((lon, lat), k=k))
+        self.assertEqual(len(found), len(expected) if k is None else k)
+        for (d, value), (d_found, points_found, value_found) in zip(expected, found):
+            self.assertEqual(value, value_found)
+            self.assertAlmostEqual(d, d_found, delta=1e-6)
+
+    def test_nearest(self):
+        seed(4)
+        euclidean = lambda p, q: sqrt((p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2)
+        for tree, distance, lon, lat, size in ((CQRTree(), euclidean, 0, 0, 1),
+                                               (LQRTree(), haversine, 179.9, -33.4, 0.2),
+                                               (SQRTree(), haversine, -70.6, -33.4, 0.2),
+                                               (SQRTree(max_entries=5), haversine, -70.6, 60, 0.2)):
+            items = [([(lon + uniform(-size, size), lat + uniform(-size, size))], i) for i in range(500)]
+            tree.load(items[:400])
+            for points, value in items[400:]:
+                tree[points] = value
+            for _ in range(20):
+                x, y = lon + uniform(-1.5 * size, 1.5 * size), lat + uniform(-1.5 * size, 1.5 * size)
+                self.assert_nearest(tree, items, distance, x, y, 10)
+            self.assert_nearest(tree, items, distance, lon, lat, None)
+            self.assertEqual([value for _, _, value in tree.nearest((lon, lat), k=3, value=7)], [7])
+        tree = Global()
+        items = [([(10 + uniform(-1, 1), 5 + uniform(-1, 1))], i) for i in range(100)]
+        tree.load(items)
+        self.assert_nearest(tree, items, haversine, 10, 5, 10)
+
+    def test_global_nearest(self):
+        # sparse points, mostly many tiles apart, so the nearest are rarely in neighbouring tiles
+        seed(5)
+        items = [([(uniform(-180, 180), uniform(-89, 89))], i) for i in range(60)]
+        items += [([(uniform(-60, -40), uniform(-30, -10))], i) for i in range(60, 70)]
+        items += [([(179.95, -89.95)], 70), ([(-179.95, 89.95)], 71), ([(0, 0)], 72), ([(-10, -5)], 73)]
+        tree = Global()
+        tree.load(items[:40])
+        for points, value in items[40:]:
+            tree.add(points, value)
+        for _ in range(20):
+            self.assert_nearest(tree, items, haversine, uniform(-180, 180), uniform(-90, 90), 5)
+        for lon, lat in ((-50, -20), (179.9, 0), (-179.9, 85), (0, -89.9), (0, 0), (-0.01, -0.01)):
+            self.assert_nearest(tree, items, haversine, lon, lat, 3)
+            self.assert_nearest(tree, items, haversine, lon, lat, None)
+        self.assertEqual([value for _, _, value in tree.nearest((0, 0), k=3, value=7)], [7])
+        self.assertEqual(list(Global().nearest((0, 0))), [])
+
+    def test_flat(self):
+        for type, flat in (CQRTree, CFRTree), (LQRTree, LFRTree), (SQRTree, SFRTree):
+            for max_entries in 2, 3, 64:
+                for n_data in 0, 1, 2, 3, 100, 1000:
+                    seed(n_data)
+                    data = [(box, i) for i, (_, box) in enumerate(self.gen_random(n_data))]
+                    data += data[:n_data // 10]  # some duplicates
+                    tree, frozen = type(), flat(data, max_entries=max_entries)
+                    tree.load(data)
+                    self.assertEqual(len(frozen), len(data))
+                    boxes = [self.random_box(10, 100) for _ in range(10)] + [box for box, _ in data[:5]]
+                    for match in range(4):
+                        batch = frozen.get_batch(boxes, match=MatchType(match))
+                        for box, values in zip(boxes, batch):
+                            expected = sorted(tree.get(box, match=MatchType(match)))
+                            self.assertEqual(sorted(frozen.get(box, match=MatchType(match))), expected)
+                            self.assertEqual(sorted(values), expected)
+                    for box, value in data[:5]:
+                        self.assertEqual(sorted(frozen.get_items(box, value=value, match=MatchType.OVERLAP)),
+                                         sorted(tree.get_items(box, value=value, match=MatchType.OVERLAP)))
+
     def run_python(self, tree):
         tree[[(0, 0)]] = 'alice'
         tree[[(10, 10)]] = 'bob'
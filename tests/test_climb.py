@@ -0,0 +1,57 @@
+from logging import getLogger
+from os.path import join
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from ch2.data.climb import find_climbs, search, search_by_offset, biggest_reversal, biggest_reversal_by_offset, \
+    Climb
+from ch2.data.frame import linear_resample
+from ch2.fit.format.read import filtered_columns
+from ch2.fit.profile.profile import read_fit
+from ch2.stoats.names import DISTANCE, ELEVATION
+
+log = getLogger(__name__)
+
+
+class TestClimb(TestCase):
+
+    def setUp(self):
+        self.test_dir = 'data/test/source'
+
+    def read(self, path):
+        data = read_fit(log, join(self.test_dir, path))
+        columns = filtered_columns(data, record_names=('record',),
+                                   field_names=('timestamp', 'distance', 'altitude', 'enhanced_altitude'))[2]['record']
+        altitude = 'enhanced_altitude' if 'enhanced_altitude' in columns else 'altitude'
+        df = pd.DataFrame({DISTANCE: columns['distance'].astype(float).filled(np.nan),
+                           ELEVATION: columns[altitude].astype(float).filled(np.nan)},
+                          index=pd.to_datetime(columns['timestamp'].data, utc=True))
+        return df.dropna()
+
+    def test_random(self):
+        rng = np.random.RandomState(42)
+        for i in range(50):
+            n = rng.randint(3, 150)
+            elevation = np.cumsum(rng.normal(0.5, 5, n))
+            if i % 2: elevation = np.round(elevation)  # ties
+            df = pd.DataFrame({ELEVATION: elevation}, index=np.arange(n) * 5.0)
+            params = Climb(min_elevation=(0, 10, 80)[i % 3])
+            self.assertEqual(search(df.copy(), params=params), search_by_offset(df.copy(), params=params))
+            self.assertEqual(biggest_reversal(df.copy()), biggest_reversal_by_offset(df.copy()))
+
+    def test_activities(self):
+        for path in ('personal/2016-07-19-mpu-s-z2.fit', 'personal/2018-03-04-qdp.fit',
+                     'other/2018-05-30-22-00-44.fit'):
+            df = self.read(path)
+            by_dist = df.drop_duplicates(subset=[DISTANCE])
+            by_dist = linear_resample(by_dist.set_index(by_dist[DISTANCE]), quantise=False)
+            for sample in by_dist.iloc[::10], by_dist.iloc[:500], by_dist.iloc[-500:]:
+                self.assertEqual(search(sample.copy()), search_by_offset(sample.copy()), path)
+                self.assertEqual(biggest_reversal(sample.copy()), biggest_reversal_by_offset(sample.copy()), path)
+            climbs = list(find_climbs(df))
+            with patch('ch2.data.climb.search', search_by_offset), \
+                    patch('ch2.data.climb.biggest_reversal', biggest_reversal_by_offset):
+                self.assertEqual(climbs, list(find_climbs(df)), path)
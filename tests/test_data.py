@@ -1,10 +1,14 @@
-
+import datetime as dt
 from logging import getLogger, basicConfig, INFO
 from sys import stdout
 from tempfile import NamedTemporaryFile
 from unittest import TestCase
 
+import numpy as np
+import pandas as pd
+
 from ch2.commands.args import bootstrap_file, m, V
+from ch2.data.impulse import DecayModel, pre_calc, calc, restart
 from ch2.lib.data import MutableAttr, reftuple
 from ch2.squeal import StatisticJournalFloat, StatisticJournalText, Source
 from ch2.squeal.tables.source import SourceType
@@ -45,3 +49,17 @@ class TestData(TestCase):
         from ch2.stoats.calculate.power import Power, Bike
         self.assertEqual(Bike.__module__, 'ch2.stoats.calculate.power')
         self.assertEqual(Power.__module__, 'ch2.stoats.calculate.power')
+
+    def test_restart(self):
+        start = dt.datetime(2018, 1, 1, tzinfo=dt.timezone.utc)
+        index = pd.date_range(start=start, periods=1000, freq='10min')
+        hr10 = pd.DataFrame({'impulse': np.abs(np.sin(np.arange(1000) / 50))}, index=index)
+        model = DecayModel(start=0, zero=0, scale=1, period=42 * 24, input='impulse', output='fitness')
+        finish = index[-1] + dt.timedelta(hours=1)
+        full = calc(pre_calc(hr10.copy(), model, start=start, finish=finish), model)
+        middle = start + dt.timedelta(hours=50)
+        continued = restart(model, full.loc[middle, 'fitness'])
+        part = calc(pre_calc(hr10.loc[hr10.index >= middle].copy(), continued,
+                             start=middle + dt.timedelta(hours=1), finish=finish), continued)
+        self.assertEqual(part.index[0], middle)
+        self.assertTrue(np.allclose(part['fitness'], full.loc[full.index >= middle, 'fitness']))
@@ -1,14 +1,20 @@
 
+import datetime as dt
 from glob import glob
 from logging import getLogger, basicConfig, INFO
 from os.path import basename, join, exists
 from sys import stdout
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
 from ch2.commands.args import FIELDS, TABLES, GREP
-from ch2.fit.format.read import filtered_records
+from ch2.fit.cache import FitCache
+from ch2.fit.format.read import filtered_records, filtered_columns
+from ch2.fit.format.tokens import Checksum
 from ch2.fit.format.records import no_names, append_units, no_bad_values, fix_degrees, chain, no_units
+from ch2.fit.profile.compact import write_profile, CompactProfile
 from ch2.fit.profile.fields import DynamicField
+from ch2.fit.profile.messages import Missing
 from ch2.fit.profile.profile import read_external_profile, read_fit
 from ch2.fit.summary import summarize, summarize_csv, summarize_tables
 from ch2.lib.tests import OutputMixin, HEX_ADDRESS, EXC_HDR_CHK, sub_extn, EXC_FLD, sub_dir, RNM_UNKNOWN, ROUND_DISTANCE
@@ -40,6 +46,30 @@ class TestFit(TestCase, OutputMixin):
         fields = ','.join(sorted(field.references))
         self.assertEqual(fields, 'duration_type,target_type')
 
+    def test_compact_profile(self):
+        nlog, types, messages = read_external_profile(log, self.profile_path)
+        with TemporaryDirectory() as dir:
+            path = join(dir, 'profile.bin')
+            write_profile(path, nlog, types, messages)
+            profile = CompactProfile(log, path)
+            types, messages = profile.types, profile.messages
+            self.assertEqual(types.n_loaded(), 0)
+            self.assertEqual(messages.n_loaded(), 0)
+            session = messages.number_to_message(18)
+            self.assertEqual(session.name, 'session')
+            self.assertIs(messages.profile_to_message('session'), session)
+            self.assertEqual(messages.n_loaded(), 1)
+            # types are shared between messages, and loaded only when used
+            field = session.profile_to_field('sport')
+            self.assertIs(field.type, types.profile_to_type('sport'))
+            self.assertLess(types.n_loaded(), len(types.all_types()))
+            self.assertIsInstance(session.profile_to_field('total_cycles'), DynamicField)
+            self.assertEqual(types.profile_to_type('carry_exercise_name').profile_to_internal('farmers_walk'), 1)
+            self.assertEqual(types.base_types[2].name, 'uint8')
+            self.assertIsInstance(messages.number_to_message(9999), Missing)
+            with self.assertRaises(KeyError):
+                messages.profile_to_message('no such message')
+
     def test_decode(self):
         types, messages, records = \
             filtered_records(read_fit(log, join(self.test_dir, 'source/personal/2018-07-26-rec.fit')),
@@ -175,3 +205,72 @@ class TestFit(TestCase, OutputMixin):
 
         self.assertAlmostEqual(positions[0][0], -33.42, places=1)
         self.assertAlmostEqual(positions[0][1], -70.61, places=1)
+
+    def test_crc(self):
+        data = bytearray(read_fit(log, join(self.test_dir, 'source/sdk/Settings.fit')))
+        stored = Checksum(data, offset=len(data)-2).checksum
+        self.assertEqual(Checksum.crc(data[:-2]), stored)
+        self.assertEqual(Checksum.crc(data[10:-2], Checksum.crc(data[:10])), stored)
+        data[-1] ^= 0xff
+        with self.assertRaisesRegex(Exception, 'Bad checksum'):
+            list(filtered_records(data, profile_path=self.profile_path)[2])
+        list(filtered_records(data, profile_path=self.profile_path, trust_crc=True)[2])
+
+    def test_columns(self):
+        for file in ('Activity.fit', 'MonitoringFile.fit', 'Settings.fit', 'WorkoutCustomTargetValues.fit'):
+            data = read_fit(log, join(self.test_dir, 'source/sdk', file))
+            records = [record for _, _, record in filtered_records(data, profile_path=self.profile_path)[2]]
+            columns = filtered_columns(data, profile_path=self.profile_path)[2]
+            for name in set(record.name for record in records):
+                named = [record for record in records if record.name == name]
+                self.assertEqual(len(columns[name]), len(named))
+                for i, record in enumerate(named):
+                    if record.timestamp is None:
+                        self.assertTrue(columns[name]['timestamp'].mask[i])
+                    else:
+                        self.assertEqual(columns[name]['timestamp'][i].astype(int), record.timestamp.timestamp())
+                    self.assertEqual(sorted(columns[name].names(i)), sorted(record.data), (file, name))
+                    for field, (values, units) in record.data.items():
+                        msg = (file, name, field)
+                        self.assertEqual(columns[name].units[field], units, msg)
+                        found = columns[name].values(field, i)
+                        if values is None:
+                            self.assertIsNone(found, msg)
+                        else:
+                            # lists (strings) are tuples in the columns
+                            self.assertEqual(found, tuple(values), msg)
+                            self.assertEqual([type(value) for value in found], [type(value) for value in values], msg)
+                        column = columns[name][field]
+                        if values is None:
+                            self.assertTrue(column.mask[i].all(), msg)
+                        elif column.dtype.kind == 'M':
+                            # naive for local times
+                            time = values[0] if values[0].tzinfo else values[0].replace(tzinfo=dt.timezone.utc)
+                            self.assertEqual(column.data[i].astype(int), time.timestamp(), msg)
+                        elif column.ndim == 2:
+                            for a, b in zip(column.data[i].tolist(), values):
+                                self.assertAlmostEqual(a, b, places=5, msg=msg)
+                        elif isinstance(values[0], float):
+                            self.assertAlmostEqual(column.data[i], values[0], places=5, msg=msg)
+                        else:
+                            self.assertEqual(column.data[i], values[0], msg)
+
+    def test_cache(self):
+        data = read_fit(log, join(self.test_dir, 'source/sdk/Activity.fit'))
+        records = [record for _, _, record in filtered_records(data, profile_path=self.profile_path)[2]]
+        with TemporaryDirectory() as dir:
+            cache = FitCache(dir)
+            self.assertIsNone(cache.get('abc'))
+            cache.put('abc', records)
+            cached = cache.get('abc')
+            self.assertEqual(len(cached), len(records))
+            for a, b in zip(cached, records):
+                self.assertEqual(repr(a.identity), repr(b.identity))
+                self.assertEqual((a.name, a.timestamp), (b.name, b.timestamp))
+                self.assertEqual(a.as_dict(no_bad_values).data, b.as_dict(no_bad_values).data)
+                self.assertEqual(a.as_dict().attr, b.attr)
+            cache.put('def', records[:10])
+            self.assertEqual(len(cache.entries()), 2)
+            self.assertEqual(cache.prune(max_mb=cache.size() / 1024**2 - 1e-6), 1)
+            self.assertEqual(cache.clear(), 1)
+            self.assertEqual(cache.entries(), [])
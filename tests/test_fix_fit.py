@@ -46,6 +46,13 @@ class TestFixFit(TestCase, OutputMixin):
         with self.assertTextMatch('data/test/target/other/TestFixFit.test_drop') as output:
             summarize(RECORDS, fixed, output=output)
 
+    def test_resync(self):
+        bad = read_fit(self.log, join(self.test_dir, 'source/other/8CS90646.FIT'))
+        fixed = fix(bad, resync=True, fix_checksum=True, fix_header=True)
+        self.assertTrue(len(fixed) < len(bad))
+        with self.assertTextMatch('data/test/target/other/TestFixFit.test_drop') as output:
+            summarize(RECORDS, fixed, output=output)
+
     def test_slices(self):
         bad = read_fit(self.log, join(self.test_dir, 'source/other/8CS90646.FIT'))
         with self.assertRaisesRegex(Exception, 'Error fixing checksum'):
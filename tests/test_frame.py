@@ -0,0 +1,102 @@
+
+import datetime as dt
+from os.path import join
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from ch2.commands.activities import activities
+from ch2.commands.args import bootstrap_file, m, V, DEV, mm, FAST
+from ch2.commands.constants import constants
+from ch2.config import getLogger
+from ch2.config.default import default
+from ch2.data.frame import activity_statistics, statistics, statistic_names, _labels, \
+    _activity_statistics_by_join, _statistics_by_join
+from ch2.sortem.file import SRTM1_DIR, SAMPLES
+from ch2.squeal import ActivityJournal, ActivityBlob, Pipeline, PipelineType, StatisticName
+from ch2.stoats.names import LATITUDE, LONGITUDE, HEART_RATE, DISTANCE, SPEED, CADENCE, RAW_ELEVATION
+from ch2.stoats.waypoint import WaypointReader
+
+log = getLogger(__name__)
+
+
+class TestFrame(TestCase):
+
+    def test_wide(self):
+        with NamedTemporaryFile() as f:
+            bootstrap_file(f, m(V), '5', mm(DEV), configurator=default)
+            args, db = bootstrap_file(f, m(V), '5', mm(DEV), 'activities', mm(FAST),
+                                      'data/test/source/personal/2018-08-27-rec.fit',
+                                      'data/test/source/personal/2018-07-26-rec.fit')
+            activities(args, db)
+            with db.session_context() as s:
+                for names in ([DISTANCE], [LATITUDE, LONGITUDE, HEART_RATE, DISTANCE, SPEED, CADENCE]):
+                    for journal in s.query(ActivityJournal).all():
+                        for with_timespan in False, True:
+                            wide = activity_statistics(s, *names, activity_journal=journal,
+                                                       with_timespan=with_timespan)
+                            resolved = statistic_names(s, *names, constraint=journal.activity_group)
+                            joined = _activity_statistics_by_join(s, resolved, _labels(resolved), journal,
+                                                                  with_timespan=with_timespan)
+                            # sqlite doesn't guarantee the order of the join
+                            pd.testing.assert_frame_equal(wide, joined.sort_index())
+                    resolved = statistic_names(s, *names)
+                    for sources in None, s.query(ActivityJournal).all()[:1]:
+                        wide = statistics(s, *names, sources=sources, with_sources=True)
+                        joined = _statistics_by_join(s, resolved, _labels(resolved), sources=sources,
+                                                     with_sources=True)
+                        pd.testing.assert_frame_equal(wide, joined.sort_index())
+
+    def assert_packed(self, names, srtm_dir=None):
+        # packed and unpacked data give the same results
+        waypoint_names = {DISTANCE: 'distance', HEART_RATE: 'heart_rate'}
+        with NamedTemporaryFile() as f:
+            bootstrap_file(f, m(V), '5', mm(DEV), configurator=default)
+            if srtm_dir:
+                args, db = bootstrap_file(f, m(V), '5', 'constants', '--set', SRTM1_DIR, srtm_dir)
+                constants(args, db)
+            args, db = bootstrap_file(f, m(V), '5', mm(DEV))
+            with db.session_context() as s:
+                for pipeline in s.query(Pipeline).filter(Pipeline.type == PipelineType.ACTIVITY).all():
+                    pipeline.kargs = dict(pipeline.kargs, pack=True)
+            args, db = bootstrap_file(f, m(V), '5', mm(DEV), 'activities', mm(FAST),
+                                      'data/test/source/personal/2018-08-27-rec.fit')
+            activities(args, db)
+            with db.session_context() as s:
+                journal = s.query(ActivityJournal).one()
+                blobs = ActivityBlob.read(s, journal, [id for (id,) in s.query(StatisticName.id).
+                                          filter(StatisticName.name.in_(names)).all()])
+                for times, values in blobs.values():
+                    self.assertEqual(len(times), len(values))
+                start = journal.start + dt.timedelta(minutes=5)
+                packed = (activity_statistics(s, *names, activity_journal=journal, with_timespan=True),
+                          activity_statistics(s, *names, activity_journal=journal, start=start),
+                          list(WaypointReader().read(s, journal, waypoint_names, start=start)))
+                s.query(ActivityBlob).delete()
+                s.commit()
+                rows = (activity_statistics(s, *names, activity_journal=journal, with_timespan=True),
+                        activity_statistics(s, *names, activity_journal=journal, start=start),
+                        list(WaypointReader().read(s, journal, waypoint_names, start=start)))
+                self.assertEqual(len(blobs), sum(rows[0][name].notna().any() for name in names))
+                pd.testing.assert_frame_equal(packed[0], rows[0])
+                pd.testing.assert_frame_equal(packed[1], rows[1])
+                self.assertEqual(packed[2], rows[2])
+                return packed[0]
+
+    def test_packed(self):
+        self.assert_packed([LATITUDE, LONGITUDE, HEART_RATE, DISTANCE, SPEED, CADENCE])
+
+    def test_packed_elevation(self):
+        # synthetic srtm tile with stripes at sea level, so that some points have no (zero) raw elevation
+        with TemporaryDirectory() as dir:
+            data = np.random.RandomState(1).randint(1, 1000, (SAMPLES, SAMPLES))
+            data[:, (np.arange(SAMPLES) // 30) % 2 == 0] = 0
+            with open(join(dir, 'S34W071.hgt'), 'wb') as output:
+                output.write(data.astype('>i2').tobytes())
+            frame = self.assert_packed([LATITUDE, LONGITUDE, RAW_ELEVATION], srtm_dir=dir)
+            present = frame[LATITUDE].notna()
+            elevations = frame.loc[present, RAW_ELEVATION]
+            self.assertTrue(elevations.notna().any())
+            self.assertTrue(elevations.isna().any())
@@ -0,0 +1,121 @@
+
+import datetime as dt
+from json import loads
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+
+from ch2.commands.activities import activities
+from ch2.commands.args import bootstrap_file, m, V, mm, DEV, FAST
+from ch2.commands.constants import constants
+from ch2.config.default import default
+from ch2.data import hr_zones
+from ch2.squeal import ActivityJournal, Constant, Pipeline
+from ch2.squeal.tables.pipeline import PipelineType
+from ch2.squeal.tables.statistic import StatisticJournal, StatisticName
+from ch2.stoats.calculate.heart_rate import HeartRateCalculator, HRImpulse
+from ch2.stoats.names import HEART_RATE, HR_ZONE, FTHR
+from ch2.stoats.pipeline import run_pipeline
+
+
+def zone(heart_rate, fthr):
+    # the original (scalar) calculation
+    lower_limit, prev_delta = 0, None
+    for zone, upper_limit in enumerate(hr_zones(fthr)):
+        if lower_limit <= heart_rate < upper_limit:
+            if zone == 0:
+                return 1 + zone
+            elif zone == 5:
+                return 1 + zone + (heart_rate - lower_limit) / prev_delta
+            else:
+                return 1 + zone + (heart_rate - lower_limit) / (upper_limit - lower_limit)
+        prev_delta = upper_limit - lower_limit
+        lower_limit = upper_limit
+
+
+def reference(heart_rates, fthrs, hr_impulse, interval=10):
+    # the original (scalar) calculation of zones, impulses, durations and interpolated impulses.
+    # fthrs are (time, value) in descending time order.
+    zones, impulses, durations, interpolated = {}, [], {}, {}
+    prev_time, prev_heart_rate_zone = None, None
+    for time, heart_rate in heart_rates:
+        heart_rate_zone = None
+        if heart_rate:
+            for fthr_time, fthr in fthrs:
+                if fthr_time <= time:
+                    heart_rate_zone = zone(heart_rate, fthr)
+                    break
+            if heart_rate_zone is not None:
+                zones[time] = heart_rate_zone
+        if prev_heart_rate_zone is not None:
+            duration = (time - prev_time).total_seconds()
+            if duration <= hr_impulse.max_secs:
+                impulse = duration * ((max(prev_heart_rate_zone, hr_impulse.zero) - hr_impulse.zero)
+                                      / (6 - hr_impulse.zero)) ** hr_impulse.gamma
+                impulses.append((impulse, time))
+                durations[time] = duration
+        elif not impulses:
+            impulses.append((0, time))
+        prev_time, prev_heart_rate_zone = time, heart_rate_zone
+    integral, sum = [], 0
+    for impulse, time in impulses:
+        sum += impulse
+        integral.append((sum, time))
+    impulse_0, time_0 = integral.pop(0)
+    time, prev = time_0, 0
+    while integral:
+        impulse_1, time_1 = integral[0]
+        delta = (time_1 - time_0).total_seconds()
+        while time <= time_1:
+            interp = impulse_0 + (impulse_1 - impulse_0) * (time - time_0).total_seconds() / delta
+            interpolated[time] = (interp - prev) / interval
+            time += dt.timedelta(seconds=interval)
+            prev = interp
+        while integral and time > integral[0][1]:
+            impulse_0, time_0 = integral.pop(0)
+    return zones, dict((time, impulse) for impulse, time in impulses[1:] if time in durations), durations, \
+           interpolated
+
+
+class TestHeartRate(TestCase):
+
+    def values(self, s, name):
+        return dict((journal.time, journal.value) for journal in
+                    s.query(StatisticJournal).join(StatisticName).
+                    filter(StatisticName.name == name).order_by(StatisticJournal.time).all())
+
+    def test_heart_rate(self):
+        with NamedTemporaryFile() as f:
+            bootstrap_file(f, m(V), '0', mm(DEV), configurator=default)
+            args, db = bootstrap_file(f, m(V), '0', 'constants', '--set', 'FTHR.%', '154')
+            constants(args, db)
+            args, db = bootstrap_file(f, m(V), '0', mm(DEV), 'activities', mm(FAST),
+                                      'data/test/source/personal/2018-08-27-rec.fit')
+            activities(args, db)
+            with db.session_context() as s:
+                # a second FTHR, from half way through the activity
+                journal = s.query(ActivityJournal).one()
+                change = journal.start + (journal.finish - journal.start) / 2
+                for constant in s.query(Constant).filter(Constant.name.like(f'{FTHR}.%')).all():
+                    constant.add_value(s, 170.0, time=change)
+            run_pipeline(db, PipelineType.STATISTIC, like='%HeartRate%', n_cpu=1)
+            with db.session_context() as s:
+                pipeline = s.query(Pipeline).filter(Pipeline.cls == HeartRateCalculator).one()
+                hr_impulse = HRImpulse(**loads(Constant.get(s, pipeline.kargs['impulse']).at(s).value))
+                activity_group = s.query(ActivityJournal).one().activity_group
+                fthrs = sorted(((journal.time, journal.value) for journal in
+                                s.query(StatisticJournal).join(StatisticName).
+                                filter(StatisticName.name == FTHR,
+                                       StatisticName.constraint == activity_group).all()),
+                               reverse=True)
+                self.assertEqual(len(fthrs), 2)
+                heart_rates = sorted(self.values(s, HEART_RATE).items())
+                zones, impulses, durations, interpolated = reference(heart_rates, fthrs, hr_impulse)
+                # both values of FTHR were used
+                self.assertTrue(any(time < change for time in zones))
+                self.assertTrue(any(time >= change for time in zones))
+                self.assertTrue(any(zones[time] != zone(heart_rate, 154)
+                                    for time, heart_rate in heart_rates if time in zones and time >= change))
+                self.assertEqual(self.values(s, HR_ZONE), zones)
+                self.assertEqual(self.values(s, hr_impulse.dest_name), impulses)
+                self.assertEqual(self.values(s, f'{hr_impulse.dest_name} (duration)'), durations)
+                self.assertEqual(self.values(s, f'{hr_impulse.dest_name} / 10s'), interpolated)
@@ -0,0 +1,73 @@
+
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+
+from ch2.commands.activities import activities
+from ch2.commands.args import bootstrap_file, m, V, mm, DEV, FAST
+from ch2.commands.constants import constants
+from ch2.config.default import default
+from ch2.squeal import ActivityJournal, Composite, CompositeComponent, StatisticJournalFloat, StatisticName
+from ch2.squeal.tables.pipeline import PipelineType
+from ch2.squeal.types import short_cls
+from ch2.stoats.calculate.impulse import ImpulseCalculator
+from ch2.stoats.pipeline import run_pipeline
+
+PATHS = ['data/test/source/personal/2018-03-04-qdp.fit', 'data/test/source/personal/2018-08-27-rec.fit']
+
+
+class TestImpulse(TestCase):
+
+    def bootstrap(self, f):
+        bootstrap_file(f, m(V), '0', mm(DEV), configurator=default)
+        args, db = bootstrap_file(f, m(V), '0', 'constants', '--set', 'FTHR.%', '154')
+        constants(args, db)
+
+    def add(self, f, *paths):
+        args, db = bootstrap_file(f, m(V), '0', mm(DEV), 'activities', mm(FAST), *paths)
+        activities(args, db)
+        run_pipeline(db, PipelineType.STATISTIC, n_cpu=1)
+        return db
+
+    def inputs(self, s, source_id, known):
+        # the activities (by start time) included in a composite source, following the chain
+        if source_id not in known:
+            known[source_id] = set().union(*(self.inputs(s, id, known) for (id,) in
+                                             s.query(CompositeComponent.input_source_id).
+                                             filter(CompositeComponent.output_source_id == source_id).all()))
+        return known[source_id]
+
+    def responses(self, db):
+        # (name, time) -> (id, value, activities) for all impulse responses
+        with db.session_context() as s:
+            known = dict((journal.id, {journal.start}) for journal in s.query(ActivityJournal).all())
+            return dict(((name, time), (id, value, self.inputs(s, source_id, known)))
+                        for name, time, id, value, source_id in
+                        s.query(StatisticName.name, StatisticJournalFloat.time, StatisticJournalFloat.id,
+                                StatisticJournalFloat.value, StatisticJournalFloat.source_id).
+                        join(StatisticJournalFloat).
+                        filter(StatisticName.owner == short_cls(ImpulseCalculator)).all())
+
+    def test_incremental(self):
+        # adding a later activity continues the calculation and gives the same values as starting again
+        with NamedTemporaryFile() as full, NamedTemporaryFile() as incremental:
+            self.bootstrap(full)
+            full_db = self.add(full, *PATHS)
+            expected = self.responses(full_db)
+            self.assertTrue(expected)
+            self.bootstrap(incremental)
+            before = self.responses(self.add(incremental, PATHS[0]))
+            db = self.add(incremental, PATHS[1])
+            after = self.responses(db)
+            self.assertEqual(after.keys(), expected.keys())
+            for key in expected:
+                self.assertAlmostEqual(after[key][1], expected[key][1], places=6)
+                self.assertEqual(after[key][2], expected[key][2])
+            # existing values were kept (the calculation continued from the last), not recalculated
+            for key in before:
+                self.assertEqual(after[key][0], before[key][0])
+            # and the chain has the same number of composites
+            self.assertEqual(self.n_composites(db), self.n_composites(full_db))
+
+    def n_composites(self, db):
+        with db.session_context() as s:
+            return s.query(Composite).count()
@@ -0,0 +1,48 @@
+
+from os import utime, stat
+from os.path import join
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from unittest import TestCase
+
+from ch2.commands.args import bootstrap_file, m, V
+from ch2.config import getLogger
+from ch2.lib.io import filter_modified_files, update_scan, HashIndex
+
+log = getLogger(__name__)
+
+
+class TestIO(TestCase):
+
+    def test_modified(self):
+        with NamedTemporaryFile() as f, TemporaryDirectory() as dir:
+            args, db = bootstrap_file(f, m(V), '5')
+            paths = [join(dir, f'{i}.fit') for i in range(3)]
+            for i, path in enumerate(paths):
+                with open(path, 'w') as out:
+                    out.write(f'file {i}')
+            with db.session_context() as s:
+                self.assertEqual(filter_modified_files(s, paths, 'owner'), paths)
+                for path in paths:
+                    update_scan(s, path, 'owner')
+                s.commit()
+                self.assertEqual(filter_modified_files(s, paths, 'owner'), [])
+                # unchanged stat values means no hashing
+                index = HashIndex(s)
+                for path in paths:
+                    index.stat_and_hash(path)
+                self.assertEqual((index.n_stat, index.n_hash), (3, 0))
+                # new content is detected
+                with open(paths[1], 'w') as out:
+                    out.write('changed')
+                self.assertEqual(filter_modified_files(s, paths, 'owner'), [paths[1]])
+                update_scan(s, paths[1], 'owner')
+                s.commit()
+                # a new mtime with the same content is re-hashed, but not re-processed
+                stats = stat(paths[2])
+                utime(paths[2], ns=(stats.st_atime_ns, stats.st_mtime_ns - 10 ** 9))
+                index = HashIndex(s)
+                for path in paths:
+                    index.stat_and_hash(path)
+                self.assertEqual(index.n_hash, 1)
+                s.commit()
+                self.assertEqual(filter_modified_files(s, paths, 'owner'), [])
@@ -0,0 +1,61 @@
+
+import datetime as dt
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+
+import numpy as np
+
+from ch2.commands.args import bootstrap_file, m, V
+from ch2.config import getLogger
+from ch2.squeal import Source, StatisticJournal, StatisticName
+from ch2.squeal.tables.source import SourceType
+from ch2.squeal.tables.statistic import StatisticJournalFloat, StatisticJournalInteger
+from ch2.stoats.load import StatisticJournalLoader
+
+log = getLogger(__name__)
+
+
+class TestLoad(TestCase):
+
+    def setUp(self):
+        start = dt.datetime(2000, 1, 1, tzinfo=dt.timezone.utc)
+        self.times = [start + dt.timedelta(seconds=i) for i in range(20)]
+        rng = np.random.RandomState(42)
+        self.columns = []
+        for name, cls in (('A', StatisticJournalFloat), ('B', StatisticJournalInteger),
+                          ('C', StatisticJournalFloat)):
+            present = rng.uniform(size=len(self.times)) > 0.3
+            present[:3] = False
+            values = [int(x) if cls == StatisticJournalInteger else x for x in rng.normal(100, 10, len(self.times))]
+            self.columns.append((name, None, None, cls, values, present))
+        self.columns[2][5][2] = True  # so C is created before A and B
+
+    def load(self, stage):
+        with NamedTemporaryFile() as f:
+            args, db = bootstrap_file(f, m(V), '5')
+            with db.session_context() as s:
+                source = Source(type=SourceType.SOURCE)
+                s.add(source)
+                s.commit()
+                loader = StatisticJournalLoader(s, owner=self)
+                stage(loader, source)
+                loader.load()
+                return [(journal.id, journal.statistic_name.name, journal.statistic_name.id,
+                         journal.time, journal.serial, journal.value)
+                        for journal in s.query(StatisticJournal).join(StatisticName).
+                            order_by(StatisticJournal.id).all()]
+
+    def test_add_columns(self):
+
+        def by_value(loader, source):
+            for i, time in enumerate(self.times):
+                for name, units, summary, cls, values, present in self.columns:
+                    if present[i]:
+                        loader.add(name, units, summary, None, source, values[i], time, cls)
+
+        def by_column(loader, source):
+            loader.add_columns(None, source, self.times, self.columns)
+
+        expected = self.load(by_value)
+        self.assertTrue(expected)
+        self.assertEqual(self.load(by_column), expected)
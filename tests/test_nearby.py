@@ -0,0 +1,82 @@
+
+from json import dumps, loads
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ch2.commands.activities import activities
+from ch2.commands.args import bootstrap_file, m, V, mm, DEV, FAST, FORCE
+from ch2.commands.constants import constants
+from ch2.config.default import default
+from ch2.squeal import ActivitySimilarity, ActivitySample, ActivityJournal, Constant, PipelineType
+from ch2.stoats.calculate.nearby import NearbySimilarityGraph, NearbySimilarityDBSCAN
+from ch2.stoats.pipeline import run_pipeline
+
+PATHS = ['data/test/source/personal/2018-%s-rec.fit' % date for date in ('07-26', '07-30', '08-03')]
+
+
+class TestNearby(TestCase):
+
+    def session(self, similarities):
+        engine = create_engine('sqlite://')
+        engine.execute('pragma foreign_keys=OFF')  # no activity journals
+        ActivitySimilarity.__table__.create(engine)
+        s = sessionmaker(bind=engine)()
+        for lo, hi, similarity in similarities:
+            s.add(ActivitySimilarity(constraint='test', activity_journal_lo_id=lo, activity_journal_hi_id=hi,
+                                     similarity=similarity))
+        s.commit()
+        return s
+
+    def test_graph(self):
+        # two triangles (1, 2, 3 and 4, 5, 6) weakly joined by 3-4, with 7 loosely attached to 6
+        s = self.session([(5, 6, 1.0), (1, 2, 0.9), (2, 3, 0.9), (1, 3, 1.0), (3, 4, 0.2),
+                          (4, 5, 0.9), (4, 6, 0.8), (6, 7, 0.6)])
+        graph = NearbySimilarityGraph(s, 'test')
+        self.assertEqual(graph.candidates, [1, 2, 3, 4, 5, 6])
+        # lower ids (by row), then higher ids (by id)
+        self.assertEqual(graph.neighbourhood(4, 1), [3, 5, 6])
+        self.assertEqual(graph.neighbourhood(6, 1), [5, 4, 7])
+        self.assertEqual(graph.neighbourhood(4, 0.5), [5, 6])
+        core = graph.core_distance(2)
+        self.assertAlmostEqual(core[4], 0.2)
+        self.assertAlmostEqual(core[7], float('inf'))
+        self.assertEqual(NearbySimilarityDBSCAN(graph, 0.5, 2).run(), [[4, 5, 7, 6], [1, 2, 3]])
+        self.assertEqual(NearbySimilarityDBSCAN(graph, 0.9, 2).run(), [[1, 2, 4, 3, 5, 6, 7]])
+        self.assertEqual(NearbySimilarityDBSCAN(graph, 0.05, 2).run(), [])
+
+    def test_empty(self):
+        graph = NearbySimilarityGraph(self.session([]), 'test')
+        self.assertEqual(NearbySimilarityDBSCAN(graph, 0.5, 3).run(), [])
+
+    def similarities(self, f, *paths):
+        args, db = bootstrap_file(f, m(V), '0', mm(DEV), 'activities', mm(FAST), *paths)
+        activities(args, db)
+        run_pipeline(db, PipelineType.STATISTIC, n_cpu=1)
+        with db.session_context() as s:
+            self.assertEqual(s.query(ActivitySample).count(), s.query(ActivityJournal).count())
+            start = dict((journal.id, journal.start) for journal in s.query(ActivityJournal).all())
+            return dict(((start[similarity.activity_journal_lo_id], start[similarity.activity_journal_hi_id]),
+                          similarity.similarity) for similarity in s.query(ActivitySimilarity).all())
+
+    def bootstrap(self, f):
+        bootstrap_file(f, m(V), '0', mm(DEV), configurator=default)
+        args, db = bootstrap_file(f, m(V), '0')
+        with db.session_context() as s:
+            nearby = s.query(Constant).filter(Constant.name.like('Nearby%')).one()
+            name, value = nearby.name, loads(nearby.at(s).value)
+        value['fraction'] = 1  # no random sampling
+        args, db = bootstrap_file(f, m(V), '0', 'constants', '--set', mm(FORCE), name, dumps(value))
+        constants(args, db)
+
+    def test_incremental(self):
+        # adding an activity gives the same similarities as starting with all activities
+        with NamedTemporaryFile() as full, NamedTemporaryFile() as incremental:
+            self.bootstrap(full)
+            expected = self.similarities(full, *PATHS)
+            self.assertEqual(len(expected), 3)
+            self.bootstrap(incremental)
+            self.assertEqual(len(self.similarities(incremental, *PATHS[:2])), 1)
+            self.assertEqual(self.similarities(incremental, PATHS[2]), expected)
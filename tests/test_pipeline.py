@@ -0,0 +1,31 @@
+
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+
+from ch2.commands.activities import activities
+from ch2.commands.args import bootstrap_file, m, V, mm, DEV, FAST, K
+from ch2.config.default import default
+from ch2.squeal import ActivityJournal, StatisticJournal, StatisticName
+from ch2.stoats.pipeline import POOL, SUBPROCESS
+
+PATHS = ['data/test/source/personal/2018-%s-rec.fit' % date for date in ('07-26', '07-30', '08-03')]
+
+
+class TestPipeline(TestCase):
+
+    def read(self, engine, n_cpu):
+        with NamedTemporaryFile() as f:
+            bootstrap_file(f, m(V), '0', mm(DEV), configurator=default)
+            args, db = bootstrap_file(f, m(V), '0', mm(DEV), 'activities', mm(FAST), *PATHS,
+                                      m(K.upper()), f'engine={engine}', f'n_cpu={n_cpu}')
+            activities(args, db)
+            with db.session_context() as s:
+                self.assertEqual(s.query(ActivityJournal).count(), len(PATHS))
+                return sorted((journal.statistic_name.name, journal.time, journal.value) for journal in
+                              s.query(StatisticJournal).join(StatisticName).all())
+
+    def test_pool(self):
+        # forked workers read the same data as a single process
+        expected = self.read(SUBPROCESS, 1)
+        self.assertTrue(expected)
+        self.assertEqual(self.read(POOL, 2), expected)
@@ -1,14 +1,18 @@
 
 from contextlib import contextmanager
-from tempfile import NamedTemporaryFile
+from os.path import join, exists
+from tempfile import NamedTemporaryFile, TemporaryDirectory
 from unittest import TestCase
+from zipfile import ZipFile
+
+import numpy as np
 
 from ch2 import constants
 from ch2.commands.args import bootstrap_file, V, m, DEV, mm
 from ch2.config import default, getLogger
-from ch2.sortem.bilinear import bilinear_elevation_from_constant
-from ch2.sortem.file import SRTM1_DIR
-from ch2.sortem.spline import spline_elevation_from_constant
+from ch2.sortem.bilinear import bilinear_elevation_from_constant, BilinearElevation
+from ch2.sortem.file import SRTM1_DIR, SAMPLES, EXTN, SRTM_CACHE
+from ch2.sortem.spline import spline_elevation_from_constant, SplineElevation
 
 log = getLogger(__name__)
 ARCSEC = 1/3600
@@ -328,3 +332,28 @@ class TestSortem(TestCase):
                         x = lon + di * delta
                         self.assertAlmostEqual(oracle.elevation(y, x), 645, places=2,
                                                msg='dj %d; di %d' % (dj, di))
+
+    def test_elevations(self):
+        # synthetic tiles (one zipped) so that this runs without the real data
+        with TemporaryDirectory() as dir:
+            rng = np.random.RandomState(1)
+            for root in 'S34W071', 'S34W072':
+                data = rng.randint(0, 1000, SAMPLES * SAMPLES).astype('>i2').tobytes()
+                if root == 'S34W071':
+                    with open(join(dir, root + '.hgt'), 'wb') as output:
+                        output.write(data)
+                else:
+                    with ZipFile(join(dir, root + EXTN), 'w') as archive:
+                        archive.writestr(root + '.hgt', data)
+            lats = -34 + rng.uniform(0, 1, 100)
+            lons = -72 + rng.uniform(0, 2, 100)
+            lats[3], lons[4] = np.nan, np.nan
+            for oracle in BilinearElevation(log, dir), SplineElevation(log, dir):
+                elevations = oracle.elevations(lats, lons)
+                for lat, lon, elevation in zip(lats, lons, elevations):
+                    if np.isnan(lat) or np.isnan(lon):
+                        self.assertTrue(np.isnan(elevation))
+                    else:
+                        self.assertAlmostEqual(elevation, oracle.elevation(lat, lon), places=6)
+            self.assertTrue(exists(join(dir, SRTM_CACHE, 'S34W072.hgt')))
+            self.assertIsNone(BilinearElevation(log, None).elevations(lats, lons))
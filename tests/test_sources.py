@@ -1,5 +1,7 @@
 
+import datetime as dt
 from logging import getLogger
+from random import seed, random
 from subprocess import run
 from tempfile import NamedTemporaryFile
 from unittest import TestCase
@@ -8,8 +10,9 @@ from sqlalchemy.sql.functions import count
 
 from ch2.commands.args import m, V, bootstrap_file
 from ch2.config.personal import acooke
-from ch2.lib.date import to_date
-from ch2.squeal.tables.source import Source, Interval
+from ch2.lib.date import to_date, time_to_local_date
+from ch2.lib.schedule import Schedule
+from ch2.squeal.tables.source import Source, Interval, Dummy
 from ch2.squeal.tables.statistic import StatisticJournalText, StatisticJournal, StatisticJournalFloat, StatisticName, \
     StatisticJournalInteger, StatisticJournalType
 from ch2.squeal.tables.topic import TopicJournal, Topic
@@ -19,6 +22,20 @@ from ch2.stoats.calculate.summary import SummaryCalculator
 log = getLogger(__name__)
 
 
+def missing_by_frame(s, schedule, interval_owner, start=None, finish=None):
+    # the original calculation, stepping through the database one interval at a time
+    starts, overall_finish = Interval._missing_interval_start_dates(log, s, schedule, interval_owner)
+    for block_start in starts:
+        frame = block_start
+        while frame <= time_to_local_date(overall_finish):
+            next = schedule.next_frame(frame)
+            if not (start and next <= start) and not (finish and frame >= finish):
+                yield frame, next
+            frame = next
+            if Interval._existing_interval_at(s, schedule, interval_owner, frame):
+                break
+
+
 # the idea here is to test the new database schema with sources etc
 # so we configure a database then load some data, calculate some stats,
 # and see if everything works as expected.
@@ -92,6 +109,9 @@ class TestSources(TestCase):
                 month = s.query(Interval).filter(Interval.schedule == 'm').one()
                 self.assertEqual(month.start, to_date('2018-09-01'), month.start)
                 self.assertEqual(month.finish, to_date('2018-10-01'), month.finish)
+                missing = Interval.missing_date_ranges(log, s, [Schedule('m'), Schedule('d'), Schedule('y')],
+                                                       SummaryCalculator, statistic_owner=diary)
+                self.assertEqual(missing, [[], [(to_date('2018-09-29'), to_date('2018-09-30'))], []], missing)
 
             with db.session_context() as s:
 
@@ -117,3 +137,36 @@ class TestSources(TestCase):
                 self.assertEqual(s.query(count(Source.id)).scalar(), 11, list(map(str, s.query(Source).all())))  # constants
                 self.assertEqual(s.query(count(StatisticJournalText.id)).scalar(), 7, s.query(count(StatisticJournalText.id)).scalar())
                 self.assertEqual(s.query(count(StatisticJournal.id)).scalar(), 7, s.query(count(StatisticJournal.id)).scalar())
+
+    def test_missing_ranges(self):
+        # missing intervals from a single query match the original calculation
+        seed(1)
+        schedules = [Schedule(schedule) for schedule in ('d', 'w', 'm', 'y')]
+        with NamedTemporaryFile() as f:
+            args, db = bootstrap_file(f, m(V), '0')
+            with db.session_context() as s:
+                source = add(s, Dummy())
+                for day in 3, 10, 400, 900:
+                    StatisticJournalFloat.add(log, s, 'Value', None, None, self, None, source, float(day),
+                                              dt.datetime(2017, 3, 2, 12, tzinfo=dt.timezone.utc) +
+                                              dt.timedelta(days=day))
+                s.commit()
+                bounds = [(None, None), (to_date('2017-06-15'), None), (None, to_date('2018-02-01')),
+                          (to_date('2017-06-15'), to_date('2018-02-01'))]
+                for deleted in 1, 0.3, 0.05, 0:
+                    # existing intervals, with a fraction (possibly all) deleted at random
+                    s.query(Interval).delete()
+                    for schedule in schedules:
+                        for frame, next in list(missing_by_frame(s, schedule, SummaryCalculator)):
+                            if random() >= deleted:
+                                s.add(Interval(schedule=schedule, owner=SummaryCalculator, start=frame, finish=next))
+                    s.commit()
+                    for start, finish in bounds:
+                        missing = Interval.missing_date_ranges(log, s, schedules, SummaryCalculator,
+                                                               start=start, finish=finish)
+                        for schedule, ranges in zip(schedules, missing):
+                            expected = sorted(set(missing_by_frame(s, schedule, SummaryCalculator,
+                                                                   start=start, finish=finish)))
+                            self.assertEqual(ranges, expected, (deleted, str(schedule), start, finish))
+                            if deleted == 1 and not start and not finish:
+                                self.assertTrue(ranges)
@@ -0,0 +1,39 @@
+
+from logging import getLogger
+from tempfile import TemporaryDirectory, NamedTemporaryFile
+from unittest import TestCase
+
+from ch2.commands.args import bootstrap_file, m, V, mm, ROOT, DATABASE, STATISTICS, WORKER
+from ch2.config.default import default
+from ch2.lib.importtime import import_times
+from ch2.squeal.tables.pipeline import Pipeline
+from ch2.stoats.calculate.heart_rate import HeartRateCalculator
+
+log = getLogger(__name__)
+
+# a worker process should not import the libraries used only by other commands.
+# the budgets are generous (previously, ~2900 modules in ~10s) to allow for slow machines.
+MAX_MODULES = 1500
+MAX_SECONDS = 5
+EXCLUDED = ('bokeh', 'urwid', 'notebook', 'textblob', 'openpyxl', 'nbformat')
+
+
+class TestStartup(TestCase):
+
+    def test_worker(self):
+        with TemporaryDirectory() as root, NamedTemporaryFile(dir=root) as f:
+            bootstrap_file(f, m(V), '0', mm(ROOT), root, configurator=default)
+            args, db = bootstrap_file(f, m(V), '0', mm(ROOT), root)
+            with db.session_context() as s:
+                id = s.query(Pipeline.id).filter(Pipeline.cls == HeartRateCalculator).scalar()
+            returncode, imports, wall = import_times([mm(ROOT), root, m(V), '0', mm(DATABASE), f.name,
+                                                      STATISTICS, mm(WORKER), str(id), '2018-01-01', '2018-02-01'])
+            self.assertEqual(returncode, 0)
+            modules = set(name for _, _, _, name in imports)
+            self.assertIn(HeartRateCalculator.__module__, modules)
+            self.assertLess(len(modules), MAX_MODULES)
+            for excluded in EXCLUDED:
+                self.assertNotIn(excluded, modules)
+            seconds = sum(time for time, _, _, _ in imports)
+            self.assertLess(seconds, MAX_SECONDS)
+            log.info(f'{len(modules)} modules imported in {seconds:.2f}s ({wall:.2f}s total)')
@@ -0,0 +1,98 @@
+
+from logging import getLogger
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+
+import datetime as dt
+
+from ch2.commands.args import bootstrap_file, m, V
+from ch2.squeal.tables.source import Dummy, Interval
+from ch2.squeal.tables.statistic import StatisticJournal, StatisticJournalFloat, StatisticMeasure, StatisticName
+from ch2.squeal.utils import add
+from ch2.stoats.calculate.summary import SummaryCalculator
+
+log = getLogger(__name__)
+JANUARY = dt.date(2018, 1, 1)
+# 13 values, so quartiles are at ranks 1, 4, 7, 10 and 13 (no random fuzzing); 3 and 1 are tied
+VALUES = [5, 3, 8, 1, 9, 3, 7, 2, 1, 6, 4, 3, 10]
+
+
+class TestSummary(TestCase):
+
+    def populate(self, db):
+        with db.session_context() as s:
+            source = add(s, Dummy())
+            start = dt.datetime(2018, 1, 1, 12, tzinfo=dt.timezone.utc)
+            for name, summary in ('Low', '[min],[msr]'), ('High', '[max],[msr]'):
+                for day, value in enumerate(VALUES):
+                    StatisticJournalFloat.add(log, s, name, 'm', summary, self, None, source, value,
+                                              start + dt.timedelta(days=day))
+                # a second interval, with a single value
+                StatisticJournalFloat.add(log, s, name, 'm', summary, self, None, source, 1,
+                                          start + dt.timedelta(days=40))
+
+    def expected(self, journals, pessimistic):
+        # stable sort (ties by id), with percentiles and quartiles as in the original calculation
+        ranked = sorted(sorted(journals, key=lambda journal: journal.id),
+                        key=lambda journal: journal.value, reverse=not pessimistic)
+        n = len(ranked)
+        return dict((journal.id, (rank, (n - rank) / (n - 1) * 100, [0, None, None, 1, None, None, 2,
+                                                                      None, None, 3, None, None, 4][rank - 1]))
+                    for rank, journal in enumerate(ranked, start=1))
+
+    def measures(self, window):
+        with NamedTemporaryFile() as f:
+            args, db = bootstrap_file(f, m(V), '0')
+            self.populate(db)
+            SummaryCalculator(db, schedule='m', n_cpu=1, window=window).run()
+            with db.session_context() as s:
+                self.assertEqual(s.query(Interval).count(), 2)
+                for name, pessimistic in ('Low', True), ('High', False):
+                    journals = s.query(StatisticJournal).join(StatisticName). \
+                        filter(StatisticName.name == name,
+                               StatisticJournal.time < dt.datetime(2018, 2, 1, tzinfo=dt.timezone.utc)).all()
+                    self.assertEqual(len(journals), len(VALUES))
+                    measures = dict((measure.statistic_journal_id,
+                                     (measure.rank, measure.percentile, measure.quartile))
+                                    for measure in s.query(StatisticMeasure).
+                                    filter(StatisticMeasure.statistic_journal_id.in_(
+                                        [journal.id for journal in journals])).all())
+                    expected = self.expected(journals, pessimistic)
+                    self.assertEqual(measures.keys(), expected.keys())
+                    for id in expected:
+                        rank, percentile, quartile = measures[id]
+                        self.assertEqual(rank, expected[id][0])
+                        self.assertAlmostEqual(percentile, expected[id][1])
+                        self.assertEqual(quartile, expected[id][2])
+                # min and max summaries
+                for name, value in ('Min/Month Low', 1), ('Max/Month High', 10):
+                    self.assertEqual(s.query(StatisticJournal).join(StatisticName).
+                                     filter(StatisticName.name == name).
+                                     order_by(StatisticJournal.time).first().value, value)
+
+    def test_window(self):
+        self.measures(True)
+
+    def test_python(self):
+        self.measures(False)
+
+    def test_error(self):
+        # a failing interval is not recorded, but does not stop the rest of the batch
+
+        class BrokenCalculator(SummaryCalculator):
+
+            def _read_data(self, s, intervals):
+                if any(interval.start == JANUARY for interval in intervals):
+                    raise Exception('Broken')
+                return super()._read_data(s, intervals)
+
+        with NamedTemporaryFile() as f:
+            args, db = bootstrap_file(f, m(V), '0')
+            self.populate(db)
+            BrokenCalculator(db, schedule='m', n_cpu=1).run()
+            with db.session_context() as s:
+                self.assertEqual([interval.start for interval in s.query(Interval).all()], [dt.date(2018, 2, 1)])
+                self.assertEqual(s.query(StatisticJournal).join(StatisticName).
+                                 filter(StatisticName.name == 'Min/Month Low').one().value, 1)
+                self.assertFalse(s.query(StatisticMeasure).filter(StatisticMeasure.source_id.notin_(
+                    s.query(Interval.id))).count())